@@ -1,9 +1,10 @@
 from invoke import Collection
 
+from . import mock
 from . import native
 from . import plot
 from . import run
 from . import trace
 from . import wasm
 
-ns = Collection(native, plot, run, trace, wasm)
+ns = Collection(mock, native, plot, run, trace, wasm)
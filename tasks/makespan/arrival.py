@@ -0,0 +1,49 @@
+from tasks.makespan.data import TaskObject
+from tasks.makespan.stream import TaskStream
+
+"""
+Arrival process for the tasks in a trace. The trace records the inter-arrival
+time of each task wrt the previous one, and the dispatcher converts them into
+absolute release times, optionally compressed by a constant factor.
+"""
+
+
+class ArrivalDispatcher:
+    """
+    Release tasks at their trace timestamps. The dispatcher does not own a
+    clock, so it can be used both with wall-clock time in the real scheduler
+    and with virtual time in the simulator
+    """
+
+    # Stream of tasks that knows the arrival time (in seconds) of each task
+    # wrt the start of the trace
+    tasks: TaskStream
+    start_ts: float = 0.0
+
+    def __init__(self, tasks: TaskStream, time_compression: float = 1):
+        """
+        A time compression factor of `c` releases tasks `c` times faster than
+        what the trace indicates
+        """
+        if time_compression <= 0:
+            raise RuntimeError(
+                "Time compression factor must be positive: {}".format(
+                    time_compression
+                )
+            )
+
+        self.tasks = tasks
+        self.time_compression = time_compression
+
+    def start(self, start_ts: float) -> None:
+        self.start_ts = start_ts
+
+    def get_arrival_ts(self, task: TaskObject) -> float:
+        return (
+            self.start_ts
+            + self.tasks.get_arrival_offset(task.task_id)
+            / self.time_compression
+        )
+
+    def get_time_to_arrival(self, task: TaskObject, now: float) -> float:
+        return max(0, self.get_arrival_ts(task) - now)
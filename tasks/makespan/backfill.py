@@ -0,0 +1,176 @@
+from tasks.makespan.data import TaskObject
+from tasks.makespan.runtime import RuntimeEstimator
+from typing import Callable, Dict, List, Tuple
+
+"""
+EASY backfilling for the FIFO batch scheduler. When the task at the head of
+the queue does not fit, we reserve the earliest time at which it will fit,
+and let tasks behind it start in the idle slots as long as they do not delay
+that reservation.
+"""
+
+# Maximum number of queued tasks behind the head that we consider for
+# backfilling every time the head does not fit
+BACKFILL_MAX_CANDIDATES = 50
+
+# When the scheduler does not keep track of where each task runs (i.e. Granny
+# baselines, where the planner places tasks) we reserve slots in the cluster
+# as a whole
+CLUSTER_SLOTS_KEY = "cluster"
+
+
+class EasyBackfill:
+    """
+    Bookkeeping for EASY backfilling. Reservations are in terms of free slots
+    per VM (or per cluster). The scheduler provides a `fits` predicate to know
+    if a task fits in a given map of free slots, so that the reservation
+    respects the same constraints as the actual placement (e.g. OpenMP tasks
+    must fit in one VM), and its estimator of the execution times. If tasks
+    from different users can not share a VM (i.e. `mpi-evict`) the scheduler
+    also provides the user of each task, and a task only fits in the VMs
+    without tasks from other users
+    """
+
+    def __init__(
+        self,
+        fits: Callable[[TaskObject, Dict[str, int]], bool],
+        estimator: RuntimeEstimator,
+        get_user_id: Callable[[TaskObject], int] = None,
+    ):
+        self.fits = fits
+        self.estimator = estimator
+        self.get_user_id = get_user_id
+
+        # Map of in-flight task ids to the task, its estimated end time, and
+        # the (ip, slots) pairs it occupies
+        self.in_flight: Dict[
+            int, Tuple[TaskObject, float, List[Tuple[str, int]]]
+        ] = {}
+
+        # Current reservation for the head of the queue: the time at which it
+        # will start, and the free slots we expect at that time
+        self.head: TaskObject = None
+        self.shadow_ts: float = 0.0
+        self.free_at_shadow: Dict[str, int] = {}
+        # For each VM, number of tasks of each user that we expect in it at
+        # the reservation time (only if users can not share VMs)
+        self.users_at_shadow: Dict[str, Dict[int, int]] = {}
+
+    def update_vm_users(
+        self,
+        vm_users: Dict[str, Dict[int, int]],
+        task: TaskObject,
+        slots: List[Tuple[str, int]],
+        delta: int,
+    ) -> None:
+        if self.get_user_id is None:
+            return
+
+        user_id = self.get_user_id(task)
+        for ip, _ in slots:
+            users = vm_users.setdefault(ip, {})
+            users[user_id] = users.get(user_id, 0) + delta
+            if users[user_id] <= 0:
+                del users[user_id]
+
+    def fits_for_user(
+        self,
+        task: TaskObject,
+        free_slots: Dict[str, int],
+        vm_users: Dict[str, Dict[int, int]],
+    ) -> bool:
+        """
+        Check if a task fits in the free slots of the VMs it may use, i.e.
+        without the VMs that have tasks from other users, if users can not
+        share VMs
+        """
+        if self.get_user_id is not None:
+            user_id = self.get_user_id(task)
+            free_slots = {
+                ip: num_slots
+                for ip, num_slots in free_slots.items()
+                if all([uid == user_id for uid in vm_users.get(ip, {})])
+            }
+
+        return self.fits(task, free_slots)
+
+    def task_started(
+        self, task: TaskObject, slots: List[Tuple[str, int]], now: float
+    ) -> None:
+        end_ts = now + self.estimator.get_estimate(task)
+        self.in_flight[task.task_id] = (task, end_ts, slots)
+
+        # Tasks that outlive the reservation take slots from the head
+        if self.head is not None and end_ts > self.shadow_ts:
+            for ip, num_slots in slots:
+                self.free_at_shadow[ip] = (
+                    self.free_at_shadow.get(ip, 0) - num_slots
+                )
+            self.update_vm_users(self.users_at_shadow, task, slots, 1)
+
+    def task_finished(self, task_id: int) -> None:
+        self.in_flight.pop(task_id, None)
+
+    def reserve(
+        self, head: TaskObject, free_slots: Dict[str, int], now: float
+    ) -> None:
+        """
+        Work-out when will the head task fit, assuming in-flight tasks finish
+        at their estimated time. Tasks that have run for longer than their
+        estimate are assumed to finish now
+        """
+        self.head = head
+        self.free_at_shadow = dict(free_slots)
+        self.users_at_shadow = {}
+        for task, _, slots in self.in_flight.values():
+            self.update_vm_users(self.users_at_shadow, task, slots, 1)
+
+        self.shadow_ts = now
+        if self.fits_for_user(head, self.free_at_shadow, self.users_at_shadow):
+            return
+
+        for task, end_ts, slots in sorted(
+            self.in_flight.values(), key=lambda item: item[1]
+        ):
+            for ip, num_slots in slots:
+                self.free_at_shadow[ip] = (
+                    self.free_at_shadow.get(ip, 0) + num_slots
+                )
+            self.update_vm_users(self.users_at_shadow, task, slots, -1)
+
+            if self.fits_for_user(
+                head, self.free_at_shadow, self.users_at_shadow
+            ):
+                self.shadow_ts = max(end_ts, now)
+                return
+
+        # The head will not fit even with the whole cluster free, so nothing
+        # we backfill can delay it
+        self.shadow_ts = float("inf")
+
+    def can_backfill(
+        self, task: TaskObject, slots: List[Tuple[str, int]], now: float
+    ) -> bool:
+        """
+        A task can be backfilled if it finishes before the reservation, or if
+        the head still fits at the reservation time with the task's slots
+        taken
+        """
+        if now + self.estimator.get_estimate(task) <= self.shadow_ts:
+            return True
+
+        free_slots = dict(self.free_at_shadow)
+        for ip, num_slots in slots:
+            free_slots[ip] = free_slots.get(ip, 0) - num_slots
+
+        vm_users = {
+            ip: dict(users) for ip, users in self.users_at_shadow.items()
+        }
+        self.update_vm_users(vm_users, task, slots, 1)
+
+        return self.fits_for_user(self.head, free_slots, vm_users)
+
+    def clear_reservation(self) -> None:
+        self.head = None
+        self.free_at_shadow = {}
+        self.users_at_shadow = {}
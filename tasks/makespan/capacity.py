@@ -0,0 +1,132 @@
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, List, Tuple
+
+"""
+Indexed bookkeeping of the free slots in each VM of the cluster.
+"""
+
+
+class VmCapacityIndex(MutableMapping):
+    """
+    Map of VM IPs to their number of free slots, which also indexes VMs by
+    their free capacity. VMs are kept in one bucket per possible number of
+    free slots, so that updating a VM is O(1), and finding the VMs with most
+    free slots does not require sorting the whole map. Within a bucket, VMs
+    are kept in the order they entered it. Iterating over the map follows the
+    order in which VMs were first added
+    """
+
+    def __init__(self, num_cpus_per_vm: int):
+        self.num_cpus_per_vm = num_cpus_per_vm
+        self.free_slots: Dict[str, int] = {}
+        self.buckets: List[Dict[str, None]] = [
+            {} for _ in range(num_cpus_per_vm + 1)
+        ]
+        self.total_free = 0
+
+    def __getitem__(self, ip: str) -> int:
+        return self.free_slots[ip]
+
+    def __setitem__(self, ip: str, num_slots: int) -> None:
+        if num_slots < 0 or num_slots > self.num_cpus_per_vm:
+            raise RuntimeError(
+                "Invalid number of free slots for VM {}: {} (max: {})".format(
+                    ip, num_slots, self.num_cpus_per_vm
+                )
+            )
+
+        # Update the VM in-place, to preserve the iteration order
+        if ip in self.free_slots:
+            old_num_slots = self.free_slots[ip]
+            del self.buckets[old_num_slots][ip]
+            self.total_free -= old_num_slots
+
+        self.free_slots[ip] = num_slots
+        self.buckets[num_slots][ip] = None
+        self.total_free += num_slots
+
+    def __delitem__(self, ip: str) -> None:
+        num_slots = self.free_slots.pop(ip)
+        del self.buckets[num_slots][ip]
+        self.total_free -= num_slots
+
+    def __contains__(self, ip) -> bool:
+        return ip in self.free_slots
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.free_slots)
+
+    def __len__(self) -> int:
+        return len(self.free_slots)
+
+    def iter_descending(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterate over (ip, free slots) pairs in decreasing order of free slots
+        """
+        for num_slots in range(self.num_cpus_per_vm, -1, -1):
+            for ip in self.buckets[num_slots]:
+                yield ip, num_slots
+
+    def iter_ascending(self) -> Iterator[Tuple[str, int]]:
+        """
+        Iterate over (ip, free slots) pairs in increasing order of free slots
+        """
+        for num_slots in range(self.num_cpus_per_vm + 1):
+            for ip in self.buckets[num_slots]:
+                yield ip, num_slots
+
+    def get_smallest_vm_fitting(
+        self, num_slots: int, skip_vm: Callable[[str], bool] = None
+    ) -> Tuple[str, int]:
+        """
+        Return the (ip, free slots) pair of the VM with fewest free slots that
+        has at least `num_slots` free slots, or None if there is none
+        """
+        for num_free in range(max(num_slots, 1), self.num_cpus_per_vm + 1):
+            for ip in self.buckets[num_free]:
+                if skip_vm is None or not skip_vm(ip):
+                    return ip, num_free
+
+        return None
+
+    def get_largest_vm(
+        self, skip_vm: Callable[[str], bool] = None
+    ) -> Tuple[str, int]:
+        """
+        Return the (ip, free slots) pair of the VM with most free slots, or
+        None if there is none. Optionally, we skip the VMs for which
+        `skip_vm` is true
+        """
+        for num_slots in range(self.num_cpus_per_vm, -1, -1):
+            for ip in self.buckets[num_slots]:
+                if skip_vm is None or not skip_vm(ip):
+                    return ip, num_slots
+
+        return None
+
+    def get_vms_covering(
+        self, num_slots: int, skip_vm: Callable[[str], bool] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Return the fewest (ip, free slots) pairs, in decreasing order of free
+        slots, that together have at least `num_slots` free slots. If there
+        are not enough free slots in the cluster, we return all the VMs with
+        free slots. Optionally, we skip the VMs for which `skip_vm` is true
+        """
+        vms = []
+        covered = 0
+        for num_free in range(self.num_cpus_per_vm, 0, -1):
+            for ip in self.buckets[num_free]:
+                if covered >= num_slots:
+                    return vms
+
+                if skip_vm is not None and skip_vm(ip):
+                    continue
+
+                vms.append((ip, num_free))
+                covered += num_free
+
+        return vms
+
+    def get_num_vms_with_free_slots(self, num_slots: int) -> int:
+        return len(self.buckets[num_slots])
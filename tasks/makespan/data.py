@@ -1,45 +1,15 @@
 from dataclasses import dataclass
+from tasks.util.table import TaskObject
 from typing import List, Tuple
 
 """
 This file stores the definitions of the different data structures used in the
 makespan experiment, mostly as part of our implementation of different batch
-schedulers.
+schedulers. Tasks, and the information about their execution, are defined
+with their array-backed tables in `tasks.util.table`.
 """
 
 
-@dataclass
-class TaskObject:
-    """
-    One task (or job) of an experiment. Each task is identified by:
-    - task_id: unique identifier of the task
-    - app: type of workload the task is running, one in: `mpi` or `omp`
-    - size: task's requirements in terms of CPUs
-    - inter_arrival_time: delay in seconds for the task to arrive wrt the
-        previous task
-    """
-
-    task_id: int
-    app: str
-    size: int
-    inter_arrival_time: int
-
-
-@dataclass
-class ExecutedTaskInfo:
-    """
-    Information about an executed task for plotting and analysis
-    """
-
-    task_id: int
-    # Times are in seconds and rounded to zero decimal places
-    time_executing: float
-    time_in_queue: float
-    # Timestamps for when the task starts and finishes executing
-    exec_start_ts: float
-    exec_end_ts: float
-
-
 @dataclass
 class ResultQueueItem:
     """
@@ -51,6 +21,8 @@ class ResultQueueItem:
     start_ts: float
     end_ts: float
     master_ip: str
+    # Whether the task was killed because it ran past its deadline
+    timed_out: bool = False
 
 
 @dataclass
@@ -62,3 +34,17 @@ class WorkQueueItem:
     # List of VM IPs allocated for this task
     sched_decision: List[Tuple[str, int]]
     task: TaskObject
+    # Time the task can run for before we cancel it (None means no limit)
+    timeout_secs: float = None
+
+
+@dataclass
+class EvictionEvent:
+    """
+    Eviction of one or more spot VMs
+    """
+
+    # Time of the eviction, in seconds since the start of the experiment
+    ts: float
+    # Indices of the evicted VMs in the cluster's VM list
+    vm_idxs: List[int]
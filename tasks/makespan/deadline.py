@@ -0,0 +1,116 @@
+from tasks.makespan.data import TaskObject
+from tasks.makespan.runtime import RuntimeEstimator
+from typing import Dict, List, Set, Tuple
+
+"""
+Deadlines of the in-flight tasks. If timeouts are enabled, each task gets a
+deadline derived from an estimate of its execution time. Native tasks run
+under `timeout` in their pod, so a task that outlives its deadline is killed
+before we hear back from it, and reported as failed. Tasks that run for much
+longer than estimated, but are still within their deadline, are flagged as
+stragglers.
+"""
+
+# A task times out after running for this many times its estimated execution
+# time (but never before the minimum timeout). A factor of 0 disables
+# timeouts, which is the default
+DEFAULT_TASK_TIMEOUT_FACTOR = 0
+MIN_TASK_TIMEOUT_SECS = 120
+
+# A task becomes a straggler once it runs for this many times its estimate
+STRAGGLER_FACTOR = 1.5
+
+
+class TaskDeadlines:
+    """
+    Bookkeeping of the estimated execution time of the in-flight tasks. The
+    estimates come from the scheduler's estimator, that improves as tasks
+    finish. Every time a task times out, we double
+    its next timeout, so that a task that is just slower than estimated does
+    not time out on every retry
+    """
+
+    def __init__(
+        self,
+        estimator: RuntimeEstimator,
+        timeout_factor: float = DEFAULT_TASK_TIMEOUT_FACTOR,
+        min_timeout_secs: float = MIN_TASK_TIMEOUT_SECS,
+        straggler_factor: float = STRAGGLER_FACTOR,
+    ):
+        self.estimator = estimator
+        self.timeout_factor = timeout_factor
+        self.min_timeout_secs = min_timeout_secs
+        self.straggler_factor = straggler_factor
+
+        # Map of in-flight task ids to the task, the time it started, and its
+        # estimated execution time
+        self.in_flight: Dict[int, Tuple[TaskObject, float, float]] = {}
+        # Map of task ids to the number of times they have timed out
+        self.num_timeouts: Dict[int, int] = {}
+        # In-flight tasks that we have flagged as stragglers
+        self.stragglers: Dict[int, TaskObject] = {}
+        # Tasks that we have started a speculative copy of, and how many of
+        # the copies finished first
+        self.speculated_task_ids: Set[int] = set()
+        self.num_speculative_wins = 0
+
+        self.num_stragglers = 0
+
+    def get_timeout_secs(self, task: TaskObject) -> float:
+        """
+        Time a task can run for before we cancel it, or None if timeouts are
+        disabled
+        """
+        if self.timeout_factor <= 0:
+            return None
+
+        timeout_secs = max(
+            self.timeout_factor * self.estimator.get_estimate(task),
+            self.min_timeout_secs,
+        )
+        return timeout_secs * 2 ** self.num_timeouts.get(task.task_id, 0)
+
+    def task_started(self, task: TaskObject, now: float) -> None:
+        self.in_flight[task.task_id] = (
+            task,
+            now,
+            self.estimator.get_estimate(task),
+        )
+
+    def task_timed_out(self, task_id: int) -> None:
+        self.num_timeouts[task_id] = self.num_timeouts.get(task_id, 0) + 1
+
+    def task_finished(self, task_id: int) -> None:
+        self.in_flight.pop(task_id, None)
+        self.stragglers.pop(task_id, None)
+
+    def update_stragglers(
+        self, now: float
+    ) -> List[Tuple[TaskObject, float, float]]:
+        """
+        Flag the in-flight tasks that have become stragglers, and return the
+        newly flagged ones with how long they have run for, and their
+        estimate
+        """
+        new_stragglers = []
+        for task_id, (task, start_ts, estimate) in self.in_flight.items():
+            if (
+                task_id not in self.stragglers
+                and now - start_ts > self.straggler_factor * estimate
+            ):
+                self.stragglers[task_id] = task
+                new_stragglers.append((task, now - start_ts, estimate))
+
+        self.num_stragglers += len(new_stragglers)
+        return new_stragglers
+
+    def print_summary(self) -> None:
+        print(
+            "Task deadlines: {} timeouts, {} stragglers, {} speculative copies"
+            " ({} finished first)".format(
+                sum(self.num_timeouts.values()),
+                self.num_stragglers,
+                len(self.speculated_task_ids),
+                self.num_speculative_wins,
+            )
+        )
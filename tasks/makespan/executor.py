@@ -0,0 +1,423 @@
+from asyncio import new_event_loop, run_coroutine_threadsafe, to_thread
+from logging import getLogger
+from math import ceil
+from os.path import basename
+from queue import Queue
+from subprocess import CalledProcessError
+from tasks.makespan.data import ResultQueueItem, WorkQueueItem
+from tasks.util.elastic import (
+    ELASTIC_KERNEL,
+    OPENMP_ELASTIC_FUNCTION,
+    OPENMP_ELASTIC_NATIVE_BINARY,
+    OPENMP_ELASTIC_USER,
+    get_elastic_input_data,
+)
+from tasks.util.faasm import (
+    async_post_msg_and_get_result_json,
+    get_faasm_exec_time_from_json,
+    has_app_failed,
+)
+from tasks.util.kernels import get_openmp_kernel_cmdline
+from tasks.util.lammps import (
+    LAMMPS_FAASM_USER,
+    LAMMPS_DOCKER_BINARY,
+    LAMMPS_DOCKER_DIR,
+    LAMMPS_FAASM_MIGRATION_NET_FUNC,
+    LAMMPS_MIGRATION_NET_DOCKER_BINARY,
+    LAMMPS_MIGRATION_NET_DOCKER_DIR,
+    LAMMPS_SIM_NUM_ITERATIONS,
+    get_lammps_data_file,
+    get_lammps_migration_params,
+    get_lammps_workload,
+)
+from tasks.util.makespan import (
+    GRANNY_ELASTIC_BASELINES,
+    GRANNY_FT_BASELINES,
+    GRANNY_MIGRATE_BASELINES,
+    MPI_MIGRATE_WORKLOADS,
+    MPI_WORKLOADS,
+    NATIVE_BASELINES,
+    OPENMP_WORKLOADS,
+    get_user_id_from_task,
+    get_workload_from_trace,
+)
+from tasks.util.openmpi import async_run_kubectl_cmd, get_native_mpi_pods
+from threading import Thread
+from time import time
+from typing import Dict, Tuple
+
+"""
+Execution of the tasks that the batch scheduler has placed. This file has the
+helper methods to translate a work item into a native command or a Faasm
+request, shared by all executor backends, and the asyncio-based executor.
+"""
+
+exec_logger = getLogger("Scheduler")
+
+# Available executor backends:
+# - process: a pool of processes, each blocking on the execution of one task
+# - asyncio: one coroutine per in-flight task, all in the same event loop
+ALLOWED_EXECUTORS = ["process", "asyncio"]
+
+# Native tasks with a deadline run under `timeout` in their pod. We give them
+# some time to stop once we ask them to, before killing them. `timeout` exits
+# with one of these codes if it had to stop the task
+TIMEOUT_KILL_AFTER_SECS = 30
+TIMEOUT_EXIT_CODES = [124, 137]
+
+
+def get_lammps_workload_config(work_item: WorkQueueItem) -> Tuple[Dict, str]:
+    """
+    Choose the right workload config and data file for a LAMMPS simulation
+    """
+    if work_item.task.app == "mpi-locality":
+        lammps_workload = "very-network"
+    else:
+        lammps_workload = "compute"
+
+    workload_config = get_lammps_workload(lammps_workload)
+    assert "data_file" in workload_config, "Workload config has no data file!"
+    data_file = get_lammps_data_file(workload_config["data_file"])["data"][0]
+
+    return workload_config, data_file
+
+
+def get_native_master_vm(master_vm_ip: str) -> str:
+    """
+    Get the VM name for an IP directly from kuberenetes every time, as the
+    translation may become stale in a faulty workload (e.g. mpi-spot)
+    """
+    names, ips = get_native_mpi_pods("makespan")
+    for name, ip in zip(names, ips):
+        if ip == master_vm_ip:
+            return name
+
+    return None
+
+
+def get_native_timeout_prefix(work_item: WorkQueueItem) -> str:
+    """
+    Prefix to run a native command under `timeout` in the pod, so that the
+    task stops running (in every VM) when it reaches its deadline
+    """
+    if work_item.timeout_secs is None:
+        return ""
+
+    return "timeout -k {} {} ".format(
+        TIMEOUT_KILL_AFTER_SECS, ceil(work_item.timeout_secs)
+    )
+
+
+def has_native_task_timed_out(
+    work_item: WorkQueueItem, error: CalledProcessError
+) -> bool:
+    return (
+        work_item.timeout_secs is not None
+        and error.returncode in TIMEOUT_EXIT_CODES
+    )
+
+
+def get_native_exec_cmd(work_item: WorkQueueItem, master_vm: str) -> str:
+    """
+    Get the `kubectl` command to execute a task in a native baseline
+    """
+    if work_item.task.app in MPI_WORKLOADS:
+        workload_config, data_file = get_lammps_workload_config(work_item)
+        if work_item.task.app == "mpi":
+            binary = LAMMPS_DOCKER_BINARY
+            lammps_dir = LAMMPS_DOCKER_DIR
+        elif work_item.task.app in MPI_MIGRATE_WORKLOADS:
+            binary = LAMMPS_MIGRATION_NET_DOCKER_BINARY
+            lammps_dir = LAMMPS_MIGRATION_NET_DOCKER_DIR
+        native_cmdline = "-in {}/{}.faasm.native".format(lammps_dir, data_file)
+        world_size = work_item.task.size
+        allocated_pod_ips = []
+        for tup in work_item.sched_decision:
+            allocated_pod_ips += [tup[0]] * tup[1]
+
+        mpirun_cmd = [
+            "mpirun",
+            get_lammps_migration_params(
+                num_loops=workload_config["num_iterations"],
+                num_net_loops=workload_config["num_net_loops"],
+                chunk_size=workload_config["chunk_size"],
+                native=True,
+            ),
+            "-np {}".format(world_size),
+            # To improve OpenMPI performance, we tell it exactly where to run
+            # each rank. According to the MPI manual, to specify multiple
+            # slots for the same host, we must repeat the host name. This way,
+            # the host string would end up looking like
+            # mpirun -np 5 hostA,hostA,hostA,hostB,hostB ...
+            # https://docs.oracle.com/cd/E19923-01/820-6793-10/ExecutingPrograms.html#50524166_76503
+            "-host {}".format(",".join(allocated_pod_ips)),
+            binary,
+            native_cmdline,
+        ]
+        mpirun_cmd = " ".join(mpirun_cmd)
+
+        exec_cmd = [
+            "exec",
+            master_vm,
+            "--",
+            "su mpirun -c '{}{}'".format(
+                get_native_timeout_prefix(work_item), mpirun_cmd
+            ),
+        ]
+        return " ".join(exec_cmd)
+
+    if work_item.task.app in OPENMP_WORKLOADS:
+        openmp_cmd = "bash -c '{} {}{} {}'".format(
+            get_elastic_input_data(native=True),
+            get_native_timeout_prefix(work_item),
+            OPENMP_ELASTIC_NATIVE_BINARY,
+            get_openmp_kernel_cmdline(ELASTIC_KERNEL, work_item.task.size),
+        )
+
+        exec_cmd = [
+            "exec",
+            master_vm,
+            "--",
+            openmp_cmd,
+        ]
+        return " ".join(exec_cmd)
+
+    raise RuntimeError("Unrecognised app: {}".format(work_item.task.app))
+
+
+def get_faasm_msg_and_req(
+    work_item: WorkQueueItem,
+    baseline: str,
+    num_cpus_per_vm: int,
+    num_tasks_per_user: int,
+    trace_str: str,
+) -> Tuple[Dict, Dict]:
+    """
+    Get the message and request dictionaries to execute a task in Faasm
+    """
+    req = {}
+
+    if work_item.task.app in MPI_WORKLOADS:
+        workload_config, data_file = get_lammps_workload_config(work_item)
+        user = LAMMPS_FAASM_USER
+        func = LAMMPS_FAASM_MIGRATION_NET_FUNC
+        file_name = basename(data_file)
+        cmdline = "-in faasm://lammps-data/{}".format(file_name)
+
+        req["user"] = user
+        req["function"] = func
+        if get_workload_from_trace(trace_str) == "mpi-evict":
+            req["subType"] = get_user_id_from_task(
+                num_tasks_per_user, work_item.task.task_id
+            )
+
+        msg = {
+            "user": user,
+            "function": func,
+            "cmdline": cmdline,
+            "mpi": True,
+            "mpi_world_size": work_item.task.size,
+        }
+
+        # If attempting to migrate, add migration parameters
+        baselines_with_migration = (
+            GRANNY_MIGRATE_BASELINES + GRANNY_FT_BASELINES
+        )
+        if work_item.task.app in MPI_MIGRATE_WORKLOADS:
+            check_every = (
+                1
+                if baseline in baselines_with_migration
+                else LAMMPS_SIM_NUM_ITERATIONS
+            )
+            msg["input_data"] = get_lammps_migration_params(
+                check_every=check_every,
+                num_loops=workload_config["num_iterations"],
+                num_net_loops=workload_config["num_net_loops"],
+                chunk_size=workload_config["chunk_size"],
+            )
+    elif work_item.task.app in OPENMP_WORKLOADS:
+        if work_item.task.size > num_cpus_per_vm:
+            print(
+                "Requested OpenMP execution with more parallelism"
+                "than slots in the current environment:"
+                "{} > {}".format(work_item.task.size, num_cpus_per_vm)
+            )
+            raise RuntimeError("Error in OpenMP task trace!")
+        user = OPENMP_ELASTIC_USER
+        func = OPENMP_ELASTIC_FUNCTION
+        msg = {
+            "user": user,
+            "function": func,
+            "input_data": get_elastic_input_data(),
+            "cmdline": get_openmp_kernel_cmdline(
+                ELASTIC_KERNEL, work_item.task.size
+            ),
+            "isOmp": True,
+            "ompNumThreads": work_item.task.size,
+        }
+
+        req["user"] = user
+        req["function"] = func
+        req["singleHostHint"] = True
+        req["elasticScaleHint"] = baseline in GRANNY_ELASTIC_BASELINES
+    else:
+        raise RuntimeError("Unrecognised app: {}".format(work_item.task.app))
+
+    return msg, req
+
+
+def get_result_queue_item(
+    work_item: WorkQueueItem,
+    master_vm_ip: str,
+    has_failed: bool,
+    actual_time: float,
+    start_ts: float,
+    end_ts: float,
+    timed_out: bool = False,
+) -> ResultQueueItem:
+    if timed_out:
+        exec_logger.error(
+            "Task {} timed out after {:.2f} seconds".format(
+                work_item.task.task_id, work_item.timeout_secs
+            )
+        )
+        return ResultQueueItem(
+            work_item.task.task_id, -1, -1, -1, master_vm_ip, timed_out=True
+        )
+
+    if has_failed:
+        exec_logger.error(
+            "Error executing task {}".format(work_item.task.task_id)
+        )
+        return ResultQueueItem(
+            work_item.task.task_id, -1, -1, -1, master_vm_ip
+        )
+
+    return ResultQueueItem(
+        work_item.task.task_id,
+        actual_time,
+        start_ts,
+        end_ts,
+        master_vm_ip,
+    )
+
+
+class AsyncioExecutor:
+    """
+    Executor that runs each in-flight task as a coroutine in an event loop in
+    a background thread. Faasm invocations and native `kubectl` commands do
+    not block while the task runs, so one scheduler process can drive as many
+    concurrent tasks as the cluster fits. Results are put in a thread-safe
+    queue, that the scheduler consumes as it does with the process pool
+    """
+
+    def __init__(
+        self,
+        result_queue: Queue,
+        baseline: str,
+        num_cpus_per_vm: int,
+        num_tasks_per_user: int,
+        trace_str: str,
+    ):
+        self.result_queue = result_queue
+        self.baseline = baseline
+        self.num_cpus_per_vm = num_cpus_per_vm
+        self.num_tasks_per_user = num_tasks_per_user
+        self.trace_str = trace_str
+
+        self.loop = new_event_loop()
+        self.loop_thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.in_flight_futures = set()
+
+    def start(self) -> None:
+        self.loop_thread.start()
+
+    def submit(self, work_item: WorkQueueItem) -> None:
+        future = run_coroutine_threadsafe(
+            self.execute_task(work_item), self.loop
+        )
+        self.in_flight_futures.add(future)
+        future.add_done_callback(self.in_flight_futures.discard)
+
+    def shutdown(self) -> None:
+        for future in list(self.in_flight_futures):
+            future.result()
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+
+    async def run_task(
+        self, work_item: WorkQueueItem, master_vm_ip: str
+    ) -> Tuple[bool, bool, float, float]:
+        """
+        Run a task, and return whether it failed, whether it timed out, its
+        execution time, and the timestamp at which it started
+        """
+        if self.baseline in NATIVE_BASELINES:
+            master_vm = await to_thread(get_native_master_vm, master_vm_ip)
+            exec_cmd = get_native_exec_cmd(work_item, master_vm)
+
+            start_ts = time()
+            has_failed = False
+            timed_out = False
+            try:
+                await async_run_kubectl_cmd("makespan", exec_cmd)
+            except CalledProcessError as e:
+                timed_out = has_native_task_timed_out(work_item, e)
+                has_failed = not timed_out
+            return has_failed, timed_out, int(time() - start_ts), start_ts
+
+        msg, req = get_faasm_msg_and_req(
+            work_item,
+            self.baseline,
+            self.num_cpus_per_vm,
+            self.num_tasks_per_user,
+            self.trace_str,
+        )
+
+        start_ts = time()
+        result_json = await async_post_msg_and_get_result_json(
+            msg, req_dict=req
+        )
+        return (
+            has_app_failed(result_json),
+            False,
+            int(get_faasm_exec_time_from_json(result_json)),
+            start_ts,
+        )
+
+    async def execute_task(self, work_item: WorkQueueItem) -> None:
+        master_vm_ip = None
+        if len(work_item.sched_decision) > 0:
+            master_vm_ip = work_item.sched_decision[0][0]
+
+        has_failed = False
+        timed_out = False
+        actual_time = 0
+        start_ts = 0
+        try:
+            has_failed, timed_out, actual_time, start_ts = await self.run_task(
+                work_item, master_vm_ip
+            )
+        except Exception as e:
+            # An exception in a coroutine would otherwise go unnoticed, and
+            # the scheduler would wait for this task forever
+            exec_logger.error(
+                "Exception executing task {}: {}".format(
+                    work_item.task.task_id, e
+                )
+            )
+            has_failed = True
+
+        self.result_queue.put(
+            get_result_queue_item(
+                work_item,
+                master_vm_ip,
+                has_failed,
+                actual_time,
+                start_ts,
+                time(),
+                timed_out=timed_out,
+            )
+        )
@@ -0,0 +1,286 @@
+from math import gamma
+from random import Random
+from tasks.makespan.data import EvictionEvent
+from typing import Iterator, List
+
+"""
+Fault models for the `mpi-spot` workload. A fault model is a seeded process
+of spot VM evictions: a sequence of (timestamp, evicted VMs) events, where
+VMs are identified by their index in the cluster's VM list. The same model
+drives the live fault injector and the offline simulator, so that both see
+the same evictions for the same seed.
+"""
+
+# Seed we use unless told otherwise, so that experiments are reproducible
+DEFAULT_FAULT_SEED = 0
+
+# Defaults of the original fault injector: every minute we evict a quarter
+# of the VMs
+DEFAULT_FAULT_PERIOD_SECS = 60
+DEFAULT_FAULT_VMS_FRACTION = 0.25
+
+# Default shape of the Weibull inter-eviction times. A shape below 1 means
+# that evictions come in bursts
+DEFAULT_WEIBULL_SHAPE = 0.7
+
+# For correlated evictions, VMs are grouped in zones of consecutive indices
+DEFAULT_FAULT_ZONE_SIZE = 4
+
+REPLAY_FILE_HEADER = "TimeStampSecs,EvictedVmIdxs"
+
+
+class FaultModel:
+    """
+    Base class for fault models. Subclasses define the time between
+    evictions. In each eviction we evict `num_faults` VMs uniformly at random
+    and, if `correlation` is positive, each other VM in the same zone as an
+    evicted VM is also evicted with that probability
+    """
+
+    name: str = ""
+
+    def __init__(
+        self,
+        num_faults: int = 1,
+        seed: int = DEFAULT_FAULT_SEED,
+        correlation: float = 0.0,
+        zone_size: int = DEFAULT_FAULT_ZONE_SIZE,
+    ):
+        if correlation < 0 or correlation > 1:
+            raise RuntimeError(
+                "Eviction correlation must be in [0, 1]: {}".format(
+                    correlation
+                )
+            )
+
+        self.num_faults = num_faults
+        self.seed = seed
+        self.correlation = correlation
+        self.zone_size = zone_size
+
+    def get_inter_eviction_secs(self, rng: Random) -> float:
+        raise NotImplementedError
+
+    def get_evicted_vms(self, rng: Random, num_vms: int) -> List[int]:
+        evicted_vms = set(
+            rng.sample(range(num_vms), min(self.num_faults, num_vms))
+        )
+
+        if self.correlation > 0:
+            for vm_idx in sorted(evicted_vms):
+                zone_start = vm_idx - vm_idx % self.zone_size
+                for other_idx in range(
+                    zone_start, min(zone_start + self.zone_size, num_vms)
+                ):
+                    if rng.random() < self.correlation:
+                        evicted_vms.add(other_idx)
+
+        return sorted(evicted_vms)
+
+    def iter_events(self, num_vms: int) -> Iterator[EvictionEvent]:
+        """
+        Iterate over the (infinite) eviction events of a cluster with
+        `num_vms` VMs. Every call starts the same sequence again
+        """
+        rng = Random(self.seed)
+        ts = 0.0
+        while True:
+            ts += self.get_inter_eviction_secs(rng)
+            yield EvictionEvent(ts, self.get_evicted_vms(rng, num_vms))
+
+    def get_events(
+        self, num_vms: int, horizon_secs: float
+    ) -> List[EvictionEvent]:
+        events = []
+        for event in self.iter_events(num_vms):
+            if event.ts > horizon_secs:
+                break
+
+            events.append(event)
+
+        return events
+
+    def get_num_pending_evictions(self, grace_period_secs: float) -> int:
+        """
+        If, at any time, the planner always knows about the same number of
+        upcoming evictions, return it. Granny's scheduler waits for them to
+        be registered before counting free slots
+        """
+        return None
+
+
+class PeriodicFaultModel(FaultModel):
+    """
+    Evict `num_faults` VMs every `period_secs`. With the defaults, and a
+    grace period as long as the period, this is the original fault injector
+    """
+
+    name = "periodic"
+
+    def __init__(self, period_secs=DEFAULT_FAULT_PERIOD_SECS, **kwargs):
+        super().__init__(**kwargs)
+        self.period_secs = period_secs
+
+    def get_inter_eviction_secs(self, rng):
+        return self.period_secs
+
+    def get_num_pending_evictions(self, grace_period_secs):
+        # We notify the next eviction right after the previous one
+        if self.correlation == 0 and grace_period_secs >= self.period_secs:
+            return self.num_faults
+
+        return None
+
+
+class PoissonFaultModel(FaultModel):
+    """
+    Evictions arrive as a Poisson process, i.e. the time between evictions
+    is exponential with mean `mean_secs`
+    """
+
+    name = "poisson"
+
+    def __init__(self, mean_secs=DEFAULT_FAULT_PERIOD_SECS, **kwargs):
+        super().__init__(**kwargs)
+        self.mean_secs = mean_secs
+
+    def get_inter_eviction_secs(self, rng):
+        return rng.expovariate(1 / self.mean_secs)
+
+
+class WeibullFaultModel(FaultModel):
+    """
+    The time between evictions follows a Weibull distribution with mean
+    `mean_secs` and shape `shape`. A shape of 1 is a Poisson process
+    """
+
+    name = "weibull"
+
+    def __init__(
+        self,
+        mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+        shape=DEFAULT_WEIBULL_SHAPE,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.mean_secs = mean_secs
+        self.shape = shape
+        self.scale_secs = mean_secs / gamma(1 + 1 / shape)
+
+    def get_inter_eviction_secs(self, rng):
+        return rng.weibullvariate(self.scale_secs, self.shape)
+
+
+class ReplayFaultModel(FaultModel):
+    """
+    Replay the eviction events in a file. Each line has the timestamp of the
+    eviction (in seconds since the start of the experiment) followed by the
+    indices of the evicted VMs, all comma-separated
+    """
+
+    name = "replay"
+
+    def __init__(self, replay_file, **kwargs):
+        super().__init__(**kwargs)
+        self.replay_file = replay_file
+        self.events = read_eviction_schedule(replay_file)
+
+    def iter_events(self, num_vms):
+        for event in self.events:
+            if any([vm_idx >= num_vms for vm_idx in event.vm_idxs]):
+                print(
+                    "Eviction at {} s evicts VMs {} but the cluster only"
+                    " has {} VMs".format(event.ts, event.vm_idxs, num_vms)
+                )
+                raise RuntimeError("Eviction schedule does not fit cluster")
+
+            yield event
+
+
+def read_eviction_schedule(file_path: str) -> List[EvictionEvent]:
+    events = []
+    with open(file_path, "r") as in_file:
+        for line in in_file:
+            line = line.strip()
+            if line == "" or line == REPLAY_FILE_HEADER:
+                continue
+
+            fields = line.split(",")
+            events.append(
+                EvictionEvent(float(fields[0]), [int(f) for f in fields[1:]])
+            )
+
+    return sorted(events, key=lambda event: event.ts)
+
+
+def write_eviction_schedule(
+    file_path: str, events: List[EvictionEvent]
+) -> None:
+    with open(file_path, "w") as out_file:
+        out_file.write("{}\n".format(REPLAY_FILE_HEADER))
+        for event in events:
+            out_file.write(
+                "{}\n".format(
+                    ",".join(
+                        ["{:.3f}".format(event.ts)]
+                        + [str(vm_idx) for vm_idx in event.vm_idxs]
+                    )
+                )
+            )
+
+
+# Registry of the available fault models, indexed by name
+FAULT_MODELS = {
+    model.name: model
+    for model in [
+        PeriodicFaultModel,
+        PoissonFaultModel,
+        WeibullFaultModel,
+        ReplayFaultModel,
+    ]
+}
+ALLOWED_FAULT_MODELS = list(FAULT_MODELS.keys())
+DEFAULT_FAULT_MODEL = PeriodicFaultModel.name
+
+
+def get_fault_model(
+    name: str,
+    num_vms: int,
+    mean_secs: float = DEFAULT_FAULT_PERIOD_SECS,
+    num_faults: int = None,
+    seed: int = DEFAULT_FAULT_SEED,
+    correlation: float = 0.0,
+    shape: float = DEFAULT_WEIBULL_SHAPE,
+    replay_file: str = None,
+) -> FaultModel:
+    """
+    Build a fault model from its name and parameters (e.g. from the command
+    line). By default we evict a quarter of the VMs in each eviction
+    """
+    if name not in FAULT_MODELS:
+        print(
+            "Unrecognised fault model ({}) must be one in: {}".format(
+                name, ALLOWED_FAULT_MODELS
+            )
+        )
+        raise RuntimeError("Unrecognised fault model: {}".format(name))
+
+    if num_faults is None:
+        num_faults = int(num_vms * DEFAULT_FAULT_VMS_FRACTION)
+    kwargs = {
+        "num_faults": num_faults,
+        "seed": seed,
+        "correlation": correlation,
+    }
+
+    if name == PeriodicFaultModel.name:
+        return PeriodicFaultModel(period_secs=mean_secs, **kwargs)
+    if name == PoissonFaultModel.name:
+        return PoissonFaultModel(mean_secs=mean_secs, **kwargs)
+    if name == WeibullFaultModel.name:
+        return WeibullFaultModel(mean_secs=mean_secs, shape=shape, **kwargs)
+
+    if replay_file is None:
+        raise RuntimeError("The replay fault model needs a replay file")
+
+    return ReplayFaultModel(replay_file, **kwargs)
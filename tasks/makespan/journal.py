@@ -0,0 +1,260 @@
+from dataclasses import dataclass, field
+from json import JSONDecodeError, dumps as json_dumps, loads as json_loads
+from os import SEEK_END, fsync, makedirs
+from os.path import exists, join, splitext
+from tasks.makespan.data import ResultQueueItem
+from tasks.util.makespan import (
+    JOURNAL_FILE_PREFIX,
+    MAKESPAN_RESULTS_DIR,
+    get_trace_ending,
+)
+from tasks.util.table import ExecutedTaskInfo
+from time import time
+from typing import Dict, List, Set, Tuple
+
+"""
+Append-only journal of the batch scheduler's decisions and results, so that
+we can resume a makespan run if the process driving it dies. Each line is a
+JSON record, and we sync the file after every record. The journal is the
+source of truth to rebuild the scheduler state, the CSV result files are only
+appended to.
+"""
+
+JOURNAL_EVENT_RUN_START = "run-start"
+JOURNAL_EVENT_RESUME = "resume"
+JOURNAL_EVENT_TASK_START = "task-start"
+JOURNAL_EVENT_TASK_RESULT = "task-result"
+JOURNAL_EVENT_TASK_RETRY = "task-retry"
+JOURNAL_EVENT_TASK_ABANDONED = "task-abandoned"
+
+# Parameters of the run that must match for us to resume from a journal
+JOURNAL_RUN_PARAMS = [
+    "baseline",
+    "num_vms",
+    "num_tasks_per_user",
+    "trace_str",
+    "time_compression",
+]
+
+
+@dataclass
+class JournalReplay:
+    """
+    Scheduler state rebuilt from a journal
+    """
+
+    # Seconds of experiment time elapsed before the process died
+    elapsed_secs: float = 0.0
+    # Information on the tasks that finished successfully
+    executed_task_info: Dict[int, ExecutedTaskInfo] = field(
+        default_factory=dict
+    )
+    # Tasks that had started, but had not finished successfully, when the
+    # process died. We must run them again
+    interrupted_task_ids: List[int] = field(default_factory=list)
+    # Number of times we had retried each failed task, and the tasks that ran
+    # out of retries (that we must not run again)
+    num_retries: Dict[int, int] = field(default_factory=dict)
+    abandoned_task_ids: List[int] = field(default_factory=list)
+
+
+def get_journal_file(
+    baseline,
+    num_vms,
+    num_tasks_per_user,
+    trace_str,
+    result_dir=MAKESPAN_RESULTS_DIR,
+):
+    file_name = "makespan_{}_{}_{}_{}.jsonl".format(
+        JOURNAL_FILE_PREFIX,
+        baseline,
+        (
+            num_vms
+            if num_tasks_per_user is None
+            else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
+        ),
+        splitext(get_trace_ending(trace_str))[0],
+    )
+    return join(result_dir, file_name)
+
+
+class SchedulerJournal:
+    """
+    Journal of one makespan run. Records carry the experiment time at which
+    they were written (i.e. seconds since the scheduler's start timestamp) so
+    that, when resuming, the time the process was down does not count
+    towards the makespan
+    """
+
+    def __init__(
+        self,
+        baseline: str,
+        num_vms: int,
+        num_tasks_per_user: int,
+        trace_str: str,
+        time_compression: float = 1,
+        result_dir: str = MAKESPAN_RESULTS_DIR,
+    ):
+        self.run_params = {
+            "baseline": baseline,
+            "num_vms": num_vms,
+            "num_tasks_per_user": num_tasks_per_user,
+            "trace_str": trace_str,
+            "time_compression": time_compression,
+        }
+        self.result_dir = result_dir
+        self.file_path = get_journal_file(
+            baseline, num_vms, num_tasks_per_user, trace_str, result_dir
+        )
+        self.out_file = None
+        self.start_ts = 0.0
+
+    def read_records(self) -> List[Dict]:
+        if not exists(self.file_path):
+            print(
+                "Can not resume run, journal file not found: {}".format(
+                    self.file_path
+                )
+            )
+            raise RuntimeError("Journal file not found")
+
+        records = []
+        with open(self.file_path, "r") as in_file:
+            for line in in_file:
+                try:
+                    records.append(json_loads(line))
+                except JSONDecodeError:
+                    # The process may have died half-way through writing the
+                    # last record
+                    print(
+                        "WARNING: ignoring corrupt journal record: {}".format(
+                            line.strip()
+                        )
+                    )
+
+        return records
+
+    def load(self) -> JournalReplay:
+        """
+        Rebuild the scheduler state from the journal of a previous run with
+        the same parameters
+        """
+        records = self.read_records()
+        if len(records) == 0 or records[0]["event"] != JOURNAL_EVENT_RUN_START:
+            raise RuntimeError("Malformed journal: {}".format(self.file_path))
+
+        for param in JOURNAL_RUN_PARAMS:
+            if records[0][param] != self.run_params[param]:
+                print(
+                    "Journal run parameter {} does not match: {} != {}".format(
+                        param, records[0][param], self.run_params[param]
+                    )
+                )
+                raise RuntimeError("Journal does not match the run")
+
+        replay = JournalReplay()
+        started_task_info: Dict[int, ExecutedTaskInfo] = {}
+        abandoned_task_ids: Set[int] = set()
+        for record in records:
+            replay.elapsed_secs = max(
+                replay.elapsed_secs, record["elapsed_secs"]
+            )
+
+            if record["event"] == JOURNAL_EVENT_TASK_START:
+                started_task_info[record["task_id"]] = ExecutedTaskInfo(
+                    record["task_id"], -1, record["time_in_queue"], -1, -1
+                )
+            elif record["event"] == JOURNAL_EVENT_TASK_RESULT:
+                task_info = started_task_info.pop(record["task_id"], None)
+                if task_info is None:
+                    continue
+
+                # Failed tasks must also run again
+                if record["exec_time"] == -1:
+                    started_task_info[record["task_id"]] = task_info
+                    continue
+
+                task_info.time_executing = record["exec_time"]
+                task_info.exec_start_ts = record["start_ts"]
+                task_info.exec_end_ts = record["end_ts"]
+                replay.executed_task_info[record["task_id"]] = task_info
+            elif record["event"] == JOURNAL_EVENT_TASK_RETRY:
+                replay.num_retries[record["task_id"]] = record["num_retries"]
+            elif record["event"] == JOURNAL_EVENT_TASK_ABANDONED:
+                replay.num_retries[record["task_id"]] = record["num_retries"]
+                started_task_info.pop(record["task_id"], None)
+                abandoned_task_ids.add(record["task_id"])
+
+        replay.interrupted_task_ids = sorted(started_task_info.keys())
+        replay.abandoned_task_ids = sorted(abandoned_task_ids)
+
+        return replay
+
+    def open(self, start_ts: float, resume: bool = False) -> None:
+        """
+        Start a new journal, or append to the existing one if resuming
+        """
+        makedirs(self.result_dir, exist_ok=True)
+        self.start_ts = start_ts
+        self.out_file = open(self.file_path, "a" if resume else "w")
+
+        if resume:
+            # Terminate a record the previous process did not finish writing
+            with open(self.file_path, "rb") as in_file:
+                in_file.seek(0, SEEK_END)
+                if in_file.tell() > 0:
+                    in_file.seek(-1, SEEK_END)
+                    if in_file.read(1) != b"\n":
+                        self.out_file.write("\n")
+
+            self.write_record(JOURNAL_EVENT_RESUME)
+        else:
+            self.write_record(JOURNAL_EVENT_RUN_START, **self.run_params)
+
+    def close(self) -> None:
+        if self.out_file is not None:
+            self.out_file.close()
+            self.out_file = None
+
+    def write_record(self, event: str, **kwargs) -> None:
+        record = {"event": event, "elapsed_secs": time() - self.start_ts}
+        record.update(kwargs)
+
+        self.out_file.write("{}\n".format(json_dumps(record)))
+        self.out_file.flush()
+        fsync(self.out_file.fileno())
+
+    def record_task_start(
+        self,
+        task_id: int,
+        scheduling_decision: List[Tuple[str, int]],
+        time_in_queue: float,
+    ) -> None:
+        self.write_record(
+            JOURNAL_EVENT_TASK_START,
+            task_id=task_id,
+            sched_decision=scheduling_decision,
+            time_in_queue=time_in_queue,
+        )
+
+    def record_task_retry(self, task_id: int, num_retries: int) -> None:
+        self.write_record(
+            JOURNAL_EVENT_TASK_RETRY, task_id=task_id, num_retries=num_retries
+        )
+
+    def record_task_abandoned(self, task_id: int, num_retries: int) -> None:
+        self.write_record(
+            JOURNAL_EVENT_TASK_ABANDONED,
+            task_id=task_id,
+            num_retries=num_retries,
+        )
+
+    def record_task_result(self, result: ResultQueueItem) -> None:
+        self.write_record(
+            JOURNAL_EVENT_TASK_RESULT,
+            task_id=result.task_id,
+            exec_time=result.exec_time,
+            start_ts=result.start_ts,
+            end_ts=result.end_ts,
+            master_ip=result.master_ip,
+        )
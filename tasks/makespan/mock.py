@@ -0,0 +1,85 @@
+from configparser import ConfigParser
+from invoke import task
+from os import makedirs
+from os.path import dirname, join
+from tasks.makespan.mock_planner import (
+    MOCK_EVICTION_GRACE_SECS,
+    MOCK_MIGRATION_OVERHEAD_SECS,
+    MOCK_PLANNER_HOST,
+    MOCK_PLANNER_PORT,
+    MockPlanner,
+    get_mock_host_ips,
+    get_mock_host_names,
+    get_mock_planner_server,
+)
+from tasks.util.env import PROJ_ROOT
+from tasks.util.faasm import FAASM_MOCK_BACKEND
+
+MOCK_INI_FILE = join(PROJ_ROOT, "build", "mock", "faasm.ini")
+
+
+def write_mock_ini_file(ini_file, host, port, num_vms):
+    """
+    Write an INI file with the keys that `faasmctl` and our tasks read, so
+    that we can point `FAASM_INI_FILE` to it
+    """
+    config = ConfigParser()
+    config["Faasm"] = {
+        "backend": FAASM_MOCK_BACKEND,
+        "planner_host": host,
+        "planner_port": str(port),
+        "worker_names": ",".join(get_mock_host_names(num_vms)),
+        "worker_ips": ",".join(get_mock_host_ips(num_vms)),
+    }
+
+    makedirs(dirname(ini_file), exist_ok=True)
+    with open(ini_file, "w") as fh:
+        config.write(fh)
+
+
+@task()
+def planner(
+    ctx,
+    num_vms=32,
+    num_cpus_per_vm=8,
+    port=MOCK_PLANNER_PORT,
+    time_scale="1",
+    migration_overhead=MOCK_MIGRATION_OVERHEAD_SECS,
+    eviction_grace=MOCK_EVICTION_GRACE_SECS,
+    ini_file=MOCK_INI_FILE,
+):
+    """
+    Serve a local mock of the Faasm planner to run the Granny baselines
+    without a cluster
+
+    Run: `inv makespan.mock.planner --num-vms --num-cpus-per-vm [--port]`
+
+    Then, in a different shell, `export FAASM_INI_FILE` to the INI file that
+    we print, and run the Granny baselines as usual. Apps take the execution
+    time of our runtime model, times `--time-scale`
+    """
+    num_vms = int(num_vms)
+    port = int(port)
+
+    mock_planner = MockPlanner(
+        get_mock_host_ips(num_vms),
+        int(num_cpus_per_vm),
+        time_scale=float(time_scale),
+        migration_overhead_secs=float(migration_overhead),
+        eviction_grace_secs=float(eviction_grace),
+    )
+    write_mock_ini_file(ini_file, MOCK_PLANNER_HOST, port, num_vms)
+
+    server = get_mock_planner_server(mock_planner, MOCK_PLANNER_HOST, port)
+    print(
+        "Mock planner with {} VMs ({} cores each) listening on {}:{}".format(
+            num_vms, num_cpus_per_vm, MOCK_PLANNER_HOST, port
+        )
+    )
+    print("export FAASM_INI_FILE={}".format(ini_file))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,461 @@
+from dataclasses import dataclass
+from faasmctl.util.gen_proto.faabric_pb2 import (
+    BatchExecuteRequest,
+    BatchExecuteRequestStatus,
+)
+from faasmctl.util.gen_proto.planner_pb2 import (
+    AvailableHostsResponse,
+    GetInFlightAppsResponse,
+    HttpMessage,
+    SetEvictedVmIpsRequest,
+)
+from google.protobuf.json_format import MessageToJson, Parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from tasks.makespan.data import TaskObject
+from tasks.makespan.runtime import RuntimeModel
+from threading import Lock
+from time import time
+from typing import Dict, List, Tuple
+
+"""
+Local stand-in for the Faasm planner. It serves the same HTTP protocol that
+`faasmctl` speaks (a JSON-encoded `HttpMessage` per POST request), so that the
+Granny baselines of the batch scheduler can run end-to-end on one machine,
+without a cluster. Apps do not run: we place them in a set of fake hosts, and
+they finish after the execution time of our runtime model. The planner also
+migrates apps, to compact them and out of VMs about to be evicted, and evicts
+VMs after their grace period.
+"""
+
+mock_logger = getLogger("MockPlanner")
+
+MOCK_PLANNER_HOST = "127.0.0.1"
+MOCK_PLANNER_PORT = 8080
+
+# Same policies as the real planner
+MOCK_PLANNER_POLICIES = ["bin-pack", "compact", "spot"]
+MOCK_PLANNER_DEFAULT_POLICY = "bin-pack"
+
+# Time it takes to migrate an app to other hosts
+MOCK_MIGRATION_OVERHEAD_SECS = 5
+# Time between the planner learns about an eviction and the VMs go away.
+# Same as the grace period of our fault injector
+MOCK_EVICTION_GRACE_SECS = 60
+
+# Error messages that `faasmctl` relies on
+NO_AVAILABLE_HOSTS = "No available hosts"
+APP_NOT_REGISTERED = "App not registered in results"
+
+
+@dataclass
+class MockApp:
+    """
+    App in-flight in the mock planner. The host IPs list has one entry per
+    process (or thread)
+    """
+
+    app_id: int
+    sub_type: int
+    # Original request, to build the results from its first message
+    req: BatchExecuteRequest
+    task: TaskObject
+    host_ips: List[str]
+    start_ts: float
+    end_ts: float
+    # Whether the app checks for migration opportunities while it runs
+    migratable: bool
+
+
+def is_migratable(req: BatchExecuteRequest) -> bool:
+    """
+    LAMMPS apps check for migrations every `check_every` iterations, the
+    first parameter in their input data. They only get to check if it is
+    below the number of iterations
+    """
+    if not req.messages[0].isMpi or len(req.messages[0].inputData) == 0:
+        return False
+
+    params = req.messages[0].inputData.decode("utf-8").split()
+    try:
+        return int(params[0]) < int(params[1])
+    except (IndexError, ValueError):
+        return False
+
+
+class MockPlanner:
+    """
+    State of the mock planner. All requests go through `handle`, that holds
+    a lock, so the HTTP server may use one thread per request. We update the
+    state lazily: apps finish, and VMs are evicted, when the first request
+    after their deadline arrives
+    """
+
+    def __init__(
+        self,
+        host_ips: List[str],
+        num_slots_per_host: int,
+        runtime_model: RuntimeModel = None,
+        time_scale: float = 1,
+        migration_overhead_secs: float = MOCK_MIGRATION_OVERHEAD_SECS,
+        eviction_grace_secs: float = MOCK_EVICTION_GRACE_SECS,
+    ):
+        self.host_ips = host_ips
+        self.num_slots_per_host = num_slots_per_host
+        self.runtime_model = (
+            RuntimeModel() if runtime_model is None else runtime_model
+        )
+        # Factor that we apply to all execution times, to run faster than
+        # real time
+        self.time_scale = time_scale
+        self.migration_overhead_secs = migration_overhead_secs
+        self.eviction_grace_secs = eviction_grace_secs
+
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.policy = MOCK_PLANNER_DEFAULT_POLICY
+        self.used_slots: Dict[str, int] = {ip: 0 for ip in self.host_ips}
+        self.in_flight_apps: Dict[int, MockApp] = {}
+        self.results: Dict[int, BatchExecuteRequestStatus] = {}
+        self.num_migrations = 0
+        self.next_evicted_ips: List[str] = []
+        self.eviction_ts: float = None
+
+    # --------- Request handling -------
+
+    def handle(self, body: str) -> Tuple[int, str]:
+        """
+        Handle one request, and return the HTTP status code and body of the
+        response
+        """
+        http_message = Parse(body, HttpMessage())
+        msg_type = HttpMessage.Type.Name(http_message.type)
+        handlers = {
+            "RESET": self.handle_reset,
+            "GET_AVAILABLE_HOSTS": self.handle_get_available_hosts,
+            "GET_IN_FLIGHT_APPS": self.handle_get_in_flight_apps,
+            "EXECUTE_BATCH": self.handle_execute_batch,
+            "EXECUTE_BATCH_STATUS": self.handle_execute_batch_status,
+            "SET_NEXT_EVICTED_VM": self.handle_set_next_evicted_vm,
+            "SET_POLICY": self.handle_set_policy,
+        }
+        if msg_type not in handlers:
+            return 500, "Unsupported message type: {}".format(msg_type)
+
+        with self.lock:
+            self.update(time())
+            return handlers[msg_type](http_message.payloadJson)
+
+    def handle_reset(self, payload):
+        self.reset()
+        return 200, "Planner fully reset!"
+
+    def handle_get_available_hosts(self, payload):
+        response = AvailableHostsResponse()
+        for ip in self.host_ips:
+            host = response.hosts.add()
+            host.ip = ip
+            host.slots = self.num_slots_per_host
+            host.usedSlots = self.used_slots[ip]
+
+        return 200, MessageToJson(response, indent=None)
+
+    def handle_get_in_flight_apps(self, payload):
+        response = GetInFlightAppsResponse()
+        for app in self.in_flight_apps.values():
+            in_flight_app = response.apps.add()
+            in_flight_app.appId = app.app_id
+            in_flight_app.subType = app.sub_type
+            in_flight_app.size = app.task.size
+            in_flight_app.hostIps.extend(app.host_ips)
+        response.numMigrations = self.num_migrations
+        response.nextEvictedVmIps.extend(self.next_evicted_ips)
+
+        return 200, MessageToJson(response, indent=None)
+
+    def handle_execute_batch(self, payload):
+        req = Parse(payload, BatchExecuteRequest())
+        msg = req.messages[0]
+        if msg.isMpi:
+            task = TaskObject(req.appId, "mpi", msg.mpiWorldSize, 0)
+        else:
+            task = TaskObject(req.appId, "omp", max(msg.ompNumThreads, 1), 0)
+
+        host_ips = self.get_placement(
+            task.size, req.subType, req.singleHostHint, req.elasticScaleHint
+        )
+        if host_ips is None:
+            return 500, NO_AVAILABLE_HOSTS
+
+        # Elastic apps take all the free slots in their host
+        task.size = len(host_ips)
+        for ip in host_ips:
+            self.used_slots[ip] += 1
+
+        now = time()
+        self.in_flight_apps[req.appId] = MockApp(
+            req.appId,
+            req.subType,
+            req,
+            task,
+            host_ips,
+            now,
+            now + self.get_exec_time(task, host_ips),
+            is_migratable(req),
+        )
+
+        status = BatchExecuteRequestStatus()
+        status.appId = req.appId
+        return 200, MessageToJson(status, indent=None)
+
+    def handle_execute_batch_status(self, payload):
+        status = Parse(payload, BatchExecuteRequestStatus())
+        if status.appId in self.results:
+            return 200, MessageToJson(self.results[status.appId], indent=None)
+
+        if status.appId in self.in_flight_apps:
+            status.finished = False
+            return 200, MessageToJson(status, indent=None)
+
+        return 500, APP_NOT_REGISTERED
+
+    def handle_set_next_evicted_vm(self, payload):
+        self.next_evicted_ips = list(
+            Parse(payload, SetEvictedVmIpsRequest()).vmIps
+        )
+        self.eviction_ts = time() + self.eviction_grace_secs
+
+        # Move the apps that can migrate out of the VMs that will go away
+        for app in list(self.in_flight_apps.values()):
+            if app.migratable and any(
+                [ip in self.next_evicted_ips for ip in app.host_ips]
+            ):
+                self.migrate_app(app, self.get_app_placement(app))
+
+        return 200, ""
+
+    def handle_set_policy(self, payload):
+        if payload not in MOCK_PLANNER_POLICIES:
+            return 500, "Unrecognised policy: {}".format(payload)
+
+        self.policy = payload
+        return 200, ""
+
+    # --------- Scheduling -------
+
+    def get_exec_time(self, task: TaskObject, host_ips: List[str]) -> float:
+        part: Dict[str, int] = {}
+        for ip in host_ips:
+            part[ip] = part.get(ip, 0) + 1
+
+        return self.time_scale * self.runtime_model.get_exec_time(
+            task, list(part.items())
+        )
+
+    def get_candidate_hosts(
+        self, sub_type: int, own_slots: Dict[str, int] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Hosts where we may place an app, with their free slots (counting the
+        app's own slots), with the most free slots first. The `compact`
+        policy does not share hosts between users, and the `spot` policy
+        avoids the hosts about to be evicted
+        """
+        own_slots = {} if own_slots is None else own_slots
+        other_users_ips = set()
+        if self.policy == "compact":
+            for app in self.in_flight_apps.values():
+                if app.sub_type != sub_type:
+                    other_users_ips.update(app.host_ips)
+
+        hosts = []
+        for ip in self.host_ips:
+            if ip in other_users_ips:
+                continue
+            if self.policy == "spot" and ip in self.next_evicted_ips:
+                continue
+
+            num_free = (
+                self.num_slots_per_host
+                - self.used_slots[ip]
+                + own_slots.get(ip, 0)
+            )
+            if num_free > 0:
+                hosts.append((ip, num_free))
+
+        # Ties go to the hosts where the app already runs
+        return sorted(
+            hosts, key=lambda host: (-host[1], -own_slots.get(host[0], 0))
+        )
+
+    def get_placement(
+        self,
+        size: int,
+        sub_type: int,
+        single_host: bool = False,
+        elastic: bool = False,
+        own_slots: Dict[str, int] = None,
+    ) -> List[str]:
+        """
+        Pick the host of each process, filling the hosts with most free slots
+        first, or None if the app does not fit
+        """
+        hosts = self.get_candidate_hosts(sub_type, own_slots)
+        if single_host:
+            if len(hosts) == 0 or hosts[0][1] < size:
+                return None
+
+            ip, num_free = hosts[0]
+            return [ip] * (num_free if elastic else size)
+
+        host_ips = []
+        for ip, num_free in hosts:
+            host_ips += [ip] * min(num_free, size - len(host_ips))
+            if len(host_ips) == size:
+                return host_ips
+
+        return None
+
+    def get_app_placement(self, app: MockApp) -> List[str]:
+        own_slots: Dict[str, int] = {}
+        for ip in app.host_ips:
+            own_slots[ip] = own_slots.get(ip, 0) + 1
+
+        return self.get_placement(
+            len(app.host_ips), app.sub_type, own_slots=own_slots
+        )
+
+    def migrate_app(self, app: MockApp, new_host_ips: List[str]) -> None:
+        """
+        Move an app to new hosts. The rest of its execution takes as long as
+        it would in the new hosts, plus the migration overhead
+        """
+        if new_host_ips is None:
+            return
+
+        now = time()
+        remaining = max(app.end_ts - now, 0) / max(
+            app.end_ts - app.start_ts, 1
+        )
+        for ip in app.host_ips:
+            self.used_slots[ip] -= 1
+        for ip in new_host_ips:
+            self.used_slots[ip] += 1
+
+        app.host_ips = new_host_ips
+        app.end_ts = (
+            now
+            + remaining * self.get_exec_time(app.task, new_host_ips)
+            + self.time_scale * self.migration_overhead_secs
+        )
+        self.num_migrations += 1
+
+    def compact_apps(self) -> None:
+        """
+        Once slots free up, migrate the apps that can to fewer hosts
+        """
+        for app in list(self.in_flight_apps.values()):
+            if not app.migratable or len(set(app.host_ips)) == 1:
+                continue
+
+            new_host_ips = self.get_app_placement(app)
+            if new_host_ips is not None and len(set(new_host_ips)) < len(
+                set(app.host_ips)
+            ):
+                self.migrate_app(app, new_host_ips)
+
+    # --------- App completion -------
+
+    def update(self, now: float) -> None:
+        if self.eviction_ts is not None and self.eviction_ts <= now:
+            self.evict_hosts(self.next_evicted_ips)
+
+        finished_apps = [
+            app for app in self.in_flight_apps.values() if app.end_ts <= now
+        ]
+        for app in sorted(finished_apps, key=lambda app: app.end_ts):
+            self.finish_app(app, app.end_ts, return_value=0)
+
+        if len(finished_apps) > 0:
+            self.compact_apps()
+
+    def evict_hosts(self, ips: List[str]) -> None:
+        """
+        The apps still in the evicted VMs fail, and the VMs come back empty
+        straight away
+        """
+        mock_logger.info("Evicting hosts {}".format(ips))
+        for app in list(self.in_flight_apps.values()):
+            if any([ip in ips for ip in app.host_ips]):
+                self.finish_app(app, time(), return_value=1)
+
+        self.next_evicted_ips = []
+        self.eviction_ts = None
+
+    def finish_app(self, app: MockApp, end_ts: float, return_value: int):
+        for ip in app.host_ips:
+            self.used_slots[ip] -= 1
+        del self.in_flight_apps[app.app_id]
+
+        status = BatchExecuteRequestStatus()
+        status.appId = app.app_id
+        status.finished = True
+        status.expectedNumMessages = len(app.host_ips)
+        for idx, ip in enumerate(app.host_ips):
+            result = status.messageResults.add()
+            result.CopyFrom(app.req.messages[0])
+            result.groupIdx = idx
+            result.mpiRank = idx
+            result.executedHost = ip
+            result.returnValue = return_value
+            result.startTimestamp = int(app.start_ts * 1000)
+            result.finishTimestamp = int(end_ts * 1000)
+            if not result.isMpi:
+                break
+        self.results[app.app_id] = status
+
+
+class MockPlannerRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoint of the mock planner. Like the real planner, it takes POST
+    requests to any path
+    """
+
+    planner: MockPlanner = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        code, text = self.planner.handle(body.decode("utf-8"))
+
+        response = text.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        mock_logger.debug(format % args)
+
+
+def get_mock_planner_server(
+    planner: MockPlanner,
+    host: str = MOCK_PLANNER_HOST,
+    port: int = MOCK_PLANNER_PORT,
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundMockPlannerRequestHandler",
+        (MockPlannerRequestHandler,),
+        {"planner": planner},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def get_mock_host_ips(num_vms: int) -> List[str]:
+    return ["10.1.0.{}".format(i) for i in range(num_vms)]
+
+
+def get_mock_host_names(num_vms: int) -> List[str]:
+    return ["mock-worker-{}".format(i) for i in range(num_vms)]
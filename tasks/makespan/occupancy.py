@@ -0,0 +1,220 @@
+from math import ceil
+from numpy import empty, float64, int64
+from tasks.util.makespan import SCHEDULING_INFO_FILE_PREFIX
+from threading import Lock
+from typing import List, Tuple
+
+"""
+Time series of the cluster occupation (idle VMs, idle CPUs, and cross-VM
+links) for the Granny baselines. We observe the occupation whenever the
+planner poller publishes a new snapshot, and resample it onto a time grid, so
+that the resolution of the series does not depend on how often we poll.
+Samples go to a fixed-size ring buffer that we flush to the result sink in
+bulk, and we integrate the series as observations arrive, so that we know
+the idle CPU-seconds of a run without re-reading the results.
+"""
+
+# Samples are on a grid of `MIN` seconds. While the occupation changes, we
+# take every point of the grid, and while it does not we back off (doubling
+# the step) up to one point every `MAX` seconds
+OCCUPANCY_MIN_RESOLUTION_SECS = 0.1
+OCCUPANCY_MAX_RESOLUTION_SECS = 4
+
+# Number of samples that fit in the ring buffer, and how often we flush it
+# even if it is not full
+OCCUPANCY_RING_BUFFER_SIZE = 4096
+OCCUPANCY_FLUSH_PERIOD_SECS = 30
+
+
+class OccupancyRecorder:
+    """
+    Ring buffer of occupation samples, with the running integrals of each
+    series over time. As in our plots, each observation (and each sample)
+    holds until the next one. Observations may arrive at any time, and we
+    sample the occupation they tell us about at the points of the grid
+    """
+
+    def __init__(
+        self,
+        result_sink,
+        num_vms: int,
+        num_cpus_per_vm: int,
+        capacity: int = OCCUPANCY_RING_BUFFER_SIZE,
+        min_resolution_secs: float = OCCUPANCY_MIN_RESOLUTION_SECS,
+        max_resolution_secs: float = OCCUPANCY_MAX_RESOLUTION_SECS,
+        flush_period_secs: float = OCCUPANCY_FLUSH_PERIOD_SECS,
+    ):
+        self.result_sink = result_sink
+        self.num_vms = num_vms
+        self.num_cpus_per_vm = num_cpus_per_vm
+        self.capacity = capacity
+        self.min_resolution_secs = min_resolution_secs
+        self.max_resolution_secs = max_resolution_secs
+        self.flush_period_secs = flush_period_secs
+
+        # Ring buffer, one column per series. We write at `head`, and flush
+        # the `num_buffered` samples before it
+        self.ts = empty(capacity, dtype=float64)
+        self.idle_vms = empty(capacity, dtype=int64)
+        self.idle_cpus = empty(capacity, dtype=int64)
+        self.xvm_links = empty(capacity, dtype=int64)
+        self.head = 0
+        self.num_buffered = 0
+        self.last_flush_ts = None
+        self.lock = Lock()
+
+        # Current step between samples, the next point of the grid that we
+        # will sample, and the last point we sampled
+        self.resolution_secs = min_resolution_secs
+        self.next_sample_ts = None
+        self.last_sample_ts = None
+        self.num_samples = 0
+
+        # Last observation, and the integrals of each series up to it
+        self.first_ts = None
+        self.last_observation: Tuple[float, int, int, int] = None
+        self.idle_vm_secs = 0.0
+        self.idle_cpu_secs = 0.0
+        self.xvm_link_secs = 0.0
+
+    def get_grid_ts(self, ts: float) -> float:
+        """
+        First point of the grid at or after `ts`
+        """
+        # Round first, so that floating-point error does not skip a point
+        num_steps = ceil(
+            round((ts - self.first_ts) / self.min_resolution_secs, 6)
+        )
+        return self.first_ts + num_steps * self.min_resolution_secs
+
+    def record(
+        self, ts: float, idle_vms: int, idle_cpus: int, xvm_links: int
+    ) -> None:
+        """
+        Observe the occupation at time `ts`
+        """
+        with self.lock:
+            if self.last_observation is None:
+                self.first_ts = ts
+                self.last_flush_ts = ts
+                self.last_observation = (ts, idle_vms, idle_cpus, xvm_links)
+                self.add_sample_locked(ts, idle_vms, idle_cpus, xvm_links)
+                self.next_sample_ts = ts + self.resolution_secs
+                return
+
+            prev_ts, prev_vms, prev_cpus, prev_links = self.last_observation
+            self.idle_vm_secs += (ts - prev_ts) * prev_vms
+            self.idle_cpu_secs += (ts - prev_ts) * prev_cpus
+            self.xvm_link_secs += (ts - prev_ts) * prev_links
+            self.last_observation = (ts, idle_vms, idle_cpus, xvm_links)
+
+            # The previous occupation held until now, so we sample it at the
+            # points of the grid before now, backing off as it did not change
+            while self.next_sample_ts < ts:
+                self.add_sample_locked(
+                    self.next_sample_ts, prev_vms, prev_cpus, prev_links
+                )
+                self.resolution_secs = min(
+                    2 * self.resolution_secs, self.max_resolution_secs
+                )
+                self.next_sample_ts = self.get_grid_ts(
+                    self.last_sample_ts + self.resolution_secs
+                )
+
+            # If the occupation changed, we sample it at the next point of the
+            # grid, and go back to the finest step
+            if (prev_vms, prev_cpus, prev_links) != (
+                idle_vms,
+                idle_cpus,
+                xvm_links,
+            ):
+                sample_ts = max(
+                    self.get_grid_ts(ts),
+                    self.last_sample_ts + self.min_resolution_secs,
+                )
+                self.add_sample_locked(
+                    sample_ts, idle_vms, idle_cpus, xvm_links
+                )
+                self.resolution_secs = self.min_resolution_secs
+                self.next_sample_ts = sample_ts + self.resolution_secs
+
+    def add_sample_locked(
+        self, ts: float, idle_vms: int, idle_cpus: int, xvm_links: int
+    ) -> None:
+        self.ts[self.head] = ts
+        self.idle_vms[self.head] = idle_vms
+        self.idle_cpus[self.head] = idle_cpus
+        self.xvm_links[self.head] = xvm_links
+        self.head = (self.head + 1) % self.capacity
+        self.num_buffered += 1
+        self.num_samples += 1
+        self.last_sample_ts = ts
+
+        if (
+            self.num_buffered == self.capacity
+            or ts - self.last_flush_ts >= self.flush_period_secs
+        ):
+            self.flush_locked()
+
+    def get_buffered_rows(self) -> List[Tuple[float, int, int, int]]:
+        """
+        Buffered samples, oldest first
+        """
+        start = (self.head - self.num_buffered) % self.capacity
+        idxs = [(start + i) % self.capacity for i in range(self.num_buffered)]
+        return list(
+            zip(
+                self.ts[idxs].tolist(),
+                self.idle_vms[idxs].tolist(),
+                self.idle_cpus[idxs].tolist(),
+                self.xvm_links[idxs].tolist(),
+            )
+        )
+
+    def flush(self) -> None:
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self) -> None:
+        if self.num_buffered > 0:
+            self.result_sink.write_lines(
+                SCHEDULING_INFO_FILE_PREFIX, self.get_buffered_rows()
+            )
+        self.num_buffered = 0
+        if self.last_sample_ts is not None:
+            self.last_flush_ts = self.last_sample_ts
+
+    def get_idle_cpu_fraction(self) -> float:
+        """
+        Fraction of the CPU-seconds of the run (so far) that were idle
+        """
+        if (
+            self.last_observation is None
+            or self.last_observation[0] == self.first_ts
+        ):
+            return 0
+
+        total_cpu_secs = (
+            (self.last_observation[0] - self.first_ts)
+            * self.num_vms
+            * self.num_cpus_per_vm
+        )
+        return self.idle_cpu_secs / total_cpu_secs
+
+    def print_summary(self) -> None:
+        if self.last_observation is None:
+            return
+
+        duration = self.last_observation[0] - self.first_ts
+        print(
+            "Cluster occupation ({} samples over {:.2f} s): {:.2f} idle "
+            "CPU-secs ({:.2f} %), {:.2f} idle VM-secs, {:.2f} mean cross-VM "
+            "links".format(
+                self.num_samples,
+                duration,
+                self.idle_cpu_secs,
+                self.get_idle_cpu_fraction() * 100,
+                self.idle_vm_secs,
+                self.xvm_link_secs / duration if duration > 0 else 0,
+            )
+        )
@@ -0,0 +1,237 @@
+from tasks.makespan.capacity import VmCapacityIndex
+from tasks.util.planner import get_cached_xvm_links_from_part
+from typing import Callable, List, Tuple
+
+"""
+Placement policies for the scheduler's python-side slot accounting. A policy
+picks the VMs where a task runs, in the order in which the scheduler fills
+them up with the task's slots.
+"""
+
+
+class PlacementPolicy:
+    """
+    Base class for placement policies. Given the free slots per VM, return a
+    list of (ip, free slots) pairs with enough free slots to run a task of
+    `num_slots` slots. If `single_vm` is set (e.g. for OpenMP tasks) return
+    at most one VM. VMs for which `skip_vm` is true must never be returned,
+    whether `single_vm` is set or not
+    """
+
+    name: str = ""
+
+    def get_candidate_vms(
+        self,
+        vm_map: VmCapacityIndex,
+        num_slots: int,
+        single_vm: bool = False,
+        skip_vm: Callable[[str], bool] = None,
+    ) -> List[Tuple[str, int]]:
+        raise NotImplementedError
+
+    @staticmethod
+    def fill_in_order(
+        vms: List[Tuple[str, int]],
+        num_slots: int,
+        skip_vm: Callable[[str], bool] = None,
+    ) -> List[Tuple[str, int]]:
+        """
+        Take VMs with free slots, in order, until they cover `num_slots`
+        """
+        candidate_vms = []
+        covered = 0
+        for ip, num_free in vms:
+            if covered >= num_slots:
+                break
+
+            if num_free == 0 or (skip_vm is not None and skip_vm(ip)):
+                continue
+
+            candidate_vms.append((ip, num_free))
+            covered += num_free
+
+        return candidate_vms
+
+    @staticmethod
+    def get_largest_vm(
+        vm_map: VmCapacityIndex, skip_vm: Callable[[str], bool] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Take the VM with most free slots, if there is any we can use
+        """
+        largest_vm = vm_map.get_largest_vm(skip_vm=skip_vm)
+        return [] if largest_vm is None else [largest_vm]
+
+
+class WorstFitPolicy(PlacementPolicy):
+    """
+    Take the VMs in decreasing order of free slots. This was the only policy
+    before policies were pluggable, and is the default
+    """
+
+    name = "worst-fit"
+
+    def get_candidate_vms(
+        self, vm_map, num_slots, single_vm=False, skip_vm=None
+    ):
+        if single_vm:
+            return self.get_largest_vm(vm_map, skip_vm=skip_vm)
+
+        return vm_map.get_vms_covering(num_slots, skip_vm=skip_vm)
+
+
+class BestFitPolicy(PlacementPolicy):
+    """
+    Take the VM with fewest free slots that fits the whole task. If no VM fits
+    it, take the VMs in increasing order of free slots, to fill the smallest
+    holes first
+    """
+
+    name = "best-fit"
+
+    def get_candidate_vms(
+        self, vm_map, num_slots, single_vm=False, skip_vm=None
+    ):
+        best_vm = vm_map.get_smallest_vm_fitting(num_slots, skip_vm=skip_vm)
+        if best_vm is not None:
+            return [best_vm]
+
+        if single_vm:
+            return self.get_largest_vm(vm_map, skip_vm=skip_vm)
+
+        return self.fill_in_order(
+            vm_map.iter_ascending(), num_slots, skip_vm=skip_vm
+        )
+
+
+class FirstFitPolicy(PlacementPolicy):
+    """
+    Take the first VM, in the order in which they joined the cluster, that
+    fits the whole task. If no VM fits it, take the VMs in that same order
+    """
+
+    name = "first-fit"
+
+    def get_candidate_vms(
+        self, vm_map, num_slots, single_vm=False, skip_vm=None
+    ):
+        for ip, num_free in vm_map.items():
+            if num_free >= num_slots and (skip_vm is None or not skip_vm(ip)):
+                return [(ip, num_free)]
+
+        if single_vm:
+            return self.get_largest_vm(vm_map, skip_vm=skip_vm)
+
+        return self.fill_in_order(vm_map.items(), num_slots, skip_vm=skip_vm)
+
+
+class LocalityPolicy(PlacementPolicy):
+    """
+    Minimise the number of cross-VM links of the task. Our own candidate
+    takes the VMs with most free slots until the remaining slots fit in one
+    VM, and then the VM with fewest free slots that fits them, to keep large
+    holes for the tasks to come. We compare it with the placements of the
+    other policies, and pick the one with fewest cross-VM links
+    """
+
+    name = "locality"
+
+    def get_candidate_vms(
+        self, vm_map, num_slots, single_vm=False, skip_vm=None
+    ):
+        if single_vm:
+            best_vm = vm_map.get_smallest_vm_fitting(
+                num_slots, skip_vm=skip_vm
+            )
+            if best_vm is None:
+                return self.get_largest_vm(vm_map, skip_vm=skip_vm)
+
+            return [best_vm]
+
+        candidates = [self.get_compact_vms(vm_map, num_slots, skip_vm)] + [
+            policy().get_candidate_vms(vm_map, num_slots, skip_vm=skip_vm)
+            for policy in [WorstFitPolicy, BestFitPolicy, FirstFitPolicy]
+        ]
+
+        # Ties go to the first candidate, i.e. our own
+        return min(
+            candidates,
+            key=lambda vms: (
+                get_cached_xvm_links_from_part(
+                    tuple(self.get_part(vms, num_slots))
+                ),
+                len(vms),
+            ),
+        )
+
+    @staticmethod
+    def get_part(vms: List[Tuple[str, int]], num_slots: int) -> List[int]:
+        """
+        Partition of the task's slots when filling the VMs in order
+        """
+        part = []
+        for _, num_free in vms:
+            if num_slots <= 0:
+                break
+
+            part.append(min(num_free, num_slots))
+            num_slots -= part[-1]
+
+        return part
+
+    @staticmethod
+    def get_compact_vms(
+        vm_map: VmCapacityIndex,
+        num_slots: int,
+        skip_vm: Callable[[str], bool] = None,
+    ) -> List[Tuple[str, int]]:
+        candidate_vms = []
+        left_to_assign = num_slots
+        for ip, num_free in vm_map.iter_descending():
+            if num_free == 0:
+                break
+
+            if skip_vm is not None and skip_vm(ip):
+                continue
+
+            if num_free >= left_to_assign:
+                chosen_ips = set([ip for ip, _ in candidate_vms])
+                candidate_vms.append(
+                    vm_map.get_smallest_vm_fitting(
+                        left_to_assign,
+                        skip_vm=lambda ip: ip in chosen_ips
+                        or (skip_vm is not None and skip_vm(ip)),
+                    )
+                )
+                break
+
+            candidate_vms.append((ip, num_free))
+            left_to_assign -= num_free
+
+        return candidate_vms
+
+
+# Registry of the available placement policies, indexed by name
+PLACEMENT_POLICIES = {
+    policy.name: policy
+    for policy in [
+        WorstFitPolicy,
+        BestFitPolicy,
+        FirstFitPolicy,
+        LocalityPolicy,
+    ]
+}
+ALLOWED_PLACEMENT_POLICIES = list(PLACEMENT_POLICIES.keys())
+DEFAULT_PLACEMENT_POLICY = WorstFitPolicy.name
+
+
+def get_placement_policy(name: str) -> PlacementPolicy:
+    if name not in PLACEMENT_POLICIES:
+        print(
+            "Unrecognised placement policy ({}) must be one in: {}".format(
+                name, ALLOWED_PLACEMENT_POLICIES
+            )
+        )
+        raise RuntimeError("Unrecognised placement policy: {}".format(name))
+
+    return PLACEMENT_POLICIES[name]()
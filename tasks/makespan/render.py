@@ -0,0 +1,145 @@
+from threading import Event, Lock, Thread
+from time import sleep
+from typing import Callable, List
+
+"""
+Rendering of the experiment state (i.e. the state of each task in the trace)
+for the batch scheduler. The scheduler reports task state transitions as they
+happen, and a background thread redraws the state grid at a bounded rate, so
+that rendering is off the scheduler's critical path.
+"""
+
+TASK_STATE_NONE = "NONE"
+TASK_STATE_EXECUTING = "EXECUTING"
+TASK_STATE_FINISHED = "FINISHED"
+TASK_STATE_FAILED = "FAILED"
+
+# Maximum number of times per second that we redraw the experiment state
+RENDER_MAX_REDRAWS_PER_SEC = 2
+
+RENDER_TASKS_PER_LINE = 10
+
+
+def color_text_from_state(state):
+    if state == TASK_STATE_NONE:
+        return " "
+    if state == TASK_STATE_EXECUTING:
+        return "\033[38;5;3mO\033[0;0m"
+    if state == TASK_STATE_FINISHED:
+        return "\033[38;5;2mX\033[0;0m"
+    if state == TASK_STATE_FAILED:
+        return "\033[38;5;1mX\033[0;0m"
+
+
+class ExperimentStateRenderer:
+    """
+    Keep the state of each task, and the lines of the state grid, up to date
+    as tasks change state. Only the grid line of the task that changes is
+    re-built. Redraws happen in a background thread, at most
+    `max_redraws_per_sec` times per second, and only if something changed
+    """
+
+    def __init__(
+        self,
+        num_tasks: int,
+        get_header_lines: Callable[[], List[str]],
+        max_redraws_per_sec: float = RENDER_MAX_REDRAWS_PER_SEC,
+    ):
+        if max_redraws_per_sec <= 0:
+            raise RuntimeError(
+                "Maximum redraw rate must be positive: {}".format(
+                    max_redraws_per_sec
+                )
+            )
+
+        self.num_tasks = num_tasks
+        # Callback to get the experiment information printed above the grid
+        self.get_header_lines = get_header_lines
+        self.min_redraw_period_secs = 1 / max_redraws_per_sec
+
+        self.task_states = [TASK_STATE_NONE for _ in range(num_tasks)]
+        self.lines = [
+            self.build_line(line_idx)
+            for line_idx in range(self.get_num_lines())
+        ]
+        self.lock = Lock()
+
+        self.dirty = Event()
+        self.stop_event = Event()
+        self.render_thread = Thread(target=self.render_loop, daemon=True)
+
+    def get_num_lines(self) -> int:
+        return -(-self.num_tasks // RENDER_TASKS_PER_LINE)
+
+    def build_line(self, line_idx: int) -> str:
+        first_task = line_idx * RENDER_TASKS_PER_LINE
+        last_task = min(first_task + RENDER_TASKS_PER_LINE, self.num_tasks)
+
+        cells = " ".join(
+            [
+                "[{}]".format(color_text_from_state(self.task_states[i]))
+                for i in range(first_task, last_task)
+            ]
+        )
+        if first_task == 0:
+            return "{}:  {}".format(first_task, cells)
+
+        return "{}: {}".format(first_task, cells)
+
+    def set_task_state(self, task_id: int, state: str) -> None:
+        with self.lock:
+            if self.task_states[task_id] == state:
+                return
+
+            self.task_states[task_id] = state
+            line_idx = task_id // RENDER_TASKS_PER_LINE
+            self.lines[line_idx] = self.build_line(line_idx)
+
+        self.dirty.set()
+
+    def mark_dirty(self) -> None:
+        """
+        Redraw even if no task changed state (e.g. the next task in the
+        queue changed)
+        """
+        self.dirty.set()
+
+    def start(self) -> None:
+        self.render_thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and draw the final state
+        """
+        self.stop_event.set()
+        self.dirty.set()
+        self.render_thread.join()
+        self.render()
+
+    def render_loop(self) -> None:
+        while not self.stop_event.is_set():
+            self.dirty.wait()
+            if self.stop_event.is_set():
+                break
+
+            self.dirty.clear()
+            self.render()
+            sleep(self.min_redraw_period_secs)
+
+    def render(self) -> None:
+        header = "============ EXPERIMENT STATE ============="
+        divider = "--------------------------------------------"
+        footer = "==========================================="
+
+        with self.lock:
+            lines = list(self.lines)
+
+        print(
+            "\n".join(
+                [header]
+                + self.get_header_lines()
+                + [divider]
+                + lines
+                + [footer]
+            )
+        )
@@ -0,0 +1,125 @@
+from heapq import heappop, heappush
+from typing import Dict, Iterable, List, Set, Tuple
+
+"""
+Retries of failed tasks. A failed task waits in the retry queue for an
+exponential backoff before it runs again, optionally up to a maximum number
+of retries.
+We also remember the VMs where tasks failed recently, so that placement can
+avoid them for a while.
+"""
+
+# Maximum number of times we re-run a task that fails. After that, we give
+# up on the task. By default there is no limit, so that every run executes all
+# the tasks in the trace
+DEFAULT_MAX_TASK_RETRIES = None
+
+# Backoff before re-running a failed task. It doubles with every retry of the
+# same task, up to the maximum
+RETRY_INITIAL_BACKOFF_SECS = 5
+RETRY_MAX_BACKOFF_SECS = 60
+
+# For how long we avoid placing tasks in a VM after a task failed in it
+VM_EXCLUSION_SECS = 120
+
+
+class TaskRetryQueue:
+    """
+    Min-heap of the tasks waiting to be re-run, ordered by the time at which
+    their backoff expires. Tasks are identified by their index in the trace
+    """
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_TASK_RETRIES,
+        initial_backoff_secs: float = RETRY_INITIAL_BACKOFF_SECS,
+        max_backoff_secs: float = RETRY_MAX_BACKOFF_SECS,
+    ):
+        self.max_retries = max_retries
+        self.initial_backoff_secs = initial_backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+
+        self.pending: List[Tuple[float, int]] = []
+        # Map of task ids to the number of times we have retried them
+        self.num_retries: Dict[int, int] = {}
+        # Tasks that ran out of retries
+        self.abandoned_task_ids: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def push(self, task_idx: int, ready_ts: float) -> None:
+        heappush(self.pending, (ready_ts, task_idx))
+
+    def get_backoff_secs(self, num_retries: int) -> float:
+        return min(
+            self.initial_backoff_secs * 2 ** (num_retries - 1),
+            self.max_backoff_secs,
+        )
+
+    def task_failed(self, task_id: int, task_idx: int, now: float) -> bool:
+        """
+        Queue a failed task for its next retry. Return false if the task ran
+        out of retries
+        """
+        num_retries = self.num_retries.get(task_id, 0) + 1
+        self.num_retries[task_id] = num_retries
+        if self.max_retries is not None and num_retries > self.max_retries:
+            self.abandoned_task_ids.add(task_id)
+            return False
+
+        self.push(task_idx, now + self.get_backoff_secs(num_retries))
+        return True
+
+    def get_next_ready_ts(self) -> float:
+        """
+        Time at which the next retry is ready, or None if there are none
+        """
+        if len(self.pending) == 0:
+            return None
+
+        return self.pending[0][0]
+
+    def pop_ready(self, now: float) -> int:
+        """
+        Pop the index of the next task whose backoff has expired, if any
+        """
+        if len(self.pending) == 0 or self.pending[0][0] > now:
+            return None
+
+        return heappop(self.pending)[1]
+
+
+class VmExclusionList:
+    """
+    VMs where tasks failed in the last `exclusion_secs` seconds. We can not
+    tell which of the VMs of a task made it fail, so we track all of them
+    """
+
+    def __init__(self, exclusion_secs: float = VM_EXCLUSION_SECS):
+        self.exclusion_secs = exclusion_secs
+        # Map of VM IPs to the time of the last failure in them
+        self.last_failure_ts: Dict[str, float] = {}
+
+    def record_failure(self, vm_ips: Iterable[str], now: float) -> None:
+        for ip in vm_ips:
+            self.last_failure_ts[ip] = now
+
+    def has_exclusions(self, now: float) -> bool:
+        """
+        Whether any VM is excluded. We also forget the expired failures
+        """
+        for ip in [
+            ip
+            for ip, failure_ts in self.last_failure_ts.items()
+            if now - failure_ts >= self.exclusion_secs
+        ]:
+            del self.last_failure_ts[ip]
+
+        return len(self.last_failure_ts) > 0
+
+    def is_excluded(self, ip: str, now: float) -> bool:
+        return (
+            ip in self.last_failure_ts
+            and now - self.last_failure_ts[ip] < self.exclusion_secs
+        )
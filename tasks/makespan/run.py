@@ -1,19 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
 from faasmctl.util.planner import reset as reset_planner, set_planner_policy
+from functools import partial
 from invoke import task
 from logging import getLogger, WARNING as log_level_WARNING
 from os.path import join
-from tasks.makespan.data import ExecutedTaskInfo
+from scipy.stats import t as student_t
+from statistics import mean, stdev
+from tasks.makespan.deadline import DEFAULT_TASK_TIMEOUT_FACTOR
+from tasks.makespan.faults import (
+    DEFAULT_FAULT_MODEL,
+    DEFAULT_FAULT_PERIOD_SECS,
+    DEFAULT_FAULT_SEED,
+    get_fault_model,
+)
+from tasks.makespan.placement import DEFAULT_PLACEMENT_POLICY
 from tasks.makespan.scheduler import (
+    ALL_FT_BASELINES,
     BatchScheduler,
+    sch_logger,
 )
+from tasks.makespan.retry import DEFAULT_MAX_TASK_RETRIES
+from tasks.makespan.runtime import RuntimeModel
+from tasks.makespan.simulator import SimulatedBatchScheduler, sim_logger
+from tasks.makespan.stream import TaskStream
+from tasks.makespan.sweep import SweepCluster, SweepPoint, get_sweep_order
 from tasks.util.env import RESULTS_DIR
 from tasks.util.makespan import (
     ALLOWED_BASELINES,
+    EXEC_TASK_INFO_CSV_HEADER,
     EXEC_TASK_INFO_FILE_PREFIX,
+    FAULT_SWEEP_CSV_HEADER,
+    FAULT_SWEEP_FILE_PREFIX,
     GRANNY_BASELINES,
     IDLE_CORES_FILE_PREFIX,
+    LATENCY_CSV_HEADER,
+    LATENCY_FILE_PREFIX,
     MAKESPAN_FILE_PREFIX,
+    MAKESPAN_SIM_RESULTS_DIR,
     NATIVE_BASELINES,
+    NullResultSink,
+    ResultSink,
     init_csv_file,
     get_idle_core_count_from_task_info,
     get_num_cpus_per_vm_from_trace,
@@ -22,14 +48,21 @@ from tasks.util.makespan import (
     get_workload_from_trace,
     write_line_to_csv,
 )
-from tasks.util.trace import load_task_trace_from_file
+from tasks.util.planner import PLANNER_SNAPSHOT_MAX_STALENESS_SECS
+from tasks.util.table import ExecutedTaskInfo, ExecutionTable
+from tasks.util.trace import (
+    iter_task_trace_from_file,
+    load_task_trace_from_file,
+)
 from time import time
-from typing import Dict
 
 # Configure the logging settings globally
 getLogger("requests").setLevel(log_level_WARNING)
 getLogger("urllib3").setLevel(log_level_WARNING)
 
+# Confidence level of the intervals we report in the fault sweep
+FAULT_SWEEP_CONFIDENCE = 0.95
+
 
 def _validate_workload(workload):
     all_workloads = ["mpi-evict", "mpi-locality", "mpi-spot", "omp-elastic"]
@@ -59,6 +92,32 @@ def granny(
     elastic=False,
     # Mandatory flag for the mpi-evict workload (not in the paper)
     num_users=None,
+    # Speed-up factor for the inter-arrival times in the trace
+    time_compression="1",
+    # Backend to execute tasks: `process` (pool) or `asyncio` (event loop)
+    executor="process",
+    # Optional flag to start queued tasks ahead of a blocked one (EASY)
+    backfill=False,
+    # Maximum age (in seconds) of the planner state used to schedule tasks
+    planner_max_staleness=PLANNER_SNAPSHOT_MAX_STALENESS_SECS,
+    # Optional flag to resume a run that died, from its journal
+    resume=False,
+    # Optional flag to not render the experiment state (e.g. headless runs)
+    headless=False,
+    # Optional flag to record latency histograms of the scheduler
+    instrument=False,
+    # With --fault, model of the VM evictions: periodic, poisson, weibull, or
+    # replay (of the evictions in --fault-replay-file)
+    fault_model=DEFAULT_FAULT_MODEL,
+    # With --fault, mean time (in seconds) between evictions
+    fault_mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+    fault_seed=DEFAULT_FAULT_SEED,
+    # With --fault, probability that an eviction also takes each other VM in
+    # the same zone
+    fault_correlation="0",
+    fault_replay_file=None,
+    # Maximum number of times we re-run a task that fails (no limit if unset)
+    max_retries=DEFAULT_MAX_TASK_RETRIES,
 ):
     """
     Run: `inv makespan.run.granny --workload [mpi-migrate,mpi-spot,omp-elastic]
@@ -87,7 +146,25 @@ def granny(
 
     workload = _validate_workload(workload)
     trace = get_trace_from_parameters(workload, num_tasks, num_cpus_per_vm)
-    _do_run(baseline, num_vms, trace, num_users)
+    _do_run(
+        baseline,
+        num_vms,
+        trace,
+        num_users,
+        time_compression,
+        executor,
+        backfill,
+        planner_max_staleness=planner_max_staleness,
+        resume=resume,
+        headless=headless,
+        instrument=instrument,
+        fault_model=fault_model,
+        fault_mean_secs=fault_mean_secs,
+        fault_seed=fault_seed,
+        fault_correlation=fault_correlation,
+        fault_replay_file=fault_replay_file,
+        max_retries=max_retries,
+    )
 
 
 @task()
@@ -99,6 +176,25 @@ def native_slurm(
     num_tasks=100,
     num_users=None,
     fault=False,
+    time_compression="1",
+    executor="process",
+    backfill=False,
+    placement=DEFAULT_PLACEMENT_POLICY,
+    resume=False,
+    headless=False,
+    instrument=False,
+    fault_model=DEFAULT_FAULT_MODEL,
+    fault_mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+    fault_seed=DEFAULT_FAULT_SEED,
+    fault_correlation="0",
+    fault_replay_file=None,
+    max_retries=DEFAULT_MAX_TASK_RETRIES,
+    # Tasks time out after running for this many times their estimated
+    # execution time (0, the default, disables timeouts)
+    task_timeout_factor=DEFAULT_TASK_TIMEOUT_FACTOR,
+    # Optional flag to race stragglers with a copy in other VMs, once all
+    # tasks have started
+    speculate=False,
 ):
     """
     Run the native `slurm` baseline of the makespan experiment. The `slurm`
@@ -119,6 +215,21 @@ def native_slurm(
         num_vms,
         trace,
         num_users,
+        time_compression,
+        executor,
+        backfill,
+        placement,
+        resume=resume,
+        headless=headless,
+        instrument=instrument,
+        fault_model=fault_model,
+        fault_mean_secs=fault_mean_secs,
+        fault_seed=fault_seed,
+        fault_correlation=fault_correlation,
+        fault_replay_file=fault_replay_file,
+        max_retries=max_retries,
+        task_timeout_factor=task_timeout_factor,
+        speculate=speculate,
     )
 
 
@@ -131,6 +242,21 @@ def native_batch(
     num_tasks=100,
     num_users=None,
     fault=False,
+    time_compression="1",
+    executor="process",
+    backfill=False,
+    placement=DEFAULT_PLACEMENT_POLICY,
+    resume=False,
+    headless=False,
+    instrument=False,
+    fault_model=DEFAULT_FAULT_MODEL,
+    fault_mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+    fault_seed=DEFAULT_FAULT_SEED,
+    fault_correlation="0",
+    fault_replay_file=None,
+    max_retries=DEFAULT_MAX_TASK_RETRIES,
+    task_timeout_factor=DEFAULT_TASK_TIMEOUT_FACTOR,
+    speculate=False,
 ):
     """
     Run the native `batch` baseline of the makespan experiment. The `batch`
@@ -152,27 +278,171 @@ def native_batch(
         num_vms,
         trace,
         num_users,
+        time_compression,
+        executor,
+        backfill,
+        placement,
+        resume=resume,
+        headless=headless,
+        instrument=instrument,
+        fault_model=fault_model,
+        fault_mean_secs=fault_mean_secs,
+        fault_seed=fault_seed,
+        fault_correlation=fault_correlation,
+        fault_replay_file=fault_replay_file,
+        max_retries=max_retries,
+        task_timeout_factor=task_timeout_factor,
+        speculate=speculate,
     )
 
 
-def _do_run(baseline, num_vms, trace, num_users):
-    num_vms = int(num_vms)
-    job_workload = get_workload_from_trace(trace)
-    num_tasks = get_num_tasks_from_trace(trace)
-    num_cpus_per_vm = get_num_cpus_per_vm_from_trace(trace)
+@task()
+def sweep(
+    ctx,
+    baselines,
+    workloads,
+    num_vms="8,16,24,32",
+    num_tasks="25,50,75,100",
+    num_cpus_per_vm=8,
+    # Zip the VM counts with the task counts, instead of running all pairs
+    paired=False,
+    num_users=None,
+    time_compression="1",
+    executor="process",
+    backfill=False,
+    placement=DEFAULT_PLACEMENT_POLICY,
+    instrument=False,
+):
+    """
+    Run the makespan experiment for a matrix of baselines and cluster sizes
 
-    if job_workload == "mpi-evict":
-        num_users = 10 if num_users is None else int(num_users)
-        num_tasks_per_user = int(num_tasks / num_users)
+    Run: `inv makespan.run.sweep --baselines granny-migrate,granny
+    --workloads mpi-locality --paired`
+
+    Baselines are the ones in the result files (e.g. `slurm-ft`). We deploy
+    each cluster backend once, with the largest number of VMs, and scale it
+    down between points. Points with results are skipped, and points that
+    died half-way are resumed. The AKS cluster must have enough nodes for
+    the largest number of VMs (plus one)
+    """
+    baselines = baselines.split(",")
+    for baseline in baselines:
+        if baseline not in ALLOWED_BASELINES:
+            raise RuntimeError(
+                "Unrecognised baseline: {} - Must be one in: {}".format(
+                    baseline, ALLOWED_BASELINES
+                )
+            )
+    workloads = [_validate_workload(w) for w in workloads.split(",")]
+    num_vms = [int(n) for n in num_vms.split(",")]
+    num_tasks = [int(n) for n in num_tasks.split(",")]
+
+    if paired:
+        if len(num_vms) != len(num_tasks):
+            raise RuntimeError(
+                "Can not pair {} VM counts with {} task counts".format(
+                    len(num_vms), len(num_tasks)
+                )
+            )
+        cluster_sizes = list(zip(num_vms, num_tasks))
     else:
-        num_tasks_per_user = None
+        cluster_sizes = [(v, t) for v in num_vms for t in num_tasks]
 
-    if baseline not in ALLOWED_BASELINES:
-        raise RuntimeError(
-            "Unrecognised baseline: {} - Must be one in: {}".format(
-                baseline, ALLOWED_BASELINES
+    points = []
+    for workload in workloads:
+        for cluster_vms, cluster_tasks in cluster_sizes:
+            trace = get_trace_from_parameters(
+                workload, cluster_tasks, num_cpus_per_vm
             )
+            for baseline in baselines:
+                points.append(
+                    SweepPoint(
+                        baseline,
+                        cluster_vms,
+                        trace,
+                        _get_num_tasks_per_user(
+                            workload, cluster_tasks, num_users
+                        ),
+                    )
+                )
+
+    done_points = [point for point in points if point.has_results()]
+    for point in done_points:
+        print("Skipping point with results: {}".format(point))
+    points = get_sweep_order(
+        [point for point in points if not point.has_results()]
+    )
+    if len(points) == 0:
+        print(
+            "All {} points in the sweep have results".format(len(done_points))
         )
+        return
+
+    cluster = SweepCluster(ctx, points)
+
+    def prepare_point(point):
+        cluster.set_up(point)
+        _prepare_run(
+            point.baseline,
+            point.num_vms,
+            point.trace,
+            point.num_tasks_per_user,
+            resume=point.was_interrupted(),
+        )
+
+    start_ts = time()
+    prepared = False
+    for idx, point in enumerate(points):
+        print(
+            "Running sweep point {}/{}: {}".format(idx + 1, len(points), point)
+        )
+        if not prepared:
+            prepare_point(point)
+
+        # We can only prepare the next point while this one finishes if we
+        # do not need to re-deploy the cluster
+        prepare_next_run = None
+        if idx + 1 < len(points) and cluster.can_scale_to(points[idx + 1]):
+            prepare_next_run = partial(prepare_point, points[idx + 1])
+
+        _do_run(
+            point.baseline,
+            point.num_vms,
+            point.trace,
+            num_users,
+            time_compression,
+            executor,
+            backfill,
+            placement,
+            resume=point.was_interrupted(),
+            headless=True,
+            instrument=instrument,
+            prepared=True,
+            prepare_next_run=prepare_next_run,
+        )
+        prepared = prepare_next_run is not None
+
+    print(
+        "Ran {} sweep points in {:.0f} s (skipped {})".format(
+            len(points), time() - start_ts, len(done_points)
+        )
+    )
+
+
+def _get_num_tasks_per_user(job_workload, num_tasks, num_users):
+    if job_workload == "mpi-evict":
+        num_users = 10 if num_users is None else int(num_users)
+        return int(num_tasks / num_users)
+
+    return None
+
+
+def _prepare_run(baseline, num_vms, trace, num_tasks_per_user, resume=False):
+    """
+    Reset the planner and initialise the result files for a run. The cluster
+    must be idle, but the previous run may still be writing its results
+    """
+    job_workload = get_workload_from_trace(trace)
 
     # Reset the planner and wait for the workers to register with it
     if baseline in GRANNY_BASELINES:
@@ -187,45 +457,162 @@ def _do_run(baseline, num_vms, trace, num_users):
         elif job_workload == "omp-elastic":
             set_planner_policy("bin-pack")
 
+    # When resuming, we append to the result files of the previous run
+    if not resume:
+        init_csv_file(
+            baseline,
+            num_vms,
+            trace,
+            num_tasks_per_user=num_tasks_per_user,
+        )
+
+
+def _warn_if_tasks_abandoned(scheduler):
+    """
+    With a retry budget, a run may finish without executing all the tasks,
+    so its makespan is not comparable with the ones of complete runs
+    """
+    num_abandoned = len(scheduler.state.retry_queue.abandoned_task_ids)
+    if num_abandoned > 0:
+        print(
+            "WARNING: gave up on {} tasks after {} retries, the makespan does"
+            " not include them".format(
+                num_abandoned, scheduler.state.retry_queue.max_retries
+            )
+        )
+
+
+def _do_run(
+    baseline,
+    num_vms,
+    trace,
+    num_users,
+    time_compression,
+    executor="process",
+    backfill=False,
+    placement=DEFAULT_PLACEMENT_POLICY,
+    planner_max_staleness=PLANNER_SNAPSHOT_MAX_STALENESS_SECS,
+    resume=False,
+    headless=False,
+    instrument=False,
+    fault_model=DEFAULT_FAULT_MODEL,
+    fault_mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+    fault_seed=DEFAULT_FAULT_SEED,
+    fault_correlation="0",
+    fault_replay_file=None,
+    max_retries=DEFAULT_MAX_TASK_RETRIES,
+    task_timeout_factor=DEFAULT_TASK_TIMEOUT_FACTOR,
+    speculate=False,
+    prepared=False,
+    prepare_next_run=None,
+):
+    """
+    Run one point of the makespan experiment. Unless `prepared` is set, we
+    first reset the planner and the result files. If `prepare_next_run` is
+    set, we call it in the background once the cluster is idle, while we
+    finish with the results of this run
+    """
+    num_vms = int(num_vms)
+    time_compression = float(time_compression)
+    job_workload = get_workload_from_trace(trace)
+    num_tasks = get_num_tasks_from_trace(trace)
+    num_cpus_per_vm = get_num_cpus_per_vm_from_trace(trace)
+    num_tasks_per_user = _get_num_tasks_per_user(
+        job_workload, num_tasks, num_users
+    )
+
+    if baseline not in ALLOWED_BASELINES:
+        raise RuntimeError(
+            "Unrecognised baseline: {} - Must be one in: {}".format(
+                baseline, ALLOWED_BASELINES
+            )
+        )
+
+    if not prepared:
+        _prepare_run(
+            baseline, num_vms, trace, num_tasks_per_user, resume=resume
+        )
+
+    # Evictions are only injected for the fault-tolerant baselines
+    if baseline in ALL_FT_BASELINES:
+        fault_model = get_fault_model(
+            fault_model,
+            num_vms,
+            mean_secs=float(fault_mean_secs),
+            seed=int(fault_seed),
+            correlation=float(fault_correlation),
+            replay_file=fault_replay_file,
+        )
+    else:
+        fault_model = None
+
+    # All the result files of the run are written through the same sink
+    result_sink = ResultSink(baseline, num_vms, num_tasks_per_user, trace)
     scheduler = BatchScheduler(
         baseline,
         num_tasks,
         num_vms,
         num_tasks_per_user,
         trace,
+        time_compression=time_compression,
+        executor=executor,
+        backfill=backfill,
+        placement=placement,
+        planner_max_staleness_secs=float(planner_max_staleness),
+        result_sink=result_sink,
+        resume=resume,
+        headless=headless,
+        instrument=instrument,
+        fault_model=fault_model,
+        max_task_retries=(None if max_retries is None else int(max_retries)),
+        task_timeout_factor=float(task_timeout_factor),
+        speculate=speculate,
     )
 
-    if job_workload == "mpi-evict":
-        init_csv_file(
-            baseline,
-            num_vms,
-            trace,
-            num_tasks_per_user=num_tasks_per_user,
-        )
-    else:
-        init_csv_file(
-            baseline,
-            num_vms,
-            trace,
+    # When resuming, the previous run may have died with buffered rows, so
+    # we re-write the executed task info from the journal
+    if resume:
+        result_sink.truncate(
+            EXEC_TASK_INFO_FILE_PREFIX, EXEC_TASK_INFO_CSV_HEADER
         )
+        for task_id in sorted(scheduler.resumed_from.executed_task_info):
+            task_info = scheduler.resumed_from.executed_task_info[task_id]
+            result_sink.write_line(
+                EXEC_TASK_INFO_FILE_PREFIX,
+                task_info.task_id,
+                task_info.time_executing,
+                task_info.time_in_queue,
+                task_info.exec_start_ts,
+                task_info.exec_end_ts,
+            )
 
-    task_trace = load_task_trace_from_file(
-        job_workload, num_tasks, num_cpus_per_vm
+    # We read the trace as we go, so that we do not need to hold it all in
+    # memory
+    task_stream = TaskStream(
+        iter_task_trace_from_file(job_workload, num_tasks, num_cpus_per_vm),
+        num_tasks,
     )
 
+    # When resuming, the makespan also includes the time elapsed in the
+    # previous run
     start_ts = time()
-    executed_task_info = scheduler.run(baseline, task_trace)
+    if scheduler.resumed_from is not None:
+        start_ts -= scheduler.resumed_from.elapsed_secs
+    executed_task_info = scheduler.run(baseline, task_stream)
     makespan_secs = time() - start_ts
 
     # First of all, record the makespan (the total time elapsed)
-    write_line_to_csv(
-        baseline,
-        MAKESPAN_FILE_PREFIX,
-        num_vms,
-        None,
-        trace,
-        makespan_secs,
-    )
+    result_sink.write_line(MAKESPAN_FILE_PREFIX, makespan_secs)
+    _warn_if_tasks_abandoned(scheduler)
+
+    # The cluster is idle from now on, so we shut down the scheduler (it
+    # stops polling the planner), and start preparing the next run while we
+    # finish with this one
+    scheduler.shutdown()
+    next_run_prep = None
+    if prepare_next_run is not None:
+        prep_pool = ThreadPoolExecutor(max_workers=1)
+        next_run_prep = prep_pool.submit(prepare_next_run)
 
     # For granny we get the idle cores as we run the experiment, from the
     # planner (also, for the moment, we do not need these results for mpi-evict)
@@ -233,23 +620,291 @@ def _do_run(baseline, num_vms, trace, num_users):
         num_idle_cores_per_time_step = get_idle_core_count_from_task_info(
             baseline,
             executed_task_info,
-            task_trace,
+            load_task_trace_from_file(
+                job_workload, num_tasks, num_cpus_per_vm
+            ),
             num_vms,
             num_cpus_per_vm,
         )
         for time_step in num_idle_cores_per_time_step:
-            write_line_to_csv(
-                baseline,
+            result_sink.write_line(
                 IDLE_CORES_FILE_PREFIX,
-                num_vms,
-                None,
-                trace,
                 time_step,
                 num_idle_cores_per_time_step[time_step],
             )
 
-    # Finally shutdown the scheduler
-    scheduler.shutdown()
+    # Finally record the latency summary (if instrumented), and flush the
+    # results
+    if scheduler.metrics.enabled:
+        result_sink.truncate(LATENCY_FILE_PREFIX, LATENCY_CSV_HEADER)
+        for row in scheduler.metrics.get_summary_rows():
+            result_sink.write_line(LATENCY_FILE_PREFIX, *row)
+        scheduler.metrics.print_summary()
+    result_sink.close()
+
+    # Wait for the next run to be ready (and raise its errors, if any)
+    if next_run_prep is not None:
+        next_run_prep.result()
+        prep_pool.shutdown()
+
+
+@task()
+def simulate(
+    ctx,
+    baseline,
+    workload,
+    num_vms=32,
+    num_cpus_per_vm=8,
+    num_tasks=100,
+    num_users=None,
+    calibrate_from=None,
+    time_compression="1",
+    backfill=False,
+    placement=DEFAULT_PLACEMENT_POLICY,
+    fault_model=DEFAULT_FAULT_MODEL,
+    fault_mean_secs=DEFAULT_FAULT_PERIOD_SECS,
+    fault_seed=DEFAULT_FAULT_SEED,
+    fault_correlation="0",
+    fault_replay_file=None,
+    max_retries=DEFAULT_MAX_TASK_RETRIES,
+):
+    """
+    Replay a trace through the batch scheduler against a modelled cluster
+
+    Run: `inv makespan.run.simulate --baseline <baseline> --workload <workload>`
+
+    The results are written, in the same format as the real ones, to
+    `results/makespan-sim`. Optionally, pass the `exec-task-info` CSV of a
+    real run of the same trace with `--calibrate-from` to use its measured
+    execution times. For the fault-tolerant baselines, VMs are evicted
+    following the `--fault-*` flags, as in the real runs
+    """
+    if baseline not in ALLOWED_BASELINES:
+        raise RuntimeError(
+            "Unrecognised baseline: {} - Must be one in: {}".format(
+                baseline, ALLOWED_BASELINES
+            )
+        )
+
+    num_vms = int(num_vms)
+    workload = _validate_workload(workload)
+    trace = get_trace_from_parameters(workload, num_tasks, num_cpus_per_vm)
+    num_tasks = get_num_tasks_from_trace(trace)
+    num_cpus_per_vm = get_num_cpus_per_vm_from_trace(trace)
+    num_tasks_per_user = _get_num_tasks_per_user(
+        workload, num_tasks, num_users
+    )
+
+    task_trace = load_task_trace_from_file(
+        workload, num_tasks, num_cpus_per_vm
+    )
+    runtime_model = None
+    if calibrate_from is not None:
+        runtime_model = RuntimeModel.from_exec_task_info(
+            calibrate_from, task_trace
+        )
+
+    # Scheduling decisions are logged at INFO level, which would dominate
+    # the simulation time
+    sch_logger.setLevel(log_level_WARNING)
+
+    if baseline in ALL_FT_BASELINES:
+        fault_model = get_fault_model(
+            fault_model,
+            num_vms,
+            mean_secs=float(fault_mean_secs),
+            seed=int(fault_seed),
+            correlation=float(fault_correlation),
+            replay_file=fault_replay_file,
+        )
+    else:
+        fault_model = None
+
+    result_sink = ResultSink(
+        baseline,
+        num_vms,
+        num_tasks_per_user,
+        trace,
+        result_dir=MAKESPAN_SIM_RESULTS_DIR,
+    )
+    scheduler = SimulatedBatchScheduler(
+        baseline,
+        num_tasks,
+        num_vms,
+        num_tasks_per_user,
+        trace,
+        runtime_model=runtime_model,
+        time_compression=float(time_compression),
+        backfill=backfill,
+        placement=placement,
+        result_sink=result_sink,
+        fault_model=fault_model,
+        max_task_retries=(None if max_retries is None else int(max_retries)),
+    )
+    init_csv_file(
+        baseline,
+        num_vms,
+        trace,
+        num_tasks_per_user=num_tasks_per_user,
+        result_dir=MAKESPAN_SIM_RESULTS_DIR,
+        ip_to_vm=zip(
+            scheduler.state.get_vm_ips(), scheduler.state.get_vm_names()
+        ),
+    )
+
+    start_ts = time()
+    scheduler.run(baseline, task_trace)
+    makespan_secs = scheduler.now - scheduler.start_ts
+    result_sink.write_line(MAKESPAN_FILE_PREFIX, makespan_secs)
+    result_sink.close()
+
+    print(
+        "Simulated {} {} tasks on {} VMs in {:.2f} s (makespan: {:.0f} s)".format(
+            num_tasks, baseline, num_vms, time() - start_ts, makespan_secs
+        )
+    )
+    if fault_model is not None:
+        print(
+            "{} evictions: {} tasks migrated, {} tasks failed".format(
+                scheduler.num_evictions,
+                scheduler.num_migrated_tasks,
+                scheduler.num_failed_tasks,
+            )
+        )
+    _warn_if_tasks_abandoned(scheduler)
+
+
+def _get_confidence_interval(samples, confidence=FAULT_SWEEP_CONFIDENCE):
+    """
+    Two-sided confidence interval of the mean of the samples. We use the
+    t-distribution as we only run a handful of seeds
+    """
+    sample_mean = mean(samples)
+    if len(samples) < 2:
+        return sample_mean, sample_mean
+
+    half_width = (
+        student_t.ppf((1 + confidence) / 2, len(samples) - 1)
+        * stdev(samples)
+        / len(samples) ** 0.5
+    )
+    return sample_mean - half_width, sample_mean + half_width
+
+
+@task()
+def simulate_faults(
+    ctx,
+    num_vms=32,
+    num_cpus_per_vm=8,
+    num_tasks=100,
+    baselines="granny-ft,slurm-ft",
+    fault_model="poisson",
+    fault_mean_secs="30,60,120,240",
+    num_seeds=10,
+    fault_correlation="0",
+    time_compression="1",
+):
+    """
+    Compare the fault-tolerant baselines across eviction rates in simulation
+
+    Run: `inv makespan.run.simulate-faults --fault-mean-secs 30,60,120`
+
+    For each baseline and mean time between evictions, we simulate the
+    `mpi-spot` trace once per seed, and report the mean makespan with its
+    confidence interval. All baselines use the same seeds, so they see the
+    same evictions. The summary is written to `results/makespan-sim`
+    """
+    baselines = baselines.split(",")
+    for baseline in baselines:
+        if baseline not in ALL_FT_BASELINES:
+            raise RuntimeError(
+                "Unrecognised FT baseline: {} - Must be one in: {}".format(
+                    baseline, ALL_FT_BASELINES
+                )
+            )
+
+    num_vms = int(num_vms)
+    num_seeds = int(num_seeds)
+    trace = get_trace_from_parameters("mpi-spot", num_tasks, num_cpus_per_vm)
+    num_tasks = get_num_tasks_from_trace(trace)
+    num_cpus_per_vm = get_num_cpus_per_vm_from_trace(trace)
+    task_trace = load_task_trace_from_file(
+        "mpi-spot", num_tasks, num_cpus_per_vm
+    )
+
+    sch_logger.setLevel(log_level_WARNING)
+    sim_logger.setLevel(log_level_WARNING)
+
+    rows = []
+    for mean_secs in [float(secs) for secs in fault_mean_secs.split(",")]:
+        for baseline in baselines:
+            makespans = []
+            num_failed_tasks = []
+            num_migrated_tasks = []
+            for seed in range(num_seeds):
+                scheduler = SimulatedBatchScheduler(
+                    baseline,
+                    num_tasks,
+                    num_vms,
+                    None,
+                    trace,
+                    time_compression=float(time_compression),
+                    result_sink=NullResultSink(),
+                    fault_model=get_fault_model(
+                        fault_model,
+                        num_vms,
+                        mean_secs=mean_secs,
+                        seed=seed,
+                        correlation=float(fault_correlation),
+                    ),
+                )
+                scheduler.run(baseline, task_trace)
+                makespans.append(scheduler.now - scheduler.start_ts)
+                num_failed_tasks.append(scheduler.num_failed_tasks)
+                num_migrated_tasks.append(scheduler.num_migrated_tasks)
+
+            ci_low, ci_high = _get_confidence_interval(makespans)
+            rows.append(
+                [
+                    baseline,
+                    fault_model,
+                    mean_secs,
+                    num_seeds,
+                    round(mean(makespans), 2),
+                    round(ci_low, 2),
+                    round(ci_high, 2),
+                    mean(num_failed_tasks),
+                    mean(num_migrated_tasks),
+                ]
+            )
+
+    print(
+        "Makespan of {} mpi-spot tasks on {} VMs ({} evictions, {} seeds,"
+        " {:.0f} % CI):".format(
+            num_tasks,
+            num_vms,
+            fault_model,
+            num_seeds,
+            FAULT_SWEEP_CONFIDENCE * 100,
+        )
+    )
+    result_sink = ResultSink(
+        "-vs-".join(baselines),
+        num_vms,
+        None,
+        trace,
+        result_dir=MAKESPAN_SIM_RESULTS_DIR,
+    )
+    result_sink.truncate(FAULT_SWEEP_FILE_PREFIX, FAULT_SWEEP_CSV_HEADER)
+    for row in rows:
+        result_sink.write_line(FAULT_SWEEP_FILE_PREFIX, *row)
+        print(
+            "\t- {} (mean {} s between evictions): {} s [{}, {}] - failed"
+            " tasks: {} - migrated tasks: {}".format(
+                row[0], row[2], row[4], row[5], row[6], row[7], row[8]
+            )
+        )
+    result_sink.close()
 
 
 @task()
@@ -262,10 +917,9 @@ def idle_cores_from_exec_task(
     num_cpus_per_vm=8,
 ):
     result_dir = join(RESULTS_DIR, "makespan")
-    executed_task_info: Dict[int, ExecutedTaskInfo] = {}
-
     num_vms = int(num_vms)
     num_tasks = int(num_tasks)
+    executed_task_info = ExecutionTable(num_tasks)
 
     trace = get_trace_from_parameters(workload, num_tasks, num_cpus_per_vm)
     job_workload = get_workload_from_trace(trace)
@@ -304,17 +958,18 @@ def idle_cores_from_exec_task(
         job_workload, num_tasks, num_cpus_per_vm
     )
     num_idle_cores_per_time_step = get_idle_core_count_from_task_info(
+        baseline,
         executed_task_info,
         task_trace,
         num_vms,
         num_cpus_per_vm,
-        granny,
     )
     for time_step in num_idle_cores_per_time_step:
         write_line_to_csv(
             baseline,
             IDLE_CORES_FILE_PREFIX,
             num_vms,
+            None,
             trace,
             time_step,
             num_idle_cores_per_time_step[time_step],
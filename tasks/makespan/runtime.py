@@ -0,0 +1,124 @@
+from pandas import read_csv
+from tasks.makespan.data import TaskObject
+from tasks.util.makespan import MPI_WORKLOADS
+from tasks.util.planner import get_cached_xvm_links_from_part
+from typing import Dict, List, Tuple
+
+"""
+Models of the execution time of the tasks in a trace. The simulator uses them
+to execute tasks in virtual time, and the batch scheduler to estimate how long
+a task will run for before it starts.
+"""
+
+# Coarse fit of the execution times measured in the real experiments (32 VMs
+# with 8 cores each). OpenMP tasks scale (roughly) linearly with the number of
+# threads. LAMMPS grows with the number of processes, and slows down with the
+# fraction of cross-VM links between its processes
+OMP_WORK_CORE_SECS = 240
+MPI_BASE_SECS = 150
+MPI_SECS_PER_PROC = 40
+MPI_XVM_PENALTY = 0.75
+
+
+class RuntimeModel:
+    """
+    Model of the time it takes a task to execute given its scheduling
+    decision. If we have measured execution times for a given (app, size)
+    pair, we use them, otherwise we fall back to our analytical model
+    """
+
+    def __init__(
+        self,
+        omp_work_core_secs: float = OMP_WORK_CORE_SECS,
+        mpi_base_secs: float = MPI_BASE_SECS,
+        mpi_secs_per_proc: float = MPI_SECS_PER_PROC,
+        mpi_xvm_penalty: float = MPI_XVM_PENALTY,
+    ):
+        self.omp_work_core_secs = omp_work_core_secs
+        self.mpi_base_secs = mpi_base_secs
+        self.mpi_secs_per_proc = mpi_secs_per_proc
+        self.mpi_xvm_penalty = mpi_xvm_penalty
+
+        # Map of (app, size) pairs to their measured execution time
+        self.measured: Dict[Tuple[str, int], float] = {}
+
+    @staticmethod
+    def from_exec_task_info(csv_file: str, tasks: List[TaskObject]):
+        """
+        Calibrate the model with the per-task execution times in an
+        `exec-task-info` CSV file from a real run of the same trace
+        """
+        model = RuntimeModel()
+        results = read_csv(csv_file)
+
+        task_map = {t.task_id: t for t in tasks}
+        exec_times: Dict[Tuple[str, int], List[float]] = {}
+        for task_id, time_executing in zip(
+            results["TaskId"].to_list(), results["TimeExecuting"].to_list()
+        ):
+            if task_id not in task_map:
+                continue
+
+            key = (task_map[task_id].app, task_map[task_id].size)
+            if key not in exec_times:
+                exec_times[key] = []
+            exec_times[key].append(time_executing)
+
+        for key in exec_times:
+            model.measured[key] = sum(exec_times[key]) / len(exec_times[key])
+
+        return model
+
+    def get_exec_time(
+        self, task: TaskObject, sched_decision: List[Tuple[str, int]]
+    ) -> float:
+        if (task.app, task.size) in self.measured:
+            return self.measured[(task.app, task.size)]
+
+        if task.app not in MPI_WORKLOADS:
+            return self.omp_work_core_secs / task.size
+
+        exec_time = self.mpi_base_secs + self.mpi_secs_per_proc * task.size
+
+        # Penalise the execution time with the fraction of cross-VM links
+        # over the worst possible placement (one process per VM)
+        max_xvm_links = task.size * (task.size - 1) / 2
+        if max_xvm_links > 0:
+            xvm_links = get_cached_xvm_links_from_part(
+                tuple([slots for _, slots in sched_decision])
+            )
+            exec_time *= 1 + self.mpi_xvm_penalty * (xvm_links / max_xvm_links)
+
+        return exec_time
+
+
+class RuntimeEstimator:
+    """
+    Estimate of the execution time of a task before it runs. We use the mean
+    of the execution times that we have observed for the same (app, size)
+    pair, and fall back to the runtime model otherwise. As we do not know the
+    placement of a task in advance, the model assumes the worst placement
+    (one process per VM)
+    """
+
+    def __init__(self, runtime_model: RuntimeModel = None):
+        self.runtime_model = (
+            RuntimeModel() if runtime_model is None else runtime_model
+        )
+        # Map of (app, size) pairs to the (sum, count) of observed times
+        self.observed: Dict[Tuple[str, int], Tuple[float, int]] = {}
+
+    def observe(self, task: TaskObject, exec_time: float) -> None:
+        key = (task.app, task.size)
+        exec_time_sum, count = self.observed.get(key, (0, 0))
+        self.observed[key] = (exec_time_sum + exec_time, count + 1)
+
+    def get_estimate(self, task: TaskObject) -> float:
+        key = (task.app, task.size)
+        if key in self.observed:
+            exec_time_sum, count = self.observed[key]
+            return exec_time_sum / count
+
+        return self.runtime_model.get_exec_time(
+            task, [("", 1) for _ in range(task.size)]
+        )
@@ -3,63 +3,83 @@ from faasmctl.util.config import (
     get_faasm_worker_names,
 )
 from faasmctl.util.planner import (
-    get_in_fligh_apps as planner_get_in_fligh_apps,
     set_next_evicted_host as planner_set_next_evicted_host,
     wait_for_workers as planner_wait_for_workers,
 )
 from faasmctl.util.restart import replica as restart_faasm_replica
+from functools import partial
 from logging import (
     getLogger,
     INFO as log_level_INFO,
 )
 from multiprocessing import Process, Queue
 from multiprocessing.queues import Empty as Queue_Empty
-from os.path import basename
-from random import sample
+from queue import Queue as ThreadQueue
 from subprocess import CalledProcessError
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Set, Tuple, Union
+from tasks.makespan.arrival import ArrivalDispatcher
+from tasks.makespan.backfill import (
+    BACKFILL_MAX_CANDIDATES,
+    CLUSTER_SLOTS_KEY,
+    EasyBackfill,
+)
+from tasks.makespan.capacity import VmCapacityIndex
 from tasks.makespan.data import (
-    ExecutedTaskInfo,
     ResultQueueItem,
     TaskObject,
     WorkQueueItem,
 )
-from tasks.util.elastic import (
-    ELASTIC_KERNEL,
-    OPENMP_ELASTIC_FUNCTION,
-    OPENMP_ELASTIC_NATIVE_BINARY,
-    OPENMP_ELASTIC_USER,
-    get_elastic_input_data,
+from tasks.makespan.deadline import DEFAULT_TASK_TIMEOUT_FACTOR, TaskDeadlines
+from tasks.makespan.executor import (
+    ALLOWED_EXECUTORS,
+    AsyncioExecutor,
+    get_faasm_msg_and_req,
+    get_native_exec_cmd,
+    get_native_master_vm,
+    get_result_queue_item,
+    has_native_task_timed_out,
+)
+from tasks.makespan.faults import (
+    DEFAULT_FAULT_MODEL,
+    FaultModel,
+    get_fault_model,
+)
+from tasks.makespan.journal import JournalReplay, SchedulerJournal
+from tasks.makespan.occupancy import OccupancyRecorder
+from tasks.makespan.render import (
+    RENDER_MAX_REDRAWS_PER_SEC,
+    TASK_STATE_EXECUTING,
+    TASK_STATE_FAILED,
+    TASK_STATE_FINISHED,
+    TASK_STATE_NONE,
+    ExperimentStateRenderer,
+)
+from tasks.makespan.retry import (
+    DEFAULT_MAX_TASK_RETRIES,
+    TaskRetryQueue,
+    VmExclusionList,
 )
+from tasks.makespan.placement import (
+    DEFAULT_PLACEMENT_POLICY,
+    PlacementPolicy,
+    get_placement_policy,
+)
+from tasks.makespan.runtime import RuntimeEstimator
+from tasks.makespan.stream import TaskStream, get_task_stream
 from tasks.util.faasm import (
     get_faasm_exec_time_from_json,
     has_app_failed,
+    is_faasm_mock_backend,
     post_async_msg_and_get_result_json,
 )
-from tasks.util.kernels import get_openmp_kernel_cmdline
 from tasks.util.k8s import wait_for_pods as wait_for_native_mpi_pods
-from tasks.util.lammps import (
-    LAMMPS_FAASM_USER,
-    LAMMPS_DOCKER_BINARY,
-    LAMMPS_DOCKER_DIR,
-    LAMMPS_FAASM_MIGRATION_NET_FUNC,
-    LAMMPS_MIGRATION_NET_DOCKER_BINARY,
-    LAMMPS_MIGRATION_NET_DOCKER_DIR,
-    LAMMPS_SIM_NUM_ITERATIONS,
-    get_lammps_data_file,
-    get_lammps_migration_params,
-    get_lammps_workload,
-)
 from tasks.util.makespan import (
     ALLOWED_BASELINES,
     EXEC_TASK_INFO_FILE_PREFIX,
     GRANNY_BASELINES,
     GRANNY_BATCH_BASELINES,
-    GRANNY_ELASTIC_BASELINES,
     GRANNY_FT_BASELINES,
     GRANNY_MIGRATE_BASELINES,
-    MPI_MIGRATE_WORKLOADS,
-    MPI_WORKLOADS,
     NATIVE_BASELINES,
     NATIVE_FT_BASELINES,
     OPENMP_WORKLOADS,
@@ -67,7 +87,12 @@ from tasks.util.makespan import (
     get_num_cpus_per_vm_from_trace,
     get_user_id_from_task,
     get_workload_from_trace,
-    write_line_to_csv,
+    ResultSink,
+)
+from tasks.util.metrics import (
+    METRIC_SCHEDULING_DECISION,
+    NULL_METRICS,
+    SchedulerMetrics,
 )
 from tasks.util.openmpi import (
     get_native_mpi_namespace,
@@ -76,10 +101,16 @@ from tasks.util.openmpi import (
     run_kubectl_cmd,
 )
 from tasks.util.planner import (
+    PLANNER_SNAPSHOT_MAX_STALENESS_SECS,
+    PlannerPoller,
+    PlannerStateWaiter,
+    get_in_flight_app_ids,
     get_num_available_slots_from_in_flight_apps,
     get_num_idle_cpus_from_in_flight_apps,
     get_num_xvm_links_from_in_flight_apps,
 )
+from tasks.util.table import ExecutedTaskInfo, ExecutionTable
+from threading import Event, Thread
 from time import sleep, time
 
 ALL_FT_BASELINES = GRANNY_FT_BASELINES + NATIVE_FT_BASELINES
@@ -94,9 +125,6 @@ sch_logger.setLevel(log_level_INFO)
 NOT_ENOUGH_SLOTS = "NOT_ENOUGH_SLOTS"
 QUEUE_TIMEOUT_SEC = 10
 QUEUE_SHUTDOWN = "QUEUE_SHUTDOWN"
-INTERTASK_SLEEP = 1
-# How often do we query the planner for cluster occupation
-PLANNER_MONITOR_RESOLUTION_SECS = 4
 
 
 def has_task_failed(result: ResultQueueItem):
@@ -106,20 +134,19 @@ def has_task_failed(result: ResultQueueItem):
 def fault_injection_thread(
     baseline,
     num_vms,
-    fault_injection_period_secs,
+    fault_model,
     host_grace_period_secs,
-    num_faults,
 ):
     """
-    Thread used to periodically inject faults in a running cluster
+    Thread used to inject faults in a running cluster, following the
+    evictions of a fault model
 
-    The two arguments after the baseline determine the profile of our spot VM
-    simulation. The grace period value we get from Azure's reference, and the
-    FT period we make up. We could consider changing them but, for simplicity
-    we keep them the same
+    We notify each eviction to the planner `host_grace_period_secs` before
+    it happens (or right after the previous eviction, if they are closer than
+    that). The grace period value we get from Azure's reference
     """
 
-    def get_next_evicted_host(baseline, num_hosts_to_evict):
+    def get_evicted_hosts(baseline, vm_idxs):
         if baseline in GRANNY_BASELINES:
             vm_names = get_faasm_worker_names()
             vm_ips = get_faasm_worker_ips()
@@ -132,25 +159,20 @@ def fault_injection_thread(
             num_vms, len(vm_names)
         )
 
-        evicted_idxs = sample(range(0, len(vm_names)), num_hosts_to_evict)
-        evicted_vm_names = [
-            vm_names[evicted_idx] for evicted_idx in evicted_idxs
-        ]
-        evicted_vm_ips = [vm_ips[evicted_idx] for evicted_idx in evicted_idxs]
+        evicted_vm_names = [vm_names[vm_idx] for vm_idx in vm_idxs]
+        evicted_vm_ips = [vm_ips[vm_idx] for vm_idx in vm_idxs]
 
         return evicted_vm_names, evicted_vm_ips
 
-    # Main fault-injection loop. We have two periods that determine the loop:
-    # (i) how often we inject a fault, and (ii) how much heads-up we give the
-    # batch-scheduler (grace period). In the loop, we first sleep for (i) -
-    # (ii) and then for (ii)
-    while True:
-        next_evicted_hosts, next_evicted_ips = get_next_evicted_host(
-            baseline, num_faults
-        )
+    # Main fault-injection loop. For each eviction, we first sleep until we
+    # need to give the grace period, and then until the eviction
+    start_ts = time()
+    for event in fault_model.iter_events(num_vms):
+        sleep(max(start_ts + event.ts - host_grace_period_secs - time(), 0))
 
-        # First, sleep until we need to give the grace period
-        sleep(fault_injection_period_secs - host_grace_period_secs)
+        next_evicted_hosts, next_evicted_ips = get_evicted_hosts(
+            baseline, event.vm_idxs
+        )
 
         # Then, notify that the host will be evicted (only Granny understands
         # this)
@@ -158,10 +180,14 @@ def fault_injection_thread(
             planner_set_next_evicted_host(next_evicted_ips)
 
         # Now sleep for the grace period
-        sleep(host_grace_period_secs)
+        sleep(max(start_ts + event.ts - time(), 0))
 
-        # Finally, restart the host to simulate a spot VM eviction (aka fault)
+        # Finally, restart the host to simulate a spot VM eviction (aka fault).
+        # The mock planner evicts the VMs itself after the grace period
         if baseline in GRANNY_BASELINES:
+            if is_faasm_mock_backend():
+                continue
+
             restart_faasm_replica(next_evicted_hosts)
 
             # Wait for workers to be ready
@@ -194,6 +220,52 @@ def dequeue_with_timeout(
     return result
 
 
+def planner_monitor_thread(
+    poller: PlannerPoller,
+    stop_event: Event,
+    recorder: OccupancyRecorder,
+    num_vms: int,
+    num_cpus_per_vm: int,
+) -> None:
+    """
+    Record the cluster occupation from every snapshot that the planner poller
+    publishes, until there are no more in-flight apps (or we are stopped).
+    The recorder resamples the occupation onto its own time grid, so we never
+    query the planner ourselves
+    """
+    read_one = False
+    last_version = 0
+    while not stop_event.is_set():
+        snapshot = poller.wait_for_snapshot(
+            last_version, timeout=poller.period_secs
+        )
+        if snapshot is None or snapshot.version == last_version:
+            continue
+        last_version = snapshot.version
+
+        in_flight_apps = snapshot.in_flight_apps
+        idle_vms, idle_cpus = get_num_idle_cpus_from_in_flight_apps(
+            num_vms,
+            num_cpus_per_vm,
+            in_flight_apps,
+        )
+
+        if read_one and len(in_flight_apps.apps) == 0:
+            print("Zero in-flight apps. Shutting down monitor thread...")
+            break
+        elif len(in_flight_apps.apps) != 0:
+            read_one = True
+
+        recorder.record(
+            snapshot.ts,
+            idle_vms,
+            idle_cpus,
+            get_num_xvm_links_from_in_flight_apps(in_flight_apps),
+        )
+
+    recorder.flush()
+
+
 def thread_pool_thread(
     work_queue: Queue,
     result_queue: Queue,
@@ -206,7 +278,9 @@ def thread_pool_thread(
 ) -> None:
     """
     Loop for the worker threads in the thread pool. Each thread performs a
-    blocking request to execute a task
+    blocking request to execute a task. Native tasks with a deadline run
+    under `timeout` in their pod, so when the request returns the task is no
+    longer running
     """
 
     def thread_print(msg):
@@ -214,212 +288,44 @@ def thread_pool_thread(
 
     thread_print("Pool thread {} starting".format(thread_idx))
 
-    if thread_idx == 0:
-        if baseline in NATIVE_BASELINES:
-            return
-
-        read_one = False
-        while True:
-            sleep(PLANNER_MONITOR_RESOLUTION_SECS)
-
-            in_flight_apps = planner_get_in_fligh_apps()
-            idle_vms, idle_cpus = get_num_idle_cpus_from_in_flight_apps(
-                num_vms,
-                num_cpus_per_vm,
-                in_flight_apps,
-            )
-
-            if read_one and len(in_flight_apps.apps) == 0:
-                print("Zero in-flight apps. Shutting down poller thread...")
-                break
-            elif len(in_flight_apps.apps) != 0:
-                read_one = True
-
-            write_line_to_csv(
-                baseline,
-                SCHEDULING_INFO_FILE_PREFIX,
-                num_vms,
-                num_tasks_per_user,
-                trace_str,
-                time(),
-                idle_vms,
-                idle_cpus,
-                get_num_xvm_links_from_in_flight_apps(in_flight_apps),
-            )
-
     work_queue: WorkQueueItem
     while True:
         work_item = dequeue_with_timeout(work_queue, "work queue", silent=True)
         has_failed = False
+        timed_out = False
 
         # IP for the master VM
         master_vm_ip = None
         if len(work_item.sched_decision) > 0:
             master_vm_ip = work_item.sched_decision[0][0]
 
-        if baseline in NATIVE_BASELINES and master_vm_ip != QUEUE_SHUTDOWN:
-            # Get the VM name for an IP directly from kuberenetes every
-            # time, as the translation may become stale in a faulty
-            # workload (e.g. mpi-spot)
-            names, ips = get_native_mpi_pods("makespan")
-            for name, ip in zip(names, ips):
-                if ip == master_vm_ip:
-                    master_vm = name
-
         # Check for shutdown message
         if master_vm_ip == QUEUE_SHUTDOWN:
             break
 
-        # Choose the right data file if running a LAMMPS simulation
-        if work_item.task.app in MPI_WORKLOADS:
-            if work_item.task.app == "mpi-locality":
-                lammps_workload = "very-network"
-            else:
-                lammps_workload = "compute"
-
-            workload_config = get_lammps_workload(lammps_workload)
-            assert (
-                "data_file" in workload_config
-            ), "Workload config has no data file!"
-            data_file = get_lammps_data_file(workload_config["data_file"])[
-                "data"
-            ][0]
-
         # Record the start timestamp
         start_ts = 0
         if baseline in NATIVE_BASELINES:
-            if work_item.task.app in MPI_WORKLOADS:
-                if work_item.task.app == "mpi":
-                    binary = LAMMPS_DOCKER_BINARY
-                    lammps_dir = LAMMPS_DOCKER_DIR
-                elif work_item.task.app in MPI_MIGRATE_WORKLOADS:
-                    binary = LAMMPS_MIGRATION_NET_DOCKER_BINARY
-                    lammps_dir = LAMMPS_MIGRATION_NET_DOCKER_DIR
-                native_cmdline = "-in {}/{}.faasm.native".format(
-                    lammps_dir, data_file
-                )
-                world_size = work_item.task.size
-                allocated_pod_ips = []
-                for tup in work_item.sched_decision:
-                    allocated_pod_ips += [tup[0]] * tup[1]
-
-                mpirun_cmd = [
-                    "mpirun",
-                    get_lammps_migration_params(
-                        num_loops=workload_config["num_iterations"],
-                        num_net_loops=workload_config["num_net_loops"],
-                        chunk_size=workload_config["chunk_size"],
-                        native=True,
-                    ),
-                    "-np {}".format(world_size),
-                    # To improve OpenMPI performance, we tell it exactly where
-                    # to run each rank. According to the MPI manual, to specify
-                    # multiple slots for the same host, we must repeat the host
-                    # name. This way, the host string would end up looking like
-                    # mpirun -np 5 hostA,hostA,hostA,hostB,hostB ...
-                    # https://docs.oracle.com/cd/E19923-01/820-6793-10/ExecutingPrograms.html#50524166_76503
-                    "-host {}".format(",".join(allocated_pod_ips)),
-                    binary,
-                    native_cmdline,
-                ]
-                mpirun_cmd = " ".join(mpirun_cmd)
-
-                exec_cmd = [
-                    "exec",
-                    master_vm,
-                    "--",
-                    "su mpirun -c '{}'".format(mpirun_cmd),
-                ]
-                exec_cmd = " ".join(exec_cmd)
-            elif work_item.task.app in OPENMP_WORKLOADS:
-                openmp_cmd = "bash -c '{} {} {}'".format(
-                    get_elastic_input_data(native=True),
-                    OPENMP_ELASTIC_NATIVE_BINARY,
-                    get_openmp_kernel_cmdline(
-                        ELASTIC_KERNEL, work_item.task.size
-                    ),
-                )
-
-                exec_cmd = [
-                    "exec",
-                    master_vm,
-                    "--",
-                    openmp_cmd,
-                ]
-                exec_cmd = " ".join(exec_cmd)
+            exec_cmd = get_native_exec_cmd(
+                work_item, get_native_master_vm(master_vm_ip)
+            )
 
             start_ts = time()
             try:
                 run_kubectl_cmd("makespan", exec_cmd)
-            except CalledProcessError:
-                has_failed = True
+            except CalledProcessError as e:
+                timed_out = has_native_task_timed_out(work_item, e)
+                has_failed = not timed_out
             actual_time = int(time() - start_ts)
         else:
             # Prepare Faasm request
-            req = {}
-
-            if work_item.task.app in MPI_WORKLOADS:
-                user = LAMMPS_FAASM_USER
-                func = LAMMPS_FAASM_MIGRATION_NET_FUNC
-                file_name = basename(data_file)
-                cmdline = "-in faasm://lammps-data/{}".format(file_name)
-
-                req["user"] = user
-                req["function"] = func
-                if get_workload_from_trace(trace_str) == "mpi-evict":
-                    req["subType"] = get_user_id_from_task(
-                        num_tasks_per_user, work_item.task.task_id
-                    )
-
-                msg = {
-                    "user": user,
-                    "function": func,
-                    "cmdline": cmdline,
-                    "mpi": True,
-                    "mpi_world_size": work_item.task.size,
-                }
-
-                # If attempting to migrate, add migration parameters
-                baselines_with_migration = (
-                    GRANNY_MIGRATE_BASELINES + GRANNY_FT_BASELINES
-                )
-                if work_item.task.app in MPI_MIGRATE_WORKLOADS:
-                    check_every = (
-                        1
-                        if baseline in baselines_with_migration
-                        else LAMMPS_SIM_NUM_ITERATIONS
-                    )
-                    msg["input_data"] = get_lammps_migration_params(
-                        check_every=check_every,
-                        num_loops=workload_config["num_iterations"],
-                        num_net_loops=workload_config["num_net_loops"],
-                        chunk_size=workload_config["chunk_size"],
-                    )
-            elif work_item.task.app in OPENMP_WORKLOADS:
-                if work_item.task.size > num_cpus_per_vm:
-                    print(
-                        "Requested OpenMP execution with more parallelism"
-                        "than slots in the current environment:"
-                        "{} > {}".format(work_item.task.size, num_cpus_per_vm)
-                    )
-                    raise RuntimeError("Error in OpenMP task trace!")
-                user = OPENMP_ELASTIC_USER
-                func = OPENMP_ELASTIC_FUNCTION
-                msg = {
-                    "user": user,
-                    "function": func,
-                    "input_data": get_elastic_input_data(),
-                    "cmdline": get_openmp_kernel_cmdline(
-                        ELASTIC_KERNEL, work_item.task.size
-                    ),
-                    "isOmp": True,
-                    "ompNumThreads": work_item.task.size,
-                }
-
-                req["user"] = user
-                req["function"] = func
-                req["singleHostHint"] = True
-                req["elasticScaleHint"] = baseline in GRANNY_ELASTIC_BASELINES
+            msg, req = get_faasm_msg_and_req(
+                work_item,
+                baseline,
+                num_cpus_per_vm,
+                num_tasks_per_user,
+                trace_str,
+            )
 
             # Post asynch request and wait for JSON result
             start_ts = time()
@@ -434,30 +340,17 @@ def thread_pool_thread(
 
         end_ts = time()
 
-        if has_failed:
-            sch_logger.error(
-                "Error executing task {}".format(work_item.task.task_id)
-            )
-            result_queue.put(
-                ResultQueueItem(
-                    work_item.task.task_id,
-                    -1,
-                    -1,
-                    -1,
-                    master_vm_ip,
-                )
+        result_queue.put(
+            get_result_queue_item(
+                work_item,
+                master_vm_ip,
+                has_failed,
+                actual_time,
+                start_ts,
+                end_ts,
+                timed_out=timed_out,
             )
-        else:
-            result_queue.put(
-                ResultQueueItem(
-                    work_item.task.task_id,
-                    actual_time,
-                    start_ts,
-                    end_ts,
-                    master_vm_ip,
-                )
-            )
-
+        )
     thread_print("Pool thread {} shutting down".format(thread_idx))
 
 
@@ -475,16 +368,18 @@ class SchedulerState:
     num_tasks: int
     num_cpus_per_vm: int
     num_tasks_per_user: int
-    # Only for `mpi-spot`, number of faulty VMs
-    num_faults: int = 0
+    # Only for `mpi-spot`, number of upcoming evictions that the planner
+    # always knows about, if the fault model has one
+    num_faults: int = None
 
     # Total accounting of slots
     total_slots: int
-    total_available_slots: int
 
     # Bookkeeping of the VMs we have identified by their IP, and their current
-    # occupancy
-    vm_map: Dict[str, int] = {}
+    # number of free slots (indexed by free capacity)
+    vm_map: VmCapacityIndex
+    # Policy to pick the VMs where we place each task
+    placement_policy: PlacementPolicy
     # Helper map to get the VM name from its IP
     vm_ip_to_name: Dict[str, str] = {}
 
@@ -493,12 +388,35 @@ class SchedulerState:
     # is the scheduling decision: a list of (ip, cores) pairs with the number
     # of cores assigned to each ip
     in_flight_tasks: Dict[int, List[Tuple[str, int]]] = {}
-
-    # Accounting of the executed tasks and their information
-    executed_task_info: Dict[int, ExecutedTaskInfo] = {}
+    # Second copies of in-flight tasks that we started speculatively, with
+    # the same format. If the task has finished, this is the copy that lost
+    speculative_copies: Dict[int, List[Tuple[str, int]]] = {}
+
+    # Multi-tenant occupancy index of the in-flight tasks. For each VM, we
+    # keep the number of in-flight tasks of each user in it, and for each
+    # user the set of VMs where it has in-flight tasks
+    vm_users: Dict[str, Dict[int, int]] = {}
+    user_vms: Dict[int, Set[str]] = {}
+
+    # Accounting of the executed tasks and their information. The table
+    # behaves like a dict of task ids to `ExecutedTaskInfo`s
+    executed_task_info: ExecutionTable = None
     executed_task_count: int = 0
     next_task_in_queue: TaskObject = None
 
+    # Queue of the tasks to run. We keep a cursor into the stream of tasks in
+    # the trace, and a queue of the tasks that failed and must run again. VMs
+    # where tasks failed recently are avoided by placement
+    tasks: TaskStream = None
+    next_task_idx: int = 0
+    retry_queue: TaskRetryQueue
+    vm_exclusions: VmExclusionList
+    # Renders the state of each task, if rendering is enabled
+    renderer: ExperimentStateRenderer = None
+
+    # Writer for the per-task results
+    result_sink: ResultSink
+
     def __init__(
         self,
         baseline: str,
@@ -506,7 +424,24 @@ class SchedulerState:
         num_vms: int,
         num_tasks_per_user: int,
         trace_str: str,
+        placement_policy: str = DEFAULT_PLACEMENT_POLICY,
+        result_sink: ResultSink = None,
+        max_task_retries: int = DEFAULT_MAX_TASK_RETRIES,
     ):
+        # Give each instance its own bookkeeping, so that we can instantiate
+        # more than one scheduler state in the same process (e.g. when
+        # simulating)
+        self.vm_ip_to_name = {}
+        self.in_flight_tasks = {}
+        self.speculative_copies = {}
+        self.vm_users = {}
+        self.user_vms = {}
+        self.executed_task_info = ExecutionTable(
+            0 if num_tasks is None else num_tasks
+        )
+        self.retry_queue = TaskRetryQueue(max_task_retries)
+        self.vm_exclusions = VmExclusionList()
+
         self.baseline = baseline
         self.num_tasks = num_tasks
         self.num_vms = num_vms
@@ -514,14 +449,24 @@ class SchedulerState:
         self.trace_str = trace_str
         self.num_cpus_per_vm = get_num_cpus_per_vm_from_trace(trace_str)
         self.workload = get_workload_from_trace(trace_str)
+        self.vm_map = VmCapacityIndex(self.num_cpus_per_vm)
+        self.placement_policy = get_placement_policy(placement_policy)
+        self.result_sink = (
+            ResultSink(baseline, num_vms, num_tasks_per_user, trace_str)
+            if result_sink is None
+            else result_sink
+        )
 
         # Work-out total number of slots
         self.total_slots = num_vms * self.num_cpus_per_vm
-        self.total_available_slots = self.total_slots
 
         # Initialise the pod list depending on the workload
         self.init_vm_list()
 
+    @property
+    def total_available_slots(self) -> int:
+        return self.vm_map.total_free
+
     def init_vm_list(self):
         """
         Initialise pod names and pod map depending on the baseline
@@ -590,6 +535,30 @@ class SchedulerState:
                 self.vm_map[vm_ip] = self.num_cpus_per_vm
                 self.vm_ip_to_name[vm_ip] = vm_name
 
+    def get_user_id(self, task_id: int) -> int:
+        return get_user_id_from_task(self.num_tasks_per_user, task_id)
+
+    def add_in_flight_task(
+        self, task_id: int, scheduling_decision: List[Tuple[str, int]]
+    ) -> None:
+        self.in_flight_tasks[task_id] = scheduling_decision
+        self.add_vm_users(task_id, scheduling_decision)
+
+    def add_vm_users(
+        self, task_id: int, scheduling_decision: List[Tuple[str, int]]
+    ) -> None:
+        user_id = self.get_user_id(task_id)
+        for ip, _ in scheduling_decision:
+            if ip not in self.vm_users:
+                self.vm_users[ip] = {}
+            if user_id not in self.vm_users[ip]:
+                self.vm_users[ip][user_id] = 0
+                if user_id not in self.user_vms:
+                    self.user_vms[user_id] = set()
+                self.user_vms[user_id].add(ip)
+
+            self.vm_users[ip][user_id] += 1
+
     def remove_in_flight_task(self, task_id: int) -> None:
         if task_id not in self.in_flight_tasks:
             raise RuntimeError("Task {} not in-flight!".format(task_id))
@@ -597,143 +566,229 @@ class SchedulerState:
             "Removing task {} from in-flight tasks".format(task_id)
         )
 
-        # Return the slots to each pod
-        scheduling_decision: List[Tuple[str, int]] = self.in_flight_tasks[
-            task_id
-        ]
+        self.release_slots(task_id, self.in_flight_tasks[task_id])
+
+        # Remove the task from in-flight
+        del self.in_flight_tasks[task_id]
+
+    def release_slots(
+        self, task_id: int, scheduling_decision: List[Tuple[str, int]]
+    ) -> None:
+        """
+        Return the slots of a task to each pod
+        """
+        user_id = self.get_user_id(task_id)
         for ip, slots in scheduling_decision:
             if ip in self.vm_map:
                 self.vm_map[ip] += slots
 
-            self.total_available_slots += slots
+            self.vm_users[ip][user_id] -= 1
+            if self.vm_users[ip][user_id] == 0:
+                del self.vm_users[ip][user_id]
+                self.user_vms[user_id].discard(ip)
+                if len(self.user_vms[user_id]) == 0:
+                    del self.user_vms[user_id]
+                if len(self.vm_users[ip]) == 0:
+                    del self.vm_users[ip]
+
+    def add_speculative_copy(
+        self, task_id: int, scheduling_decision: List[Tuple[str, int]]
+    ) -> None:
+        self.speculative_copies[task_id] = scheduling_decision
+        self.add_vm_users(task_id, scheduling_decision)
+
+    def remove_speculative_copy(self, task_id: int) -> None:
+        self.release_slots(task_id, self.speculative_copies.pop(task_id))
+
+    def swap_speculative_copy(self, task_id: int) -> None:
+        """
+        Make the speculative copy of a task the in-flight one, and the other
+        way round. Both copies hold their slots, so our accounting does not
+        change
+        """
+        self.in_flight_tasks[task_id], self.speculative_copies[task_id] = (
+            self.speculative_copies[task_id],
+            self.in_flight_tasks[task_id],
+        )
 
-        # Remove the task from in-flight
-        del self.in_flight_tasks[task_id]
+    def is_vm_used_by_other_users(self, ip: str, user_id: int) -> bool:
+        if ip not in self.vm_users:
+            return False
 
-    def get_next_task(self, tasks):
-        for task in tasks:
-            if (
-                task.task_id in self.executed_task_info
-                and self.executed_task_info[task.task_id].time_executing == -1
+        return len(self.vm_users[ip]) > 1 or user_id not in self.vm_users[ip]
+
+    def get_num_free_slots_for_user(self, user_id: int) -> int:
+        """
+        Number of free slots in the VMs that are not running tasks from other
+        users. We only need to walk the VMs with in-flight tasks
+        """
+        num_free_slots = self.vm_map.total_free
+        for ip in self.vm_users:
+            if ip in self.vm_map and self.is_vm_used_by_other_users(
+                ip, user_id
             ):
-                return task
+                num_free_slots -= self.vm_map[ip]
+
+        return num_free_slots
+
+    def init_task_queue(self, tasks: TaskStream) -> None:
+        self.tasks = tasks
+        self.next_task_idx = 0
 
-            if task.task_id not in self.executed_task_info:
+    def get_next_task(self, now: float = None) -> TaskObject:
+        """
+        Return the next task to run: a failed task whose backoff has expired
+        or, otherwise, the next task in the trace that has not started yet
+        """
+        task_idx = self.retry_queue.pop_ready(time() if now is None else now)
+        if task_idx is not None:
+            return self.tasks.get(task_idx)
+
+        # Skip the tasks that have started already (e.g. backfilled, or
+        # restored from a journal). The ones that finished are released
+        while self.tasks.read_until(self.next_task_idx):
+            task = self.tasks.get(self.next_task_idx)
+            if task is None:
+                self.next_task_idx += 1
+            elif task.task_id in self.executed_task_info:
+                if self.get_task_state(task.task_id) == TASK_STATE_FINISHED:
+                    self.tasks.release(task.task_id)
+                self.next_task_idx += 1
+            else:
+                self.next_task_idx += 1
                 return task
 
         return None
 
-    def print_executed_task_info(self, footer_text=None):
+    def get_num_settled_tasks(self) -> int:
         """
-        Log the state of the experiment (in particular the state of the
-        executed_task_info dictionary). The possible task states are:
-        NONE, EXECUTING, FINISHED, and FAILED
-        TODO: what about failure?
+        Number of tasks that we will not run again: the ones that finished,
+        and the ones that ran out of retries
         """
+        return self.executed_task_count + len(
+            self.retry_queue.abandoned_task_ids
+        )
 
-        # Populate the task array with the task state
-        task_state_array = ["NONE" for _ in range(self.num_tasks)]
-        for task_id in self.executed_task_info:
-            exec_task = self.executed_task_info[task_id]
-            if exec_task.time_executing == 0:
-                task_state_array[task_id] = "EXECUTING"
-            elif exec_task.time_executing == -1:
-                task_state_array[task_id] = "FAILED"
-            else:
-                task_state_array[task_id] = "FINISHED"
-
-        def color_text_from_state(state):
-            if state == "NONE":
-                return " "
-            if state == "EXECUTING":
-                return "\033[38;5;3mO\033[0;0m"
-            if state == "FINISHED":
-                return "\033[38;5;2mX\033[0;0m"
-            if state == "FAILED":
-                return "\033[38;5;1mX\033[0;0m"
-
-        header = "============ EXPERIMENT STATE ============="
-        divider = "--------------------------------------------"
-        footer = "==========================================="
-
-        print(header)
-        # Print some information on the experiment
-        print(
+    def task_failed(
+        self,
+        task_id: int,
+        scheduling_decision: List[Tuple[str, int]],
+        now: float,
+    ) -> None:
+        """
+        Avoid the VMs where the task failed for a while, and queue the task to
+        run again (if it has retries left)
+        """
+        self.vm_exclusions.record_failure(
+            [ip for ip, _ in scheduling_decision], now
+        )
+
+        if not self.retry_queue.task_failed(
+            task_id, self.tasks.get_idx(task_id), now
+        ):
+            self.tasks.release(task_id)
+            sch_logger.error(
+                "Task {} failed {} times, giving up on it".format(
+                    task_id, self.retry_queue.num_retries[task_id]
+                )
+            )
+
+    def get_task_state(self, task_id: int) -> str:
+        """
+        The possible task states are: NONE, EXECUTING, FINISHED, and FAILED
+        """
+        if task_id not in self.executed_task_info:
+            return TASK_STATE_NONE
+
+        exec_task = self.executed_task_info[task_id]
+        if exec_task.time_executing == 0:
+            return TASK_STATE_EXECUTING
+        if exec_task.time_executing == -1:
+            return TASK_STATE_FAILED
+
+        return TASK_STATE_FINISHED
+
+    def update_task_state(self, task_id: int) -> None:
+        """
+        Report a change in the executed_task_info dictionary to the renderer
+        """
+        if self.renderer is not None:
+            self.renderer.set_task_state(task_id, self.get_task_state(task_id))
+
+    def set_next_task_in_queue(self, task: TaskObject) -> None:
+        self.next_task_in_queue = task
+        if self.renderer is not None:
+            self.renderer.mark_dirty()
+
+    def get_experiment_info_lines(self) -> List[str]:
+        """
+        Information on the experiment that we render above the task states
+        """
+        lines = [
             "Wload: {}\tNum VMs: {}\tCores/VM: {}".format(
                 self.baseline, len(self.vm_map), self.num_cpus_per_vm
-            )
-        )
-        print(
+            ),
             "Total cluster occupation: {}/{} ({:.2f} %)".format(
                 self.total_slots - self.total_available_slots,
                 self.total_slots,
                 (self.total_slots - self.total_available_slots)
                 / self.total_slots
                 * 100,
-            )
-        )
-        if self.next_task_in_queue is not None:
-            print(
+            ),
+        ]
+
+        next_task_in_queue = self.next_task_in_queue
+        if next_task_in_queue is not None:
+            lines.append(
                 "Next task in queue: {} (size: {})".format(
-                    self.next_task_in_queue.task_id,
-                    self.next_task_in_queue.size,
+                    next_task_in_queue.task_id, next_task_in_queue.size
                 )
             )
-        print(divider)
-        # Print it
-        tasks_per_line = 10
-        line = ""
-        for i in range(self.num_tasks):
-            color_text = color_text_from_state(task_state_array[i])
-            if i == 0:
-                line = "{}:  [{}]".format(i, color_text)
-            elif i % tasks_per_line == 0:
-                print(line)
-                line = "{}: [{}]".format(i, color_text)
-            else:
-                line += " [{}]".format(color_text)
-        print(line)
-        if footer_text:
-            print(divider)
-            print(footer_text)
-        print(footer)
-
-    def update_records_from_result(self, result: ResultQueueItem):
+
+        return lines
+
+    def update_records_from_result(
+        self, result: ResultQueueItem, now: float = None
+    ):
         """
         Given a ResultQueueItem, update our records on executed tasks
         """
+        scheduling_decision = self.in_flight_tasks.get(result.task_id, [])
         self.remove_in_flight_task(result.task_id)
 
         if result.task_id not in self.executed_task_info:
             raise RuntimeError("Unrecognised task {}", result.task_id)
 
-        self.executed_task_info[result.task_id].time_executing = (
-            result.exec_time
-        )
-        self.executed_task_info[result.task_id].exec_start_ts = result.start_ts
-        self.executed_task_info[result.task_id].exec_end_ts = result.end_ts
+        task_info = self.executed_task_info[result.task_id]
+        task_info.time_executing = result.exec_time
+        task_info.exec_start_ts = result.start_ts
+        task_info.exec_end_ts = result.end_ts
 
         if not has_task_failed(result):
             self.executed_task_count += 1
+            self.tasks.release(result.task_id)
 
             # For reliability, also write a line to a file
             # Note that we tag CSV files by the hardware we provision; i.e. the
-            # number of VMs and the number of cores per VM
-            write_line_to_csv(
-                self.baseline,
+            # number of VMs and the number of cores per VM. We write the times
+            # as we got them, as the table stores them as floats
+            self.result_sink.write_line(
                 EXEC_TASK_INFO_FILE_PREFIX,
-                self.num_vms,
-                self.num_tasks_per_user,
-                self.trace_str,
-                self.executed_task_info[result.task_id].task_id,
-                self.executed_task_info[result.task_id].time_executing,
-                self.executed_task_info[result.task_id].time_in_queue,
-                self.executed_task_info[result.task_id].exec_start_ts,
-                self.executed_task_info[result.task_id].exec_end_ts,
+                result.task_id,
+                result.exec_time,
+                task_info.time_in_queue,
+                result.start_ts,
+                result.end_ts,
+            )
+        else:
+            self.task_failed(
+                result.task_id,
+                scheduling_decision,
+                time() if now is None else now,
             )
 
-        # Lastly, print the executed task info for visualisation purposes
-        self.print_executed_task_info()
+        # Lastly, report the new task state for visualisation purposes
+        self.update_task_state(result.task_id)
 
         # For native baselines that rely on this scheduler for the correct IP
         # allocation, we need to update the list of IPs and VM map
@@ -745,9 +800,39 @@ class BatchScheduler:
     work_queue: Queue = Queue()
     result_queue: Queue = Queue()
     thread_pool: List[Process]
+    executor: AsyncioExecutor = None
+    # Optional EASY backfilling, if disabled the scheduler is strictly FIFO
+    backfill: EasyBackfill = None
+    # Estimates of the execution time of each task, that backfilling and
+    # deadlines share. We feed it with the times of the tasks that succeed
+    estimator: RuntimeEstimator = None
+    # Only for Granny baselines, shared poller of the planner state and the
+    # thread that records the cluster occupation
+    planner_poller: PlannerPoller = None
+    occupancy: OccupancyRecorder = None
+    # Only for Granny baselines, waits for the planner state to change when
+    # the scheduling checks need to retry, and records for how long
+    planner_waiter: PlannerStateWaiter = None
+    # Only for Granny baselines, the apps in-flight before we dispatched the
+    # last task, until the planner registers the app for it
+    app_ids_before_dispatch: Set[int] = None
+    # Append-only journal of scheduling decisions and results, and the state
+    # we rebuilt from it if resuming a run
+    journal: SchedulerJournal = None
+    resumed_from: JournalReplay = None
+    # Latency histograms of the scheduler's hot paths, if instrumented
+    metrics: SchedulerMetrics = NULL_METRICS
+    # Deadlines of the in-flight tasks (only if tasks time out, or we start
+    # speculative copies), and whether we start speculative copies of the
+    # stragglers
+    deadlines: TaskDeadlines = None
+    speculate: bool = False
+    monitor_thread: Thread
+    monitor_stop_event: Event
     state: SchedulerState
     start_ts: float = 0.0
-    fault_injection_daemon: Process
+    fault_injection_daemon: Process = None
+    arrivals: ArrivalDispatcher
 
     def __init__(
         self,
@@ -756,13 +841,50 @@ class BatchScheduler:
         num_vms: int,
         num_tasks_per_user: int,
         trace_str: str,
+        time_compression: float = 1,
+        executor: str = "process",
+        backfill: bool = False,
+        placement: str = DEFAULT_PLACEMENT_POLICY,
+        planner_max_staleness_secs: float = PLANNER_SNAPSHOT_MAX_STALENESS_SECS,
+        result_sink: ResultSink = None,
+        resume: bool = False,
+        headless: bool = False,
+        render_max_redraws_per_sec: float = RENDER_MAX_REDRAWS_PER_SEC,
+        instrument: bool = False,
+        fault_model: FaultModel = None,
+        max_task_retries: int = DEFAULT_MAX_TASK_RETRIES,
+        task_timeout_factor: float = DEFAULT_TASK_TIMEOUT_FACTOR,
+        speculate: bool = False,
     ):
+        if executor not in ALLOWED_EXECUTORS:
+            print(
+                "Unrecognised executor ({}) must be one in: {}".format(
+                    executor, ALLOWED_EXECUTORS
+                )
+            )
+            raise RuntimeError("Unrecognised executor: {}".format(executor))
+
+        # We can not cancel a Faasm app once it runs, so a timed-out app would
+        # keep running (and holding its slots) while we retry it
+        if task_timeout_factor > 0 and baseline not in NATIVE_BASELINES:
+            print(
+                "Task timeouts are only supported in the native baselines: "
+                "{}".format(NATIVE_BASELINES)
+            )
+            raise RuntimeError(
+                "Unsupported task timeouts for baseline: {}".format(baseline)
+            )
+
+        self.time_compression = time_compression
         self.state = SchedulerState(
             baseline,
             num_tasks,
             num_vms,
             num_tasks_per_user,
             trace_str,
+            placement_policy=placement,
+            result_sink=result_sink,
+            max_task_retries=max_task_retries,
         )
 
         print("Initialised batch scheduler with the following parameters:")
@@ -770,12 +892,66 @@ class BatchScheduler:
         print("\t- Workload: {}".format(self.state.workload))
         print("\t- Number of VMs: {}".format(self.state.num_vms))
         print("\t- Cores per VM: {}".format(self.state.num_cpus_per_vm))
+        print("\t- Time compression: {}".format(self.time_compression))
+        print("\t- Executor: {}".format(executor))
+        print("\t- Backfilling: {}".format(backfill))
+        print("\t- Placement policy: {}".format(placement))
+        print("\t- Resume: {}".format(resume))
+        print("\t- Headless: {}".format(headless))
+        print("\t- Instrumented: {}".format(instrument))
+        print(
+            "\t- Max. task retries: {}".format(
+                "unlimited" if max_task_retries is None else max_task_retries
+            )
+        )
+        print("\t- Task timeout factor: {}".format(task_timeout_factor))
+        print("\t- Speculative copies: {}".format(speculate))
+
+        if instrument:
+            self.metrics = SchedulerMetrics()
+
+        # We only keep track of deadlines if tasks time out, or if we start
+        # speculative copies of the stragglers
+        self.estimator = RuntimeEstimator()
+        if task_timeout_factor > 0 or speculate:
+            self.deadlines = TaskDeadlines(
+                self.estimator, timeout_factor=task_timeout_factor
+            )
+        self.speculate = speculate
 
-        # We are pessimistic with the number of threads and allocate 2 times
-        # the number of VMs, as the minimum world size we will ever use is half
-        # of a VM. We use and additional thread to monitor the number of cross-
-        # VM links in our deployment
-        self.num_threads_in_pool = int(2 * self.state.num_vms + 1)
+        # Load the journal before we start any threads, so that we fail early
+        # if we can not resume
+        self.journal = SchedulerJournal(
+            baseline,
+            num_vms,
+            num_tasks_per_user,
+            trace_str,
+            time_compression=time_compression,
+        )
+        if resume:
+            self.resumed_from = self.journal.load()
+            print(
+                "Resuming run from {} ({} tasks finished, {} interrupted,"
+                " {} abandoned, {:.2f} s elapsed)".format(
+                    self.journal.file_path,
+                    len(self.resumed_from.executed_task_info),
+                    len(self.resumed_from.interrupted_task_ids),
+                    len(self.resumed_from.abandoned_task_ids),
+                    self.resumed_from.elapsed_secs,
+                )
+            )
+
+        if backfill:
+            self.backfill = self.get_backfill()
+
+        if executor == "asyncio":
+            # Tasks run as coroutines in the executor's event loop
+            self.num_threads_in_pool = 0
+        else:
+            # We are pessimistic with the number of threads and allocate 2
+            # times the number of VMs, as the minimum world size we will ever
+            # use is half of a VM
+            self.num_threads_in_pool = int(2 * self.state.num_vms)
         self.thread_pool = [
             Process(
                 target=thread_pool_thread,
@@ -801,15 +977,79 @@ class BatchScheduler:
         for thread in self.thread_pool:
             thread.start()
 
+        if executor == "asyncio":
+            # Results come from a thread in this process, not from the pool
+            self.result_queue = ThreadQueue()
+            self.executor = AsyncioExecutor(
+                self.result_queue,
+                baseline,
+                self.state.num_cpus_per_vm,
+                self.state.num_tasks_per_user,
+                self.state.trace_str,
+            )
+            self.executor.start()
+            print("Initialised asyncio executor")
+
+        # For Granny baselines, one thread polls the planner state, and the
+        # scheduling checks and the occupancy monitor read its snapshots. We
+        # start threads after forking the thread pool
+        if baseline in GRANNY_BASELINES:
+            self.planner_poller = PlannerPoller(
+                max_staleness_secs=planner_max_staleness_secs,
+                metrics=self.metrics,
+            )
+            self.planner_poller.start()
+            self.planner_waiter = PlannerStateWaiter(
+                self.planner_poller, metrics=self.metrics
+            )
+
+            self.occupancy = OccupancyRecorder(
+                self.state.result_sink,
+                self.state.num_vms,
+                self.state.num_cpus_per_vm,
+            )
+            self.monitor_stop_event = Event()
+            self.monitor_thread = Thread(
+                target=planner_monitor_thread,
+                daemon=True,
+                args=(
+                    self.planner_poller,
+                    self.monitor_stop_event,
+                    self.occupancy,
+                    self.state.num_vms,
+                    self.state.num_cpus_per_vm,
+                ),
+            )
+            self.monitor_thread.start()
+            print("Initialised planner poller and monitor threads")
+
+        # Unless we run headless, a background thread renders the state of
+        # each task as it changes
+        if not headless:
+            self.state.renderer = ExperimentStateRenderer(
+                num_tasks,
+                self.state.get_experiment_info_lines,
+                max_redraws_per_sec=render_max_redraws_per_sec,
+            )
+            self.state.renderer.start()
+
         # Start the fault injection daemon for the appropriate workloads
         if self.state.workload == "mpi-spot" and baseline in ALL_FT_BASELINES:
-            # How often we notify a host that it will be evicted
-            fault_injection_period_secs = 60
             # What grace period do we give hosts after notifying their eviction
             host_grace_period_secs = 60
-            # How many faults we are injecting
-            num_faults = int(num_vms / 4)
-            self.state.num_faults = num_faults
+            if fault_model is None:
+                fault_model = get_fault_model(
+                    DEFAULT_FAULT_MODEL, self.state.num_vms
+                )
+            # Number of evictions Granny's planner always knows about (if any)
+            self.state.num_faults = fault_model.get_num_pending_evictions(
+                host_grace_period_secs
+            )
+            print(
+                "Injecting faults with the {} fault model (seed: {})".format(
+                    fault_model.name, fault_model.seed
+                )
+            )
 
             self.fault_injection_daemon = Process(
                 target=fault_injection_thread,
@@ -817,9 +1057,8 @@ class BatchScheduler:
                 args=(
                     baseline,
                     self.state.num_vms,
-                    fault_injection_period_secs,
+                    fault_model,
                     host_grace_period_secs,
-                    num_faults,
                 ),
             )
             self.fault_injection_daemon.start()
@@ -827,6 +1066,31 @@ class BatchScheduler:
             print("Initialised background fault-injection thread")
 
     def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+        if self.deadlines is not None:
+            self.deadlines.print_summary()
+
+        if self.state.renderer is not None:
+            self.state.renderer.stop()
+
+        if self.journal is not None:
+            self.journal.close()
+
+        # Stop injecting faults, so that they do not hit the next run in the
+        # same cluster (e.g. in a sweep)
+        if self.fault_injection_daemon is not None:
+            self.fault_injection_daemon.terminate()
+            self.fault_injection_daemon.join()
+
+        if self.planner_poller is not None:
+            self.monitor_stop_event.set()
+            self.monitor_thread.join()
+            self.occupancy.print_summary()
+            self.planner_poller.stop()
+            self.planner_waiter.stats.print_summary()
+
         shutdown_msg = WorkQueueItem(
             [(QUEUE_SHUTDOWN, -1)], TaskObject(-1, "-1", -1, -1)
         )
@@ -841,31 +1105,13 @@ class BatchScheduler:
     # In a multi-tenant setting, we want to _not_ consider for scheduling nodes
     # that are already running tasks for different users
     def prune_node_list_from_different_users(self, nodes, this_task):
-        this_task_id = get_user_id_from_task(
-            self.state.num_tasks_per_user, this_task.task_id
-        )
-
-        def get_indx_in_list(node_list, host_ip):
-            for idx, pair in enumerate(node_list):
-                if pair[0] == host_ip:
-                    return idx
-
-            return -1
+        user_id = self.state.get_user_id(this_task.task_id)
 
-        for task_id in self.state.in_flight_tasks:
-            if (
-                get_user_id_from_task(self.state.num_tasks_per_user, task_id)
-                == this_task_id
-            ):
-                continue
-
-            sched_decision = self.state.in_flight_tasks[task_id]
-            for host_ip, num_msgs_in_host in sched_decision:
-                idx = get_indx_in_list(nodes, host_ip)
-                if idx != -1:
-                    del nodes[idx]
-
-        return nodes
+        return [
+            (host_ip, num_slots)
+            for host_ip, num_slots in nodes
+            if not self.state.is_vm_used_by_other_users(host_ip, user_id)
+        ]
 
     def num_available_slots_from_vm_list(self, vm_list):
         num_avail_slots = 0
@@ -875,47 +1121,42 @@ class BatchScheduler:
 
         return num_avail_slots
 
+    # Native baselines rely on the python-side accounting of slots in the
+    # VM map, whereas Granny baselines rely on the planner
+    def has_local_slot_accounting(self):
+        return self.state.baseline in NATIVE_BASELINES
+
     # Helper method to know if we have enough slots to schedule a task
     def have_enough_slots_for_task(self, task: TaskObject):
-        if self.state.baseline in NATIVE_BASELINES:
+        if self.has_local_slot_accounting():
             if self.state.workload == "mpi-evict":
                 # For `mpi-evict` we run a multi-tenant trace, and prevent apps
                 # from different users from running in the same VM
-                sorted_vms = sorted(
-                    self.state.vm_map.items(),
-                    key=lambda item: item[1],
-                    reverse=True,
-                )
-
-                pruned_vms = self.prune_node_list_from_different_users(
-                    sorted_vms, task
-                )
-
                 return (
-                    self.num_available_slots_from_vm_list(pruned_vms)
+                    self.state.get_num_free_slots_for_user(
+                        self.state.get_user_id(task.task_id)
+                    )
                     >= task.size
                 )
             elif self.state.workload in OPENMP_WORKLOADS:
                 # For OpenMP workloads, we can only allocate them in one VM, so
                 # we compare the requested size with the largest capacity we
                 # have in one VM
-                sorted_vms = sorted(
-                    self.state.vm_map.items(),
-                    key=lambda item: item[1],
-                    reverse=True,
-                )
-
-                return sorted_vms[0][1] >= task.size
+                largest_vm = self.state.vm_map.get_largest_vm()
+                return largest_vm is not None and largest_vm[1] >= task.size
             else:
                 return self.state.total_available_slots >= task.size
         else:
             # For Granny, we can always rely on the planner to let us know
-            # how many slots we can use
+            # how many slots we can use, once it knows about all the tasks
+            # we have dispatched
+            self.wait_for_app_registration()
             if self.state.workload == "mpi-evict":
                 return (
                     get_num_available_slots_from_in_flight_apps(
                         self.state.num_vms,
                         self.state.num_cpus_per_vm,
+                        waiter=self.planner_waiter,
                         user_id=get_user_id_from_task(
                             self.state.num_tasks_per_user, task.task_id
                         ),
@@ -931,6 +1172,7 @@ class BatchScheduler:
                     get_num_available_slots_from_in_flight_apps(
                         self.state.num_vms,
                         self.state.num_cpus_per_vm,
+                        waiter=self.planner_waiter,
                         num_evicted_vms=self.state.num_faults,
                     )
                     >= task.size
@@ -944,6 +1186,7 @@ class BatchScheduler:
                     get_num_available_slots_from_in_flight_apps(
                         self.state.num_vms,
                         self.state.num_cpus_per_vm,
+                        waiter=self.planner_waiter,
                         next_task_size=task.size,
                     )
                     >= task.size
@@ -957,6 +1200,7 @@ class BatchScheduler:
                     get_num_available_slots_from_in_flight_apps(
                         self.state.num_vms,
                         self.state.num_cpus_per_vm,
+                        waiter=self.planner_waiter,
                         next_task_size=task.size,
                         batch=True,
                     )
@@ -968,6 +1212,7 @@ class BatchScheduler:
                     get_num_available_slots_from_in_flight_apps(
                         self.state.num_vms,
                         self.state.num_cpus_per_vm,
+                        waiter=self.planner_waiter,
                         openmp=True,
                     )
                     >= task.size
@@ -975,13 +1220,21 @@ class BatchScheduler:
 
             return (
                 get_num_available_slots_from_in_flight_apps(
-                    self.state.num_vms, self.state.num_cpus_per_vm
+                    self.state.num_vms,
+                    self.state.num_cpus_per_vm,
+                    waiter=self.planner_waiter,
                 )
                 >= task.size
             )
 
     def schedule_task_to_vm(
         self, task: TaskObject
+    ) -> Union[str, List[Tuple[str, int]]]:
+        with self.metrics.timer(METRIC_SCHEDULING_DECISION):
+            return self.try_schedule_task_to_vm(task)
+
+    def try_schedule_task_to_vm(
+        self, task: TaskObject
     ) -> Union[str, List[Tuple[str, int]]]:
         if not self.have_enough_slots_for_task(task):
             sch_logger.info(
@@ -996,91 +1249,622 @@ class BatchScheduler:
 
             return NOT_ENOUGH_SLOTS
 
+        scheduling_decision = self.plan_task_placement(task)
+
+        # For GRANNY baselines the scheduling decision is empty, as the
+        # planner has all the scheduling information
+        for vm, num_on_this_vm in scheduling_decision:
+            self.state.vm_map[vm] -= num_on_this_vm
+
+        # Before returning, persist the scheduling decision to state
+        self.state.add_in_flight_task(task.task_id, scheduling_decision)
+
+        return scheduling_decision
+
+    def is_placement_without_exclusions(
+        self, task: TaskObject, vms: List[Tuple[str, int]], now: float
+    ) -> bool:
+        """
+        Whether the candidate VMs fit the whole task without using any VM
+        where tasks failed recently
+        """
+        if any(
+            [self.state.vm_exclusions.is_excluded(ip, now) for ip, _ in vms]
+        ):
+            return False
+
+        if self.state.workload in OPENMP_WORKLOADS:
+            return len(vms) == 1 and vms[0][1] >= task.size
+
+        if self.state.baseline == "batch" and any(
+            [num_free != self.state.num_cpus_per_vm for _, num_free in vms]
+        ):
+            return False
+
+        return sum([num_free for _, num_free in vms]) >= task.size
+
+    def plan_task_placement(self, task: TaskObject) -> List[Tuple[str, int]]:
+        """
+        Work-out the scheduling decision for a task that fits in the cluster,
+        without updating our records
+        """
         # A scheduling decision is a list of (ip, slots) pairs inidicating
         # how many slots each ip has been assigned for the current task
         scheduling_decision: List[Tuple[str, int]] = []
+        if not self.has_local_slot_accounting():
+            return scheduling_decision
+
+        # The placement policy gives us the VMs where to place the task, and
+        # we schedule as many slots as possible to each VM, in order. We
+        # don't distribute OpenMP jobs, and in a multi-tenant setting (i.e.
+        # `mpi-evict`) we skip VMs running tasks from other users
+        skip_vm = None
+        if self.state.workload == "mpi-evict":
+            user_id = self.state.get_user_id(task.task_id)
+            skip_vm = partial(
+                self.state.is_vm_used_by_other_users, user_id=user_id
+            )
+
+        # Avoid the VMs where tasks failed recently, as long as the task fits
+        # in the other VMs
+        single_vm = self.state.workload in OPENMP_WORKLOADS
+        sorted_vms = None
+        now = self.get_time()
+        if self.state.vm_exclusions.has_exclusions(now):
+            sorted_vms = self.state.placement_policy.get_candidate_vms(
+                self.state.vm_map,
+                task.size,
+                single_vm=single_vm,
+                skip_vm=lambda ip: self.state.vm_exclusions.is_excluded(
+                    ip, now
+                )
+                or (skip_vm is not None and skip_vm(ip)),
+            )
+            if not self.is_placement_without_exclusions(task, sorted_vms, now):
+                sorted_vms = None
+
+        if sorted_vms is None:
+            sorted_vms = self.state.placement_policy.get_candidate_vms(
+                self.state.vm_map,
+                task.size,
+                single_vm=single_vm,
+                skip_vm=skip_vm,
+            )
+
+        return self.assign_slots_to_vms(task, sorted_vms)
+
+    def assign_slots_to_vms(
+        self, task: TaskObject, sorted_vms: List[Tuple[str, int]]
+    ) -> List[Tuple[str, int]]:
+        """
+        Assign the slots of a task to the candidate VMs, in order
+        """
+        scheduling_decision: List[Tuple[str, int]] = []
         left_to_assign = task.size
-        # We follow a very simple scheduling policy: we sort the VMs in
-        # decresing order of capacity, and schedule as many slots as possible
-        # to each VM. We don't distribute OpenMP jobs, as a consequence if
-        # the task does not fit the greatest VM, we return
-        sorted_vms = sorted(
-            self.state.vm_map.items(), key=lambda item: item[1], reverse=True
-        )
+        for vm, num_slots in sorted_vms:
+            # Work out how many slots can we take up in this pod
+            if self.state.baseline == "batch":
+                # The batch native baseline allocates resources at VM
+                # granularity. This means that the current VM should be
+                # empty
+                assert num_slots == self.state.num_cpus_per_vm
+                num_on_this_vm = self.state.num_cpus_per_vm
+            else:
+                num_on_this_vm = min(num_slots, left_to_assign)
+            scheduling_decision.append((vm, num_on_this_vm))
+
+            # Update the slots left to assign
+            left_to_assign -= num_on_this_vm
+            sch_logger.debug(
+                "Assigning {} slots to VM {} (left: {})".format(
+                    num_on_this_vm, vm, left_to_assign
+                )
+            )
 
-        if self.state.workload == "mpi-evict":
-            sorted_vms = self.prune_node_list_from_different_users(
-                sorted_vms, task
+            # If no more slots to assign, exit the loop
+            if left_to_assign <= 0:
+                break
+        else:
+            sch_logger.error(
+                "Ran out of pods to assign task slots to, "
+                "but still {} to assign".format(left_to_assign)
+            )
+            raise RuntimeError(
+                "Scheduling error: inconsistent scheduler state"
             )
 
-        if self.state.workload in OPENMP_WORKLOADS:
-            sorted_vms = [sorted_vms[0]]
+        return scheduling_decision
 
-        # For GRANNY baselines we can skip the python-side accounting as the
-        # planner has all the scheduling information
-        if self.state.baseline in NATIVE_BASELINES:
-            for vm, num_slots in sorted_vms:
-                # Work out how many slots can we take up in this pod
-                if self.state.baseline == "batch":
-                    # The batch native baseline allocates resources at VM
-                    # granularity. This means that the current VM should be
-                    # empty
-                    assert num_slots == self.state.num_cpus_per_vm
-                    num_on_this_vm = self.state.num_cpus_per_vm
-                else:
-                    num_on_this_vm = min(num_slots, left_to_assign)
-                scheduling_decision.append((vm, num_on_this_vm))
+    # --------- Backfilling -------
 
-                # Update the global state, and the slots left to assign
-                self.state.vm_map[vm] -= num_on_this_vm
-                self.state.total_available_slots -= num_on_this_vm
-                left_to_assign -= num_on_this_vm
-                sch_logger.debug(
-                    "Assigning {} slots to VM {} (left: {})".format(
-                        num_on_this_vm, vm, left_to_assign
-                    )
+    def get_backfill(self) -> EasyBackfill:
+        """
+        In a multi-tenant setting (i.e. `mpi-evict`) tasks from different
+        users can not share a VM, so the reservations must respect that too.
+        Without local slot accounting, the planner takes care of it
+        """
+        get_user_id = None
+        if (
+            self.state.workload == "mpi-evict"
+            and self.has_local_slot_accounting()
+        ):
+            get_user_id = self.get_task_user_id
+
+        return EasyBackfill(
+            self.fits_in_free_slots, self.estimator, get_user_id=get_user_id
+        )
+
+    def get_task_user_id(self, task: TaskObject) -> int:
+        return self.state.get_user_id(task.task_id)
+
+    def fits_in_free_slots(
+        self, task: TaskObject, free_slots: Dict[str, int]
+    ) -> bool:
+        """
+        Check if a task would fit in a given map of free slots per VM, with
+        the same constraints as `schedule_task_to_vm`
+        """
+        if self.state.workload in OPENMP_WORKLOADS:
+            return max(free_slots.values(), default=0) >= task.size
+
+        if self.state.baseline == "batch":
+            return (
+                sum(
+                    [
+                        num_slots
+                        for num_slots in free_slots.values()
+                        if num_slots == self.state.num_cpus_per_vm
+                    ]
                 )
+                >= task.size
+            )
 
-                # If no more slots to assign, exit the loop
-                if left_to_assign <= 0:
-                    break
+        return sum(free_slots.values()) >= task.size
+
+    def get_reserved_slots(
+        self, task: TaskObject, scheduling_decision: List[Tuple[str, int]]
+    ) -> List[Tuple[str, int]]:
+        """
+        Slots that a task takes up for backfilling purposes. Without local
+        slot accounting we do not know where the planner places each task,
+        so we account for slots in the cluster as a whole
+        """
+        if self.has_local_slot_accounting():
+            return scheduling_decision
+
+        return [(CLUSTER_SLOTS_KEY, task.size)]
+
+    def get_free_slots(self) -> Dict[str, int]:
+        if self.has_local_slot_accounting():
+            return dict(self.state.vm_map)
+
+        return {
+            CLUSTER_SLOTS_KEY: self.state.total_slots
+            - sum(
+                [
+                    num_slots
+                    for _, _, slots in self.backfill.in_flight.values()
+                    for _, num_slots in slots
+                ]
+            )
+        }
+
+    def get_backfill_candidates(
+        self, tasks: TaskStream, head: TaskObject, now: float
+    ) -> Tuple[List[TaskObject], float]:
+        """
+        Return the tasks behind the head of the queue that have arrived and
+        not started yet, and the arrival time of the next task behind them
+        (or None if there are no more tasks within the lookahead)
+        """
+        candidates = []
+        for task in tasks.iter_from(tasks.get_idx(head.task_id) + 1):
+            arrival_ts = self.arrivals.get_arrival_ts(task)
+            if arrival_ts > now:
+                return candidates, arrival_ts
+
+            if task.task_id in self.state.executed_task_info:
+                continue
+
+            candidates.append(task)
+            if len(candidates) == BACKFILL_MAX_CANDIDATES:
+                break
+
+        return candidates, None
+
+    def backfill_tasks(
+        self, tasks: TaskStream, head: TaskObject, now: float
+    ) -> None:
+        """
+        Start the tasks behind the head of the queue that do not delay its
+        reservation
+        """
+        candidates, _ = self.get_backfill_candidates(tasks, head, now)
+        if len(candidates) == 0:
+            return
+
+        self.backfill.reserve(head, self.get_free_slots(), now)
+        for task in candidates:
+            # Without local accounting, checking if a task fits is a
+            # round-trip to the planner, that may block until its state
+            # changes. So we first check it against our own view of the free
+            # slots, and only ask the planner for the task we pick
+            if self.has_local_slot_accounting():
+                if not self.have_enough_slots_for_task(task):
+                    continue
+                scheduling_decision = self.plan_task_placement(task)
             else:
-                sch_logger.error(
-                    "Ran out of pods to assign task slots to, "
-                    "but still {} to assign".format(left_to_assign)
-                )
-                raise RuntimeError(
-                    "Scheduling error: inconsistent scheduler state"
+                if not self.fits_in_free_slots(task, self.get_free_slots()):
+                    continue
+                scheduling_decision = []
+
+            reserved_slots = self.get_reserved_slots(task, scheduling_decision)
+            if not self.backfill.can_backfill(task, reserved_slots, now):
+                continue
+
+            scheduling_decision = self.schedule_task_to_vm(task)
+            if scheduling_decision == NOT_ENOUGH_SLOTS:
+                # If the planner disagrees with our view, asking it about the
+                # other candidates would not help until a task finishes
+                if not self.has_local_slot_accounting():
+                    break
+                continue
+
+            sch_logger.info(
+                "Backfilling task {} ahead of task {}".format(
+                    task.task_id, head.task_id
                 )
+            )
+            self.start_task(
+                task, scheduling_decision, self.arrivals.get_arrival_ts(task)
+            )
 
-        # Before returning, persist the scheduling decision to state
-        self.state.in_flight_tasks[task.task_id] = scheduling_decision
+        self.backfill.clear_reservation()
 
-        return scheduling_decision
+    def get_result_timeout(self, tasks: TaskStream, head: TaskObject):
+        """
+        When backfilling, we stop waiting for results when the next task
+        arrives, to consider it for backfilling
+        """
+        _, next_arrival_ts = self.get_backfill_candidates(tasks, head, time())
+        if next_arrival_ts is None:
+            return QUEUE_TIMEOUT_SEC
+
+        return min(QUEUE_TIMEOUT_SEC, max(next_arrival_ts - time(), 0.1))
+
+    # --------- Task execution -------
+
+    def get_time(self) -> float:
+        return time()
+
+    def update_records_from_result(self, result: ResultQueueItem) -> None:
+        if result.timed_out and self.deadlines is not None:
+            self.deadlines.task_timed_out(result.task_id)
+
+        if (
+            result.task_id in self.state.speculative_copies
+            and not self.resolve_speculative_result(result)
+        ):
+            return
+
+        if self.journal is not None:
+            self.journal.record_task_result(result)
+        self.metrics.task_finished(result)
+
+        # Observe the execution time before we release the task
+        if self.estimator is not None and not has_task_failed(result):
+            self.estimator.observe(
+                self.state.tasks.get(self.state.tasks.get_idx(result.task_id)),
+                result.exec_time,
+            )
+
+        self.state.update_records_from_result(result, now=self.get_time())
+
+        # Journal what we did with a failed task, so that a resumed run does
+        # not retry it more times than this one would have
+        if self.journal is not None and has_task_failed(result):
+            retry_queue = self.state.retry_queue
+            num_retries = retry_queue.num_retries[result.task_id]
+            if result.task_id in retry_queue.abandoned_task_ids:
+                self.journal.record_task_abandoned(result.task_id, num_retries)
+            else:
+                self.journal.record_task_retry(result.task_id, num_retries)
+
+        if self.backfill is not None:
+            self.backfill.task_finished(result.task_id)
+
+        if self.deadlines is not None:
+            self.deadlines.task_finished(result.task_id)
+            self.check_stragglers()
+
+    def start_task(
+        self,
+        task: TaskObject,
+        scheduling_decision: List[Tuple[str, int]],
+        time_in_queue_start: float,
+    ) -> None:
+        """
+        Record the time the task spent in the queue, and dispatch it
+        """
+        time_in_queue = int(time() - time_in_queue_start)
+        self.state.executed_task_info[task.task_id] = ExecutedTaskInfo(
+            task.task_id, 0, time_in_queue, 0, 0
+        )
+
+        if self.journal is not None:
+            self.journal.record_task_start(
+                task.task_id, scheduling_decision, time_in_queue
+            )
+        self.state.update_task_state(task.task_id)
+
+        if self.backfill is not None:
+            self.backfill.task_started(
+                task,
+                self.get_reserved_slots(task, scheduling_decision),
+                time(),
+            )
+
+        # Log the scheduling decision to a file
+        if self.state.baseline in NATIVE_BASELINES:
+            self.state.result_sink.write_line(
+                SCHEDULING_INFO_FILE_PREFIX,
+                task.task_id,
+                scheduling_decision,
+            )
+
+        # Lastly, dispatch the scheduled task for execution, with a deadline
+        timeout_secs = None
+        if self.deadlines is not None:
+            timeout_secs = self.deadlines.get_timeout_secs(task)
+            self.deadlines.task_started(task, time())
+        self.metrics.task_dispatched(task.task_id)
+        self.dispatch_task(
+            WorkQueueItem(scheduling_decision, task, timeout_secs)
+        )
+
+    def restore_from_journal(self) -> None:
+        """
+        Mark the tasks that finished in the previous run as executed. The
+        tasks that were in-flight when the previous run died are marked as
+        failed, so that we run them again. We also restore how many times we
+        had retried each task, and do not run again the tasks that had run
+        out of retries
+        """
+        for task_id in self.resumed_from.executed_task_info:
+            self.state.executed_task_info[task_id] = (
+                self.resumed_from.executed_task_info[task_id]
+            )
+            self.state.executed_task_count += 1
+
+        retry_queue = self.state.retry_queue
+        retry_queue.num_retries.update(self.resumed_from.num_retries)
+        for task_id in self.resumed_from.abandoned_task_ids:
+            self.state.executed_task_info[task_id] = ExecutedTaskInfo(
+                task_id, -1, -1, -1, -1
+            )
+            retry_queue.abandoned_task_ids.add(task_id)
+            self.state.tasks.find_idx(task_id)
+            self.state.tasks.release(task_id)
+
+        for task_id in self.resumed_from.interrupted_task_ids:
+            self.state.executed_task_info[task_id] = ExecutedTaskInfo(
+                task_id, -1, -1, -1, -1
+            )
+            self.state.retry_queue.push(self.state.tasks.find_idx(task_id), 0)
+
+        for task_id in self.state.executed_task_info:
+            self.state.update_task_state(task_id)
+
+    def wait_for_app_registration(self) -> None:
+        """
+        The executor posts Granny tasks to the planner asynchronously, so the
+        planner state may not show the slots that the last task we dispatched
+        is about to take. We wait until it does, so that we never admit a
+        task against them
+        """
+        if self.app_ids_before_dispatch is None:
+            return
+
+        if not self.planner_waiter.wait_for_new_app(
+            self.app_ids_before_dispatch
+        ):
+            sch_logger.warning(
+                "Planner did not register the last app we dispatched"
+            )
+        self.app_ids_before_dispatch = None
+
+    def dispatch_task(self, work_item: WorkQueueItem) -> None:
+        """
+        Hand a scheduled task to the executor backend
+        """
+        if self.planner_waiter is not None:
+            self.app_ids_before_dispatch = get_in_flight_app_ids(
+                self.planner_waiter.get_snapshot()
+            )
+
+        if self.executor is not None:
+            self.executor.submit(work_item)
+        else:
+            self.work_queue.put(work_item)
+
+    # --------- Stragglers -------
+
+    def check_stragglers(self, speculate: bool = False) -> None:
+        """
+        Flag the in-flight tasks that run for much longer than estimated. If
+        `speculate` is set, also try to start a copy of each straggler in
+        other VMs
+        """
+        for (
+            task,
+            running_secs,
+            estimate_secs,
+        ) in self.deadlines.update_stragglers(time()):
+            sch_logger.warning(
+                "Task {} is a straggler (running for {:.2f} s, estimated"
+                " {:.2f} s)".format(task.task_id, running_secs, estimate_secs)
+            )
+
+        if not speculate or not self.has_local_slot_accounting():
+            return
+
+        for task in list(self.deadlines.stragglers.values()):
+            if (
+                task.task_id in self.state.in_flight_tasks
+                and task.task_id not in self.state.speculative_copies
+            ):
+                self.start_speculative_copy(task)
+
+    def start_speculative_copy(self, task: TaskObject) -> None:
+        """
+        Start a second copy of a straggler in VMs other than the ones it runs
+        in, if it fits in the free slots. We only do this once per task. The
+        copy that loses keeps its slots until it finishes (or times out), as
+        we can not cancel a running task
+        """
+        if task.task_id in self.deadlines.speculated_task_ids:
+            return
+
+        straggler_ips = set(
+            [ip for ip, _ in self.state.in_flight_tasks[task.task_id]]
+        )
+        skip_vm = None
+        if self.state.workload == "mpi-evict":
+            user_id = self.state.get_user_id(task.task_id)
+            skip_vm = partial(
+                self.state.is_vm_used_by_other_users, user_id=user_id
+            )
+
+        now = self.get_time()
+        sorted_vms = self.state.placement_policy.get_candidate_vms(
+            self.state.vm_map,
+            task.size,
+            single_vm=self.state.workload in OPENMP_WORKLOADS,
+            skip_vm=lambda ip: ip in straggler_ips
+            or self.state.vm_exclusions.is_excluded(ip, now)
+            or (skip_vm is not None and skip_vm(ip)),
+        )
+        # The copy must not share any VM with the straggler
+        if any([ip in straggler_ips for ip, _ in sorted_vms]):
+            return
+
+        if not self.is_placement_without_exclusions(task, sorted_vms, now):
+            return
+
+        scheduling_decision = self.assign_slots_to_vms(task, sorted_vms)
+        for vm, num_on_this_vm in scheduling_decision:
+            self.state.vm_map[vm] -= num_on_this_vm
+        self.state.add_speculative_copy(task.task_id, scheduling_decision)
+        self.deadlines.speculated_task_ids.add(task.task_id)
+
+        sch_logger.info(
+            "Starting a speculative copy of task {} in {}".format(
+                task.task_id, scheduling_decision
+            )
+        )
+        self.dispatch_task(
+            WorkQueueItem(
+                scheduling_decision,
+                task,
+                self.deadlines.get_timeout_secs(task),
+            )
+        )
+
+    def resolve_speculative_result(self, result: ResultQueueItem) -> bool:
+        """
+        A task with a speculative copy runs twice, and we keep the first
+        result that succeeds. Return whether we should record this result,
+        i.e. false for the copy that lost, and for a failure while the other
+        copy is still running
+        """
+        task_id = result.task_id
+        if task_id not in self.state.in_flight_tasks:
+            # The task has finished already, so this is the copy that lost
+            self.state.remove_speculative_copy(task_id)
+            return False
+
+        # Make the copy that sent this result the in-flight one
+        is_copy = result.master_ip == (
+            self.state.speculative_copies[task_id][0][0]
+        )
+        if is_copy:
+            self.state.swap_speculative_copy(task_id)
+
+        if has_task_failed(result):
+            self.state.vm_exclusions.record_failure(
+                [ip for ip, _ in self.state.in_flight_tasks[task_id]],
+                self.get_time(),
+            )
+            self.state.remove_in_flight_task(task_id)
+            self.state.in_flight_tasks[task_id] = (
+                self.state.speculative_copies.pop(task_id)
+            )
+            return False
+
+        if is_copy:
+            self.deadlines.num_speculative_wins += 1
+
+        return True
+
+    def wait_for_arrival(self, task: TaskObject) -> None:
+        """
+        Block until the task arrives, according to the trace, processing the
+        results of the in-flight tasks in the meantime
+        """
+        time_to_arrival = self.arrivals.get_time_to_arrival(task, time())
+        while time_to_arrival > 0:
+            try:
+                result = dequeue_with_timeout(
+                    self.result_queue,
+                    "result queue",
+                    throw=True,
+                    timeout_s=time_to_arrival,
+                )
+                self.update_records_from_result(result)
+            except Queue_Empty:
+                pass
+
+            time_to_arrival = self.arrivals.get_time_to_arrival(task, time())
 
     def execute_tasks(
-        self, tasks: List[TaskObject]
-    ) -> Dict[int, ExecutedTaskInfo]:
+        self, tasks: Union[List[TaskObject], TaskStream]
+    ) -> ExecutionTable:
         """
-        Execute a list of tasks, and return details on the task execution
+        Execute a list (or a stream) of tasks, and return details on the task
+        execution
         """
-        # Mark the initial timestamp
+        tasks = get_task_stream(tasks)
+
+        # Mark the initial timestamp. When resuming, we shift it so that the
+        # time the previous process was down does not count
         self.start_ts = time()
+        self.state.init_task_queue(tasks)
+        if self.resumed_from is not None:
+            self.start_ts -= self.resumed_from.elapsed_secs
+            self.restore_from_journal()
+
+        if self.journal is not None:
+            self.journal.open(
+                self.start_ts, resume=self.resumed_from is not None
+            )
 
-        # def do_execute_tasks(this_tasks):
+        self.arrivals = ArrivalDispatcher(tasks, self.time_compression)
+        self.arrivals.start(self.start_ts)
 
         # We loop through all the tasks in a while loop to make sure that we
         # re-start tasks that have failed
         while True:
-            # for t_num, t in enumerate(this_tasks):
-            t = self.state.get_next_task(tasks)
+            t = self.state.get_next_task()
 
             while t is not None:
-                sch_logger.debug(
-                    "Sleeping {} seconds between tasks".format(INTERTASK_SLEEP)
-                )
-                sleep(INTERTASK_SLEEP)
-                sch_logger.debug("Done sleeping")
+                # Tasks are released at their arrival time in the trace, and
+                # spend time in the queue from then on. Re-started tasks are
+                # queued from the moment we pick them again
+                self.wait_for_arrival(t)
+                if t.task_id in self.state.executed_task_info:
+                    time_in_queue_start = time()
+                else:
+                    time_in_queue_start = self.arrivals.get_arrival_ts(t)
 
                 # Try to schedule the task with the current available
                 # resources
@@ -1088,10 +1872,14 @@ class BatchScheduler:
 
                 # If we don't have enough resources, wait for results until enough
                 # resources
-                time_in_queue_start = time()
                 while scheduling_decision == NOT_ENOUGH_SLOTS:
                     result: ResultQueueItem
 
+                    # Before waiting, start the tasks behind this one that
+                    # would not delay it
+                    if self.backfill is not None:
+                        self.backfill_tasks(tasks, t, time())
+
                     # In the MPI evict baseline we want to query often about being
                     # able to schedule, as some planner migrations may unblock
                     # scheduling
@@ -1110,12 +1898,27 @@ class BatchScheduler:
 
                             # If dequeue works, update records and try to
                             # schedule again
-                            self.state.update_records_from_result(result)
+                            self.update_records_from_result(result)
                         except Queue_Empty:
                             # If dequeue does not work (it times out) try to
                             # schedule again anyway
                             pass
 
+                        scheduling_decision = self.schedule_task_to_vm(t)
+                    elif self.backfill is not None:
+                        # When backfilling, we also stop waiting when a new
+                        # task arrives
+                        try:
+                            result = dequeue_with_timeout(
+                                self.result_queue,
+                                "result queue",
+                                throw=True,
+                                timeout_s=self.get_result_timeout(tasks, t),
+                            )
+                            self.update_records_from_result(result)
+                        except Queue_Empty:
+                            pass
+
                         scheduling_decision = self.schedule_task_to_vm(t)
                     else:
                         result = dequeue_with_timeout(
@@ -1123,71 +1926,91 @@ class BatchScheduler:
                         )
 
                         # Update our local records according to result
-                        self.state.update_records_from_result(result)
+                        self.update_records_from_result(result)
 
                         # Try to schedule again
                         scheduling_decision = self.schedule_task_to_vm(t)
 
                 # Once we have been able to schedule the task, record the time it
-                # took, i.e. the time the task spent in the queue
-                time_in_queue = int(time() - time_in_queue_start)
-                self.state.executed_task_info[t.task_id] = ExecutedTaskInfo(
-                    t.task_id, 0, time_in_queue, 0, 0
-                )
-
-                # Log the scheduling decision to a file
-                if self.state.baseline in NATIVE_BASELINES:
-                    write_line_to_csv(
-                        self.state.baseline,
-                        SCHEDULING_INFO_FILE_PREFIX,
-                        self.state.num_vms,
-                        self.state.num_tasks_per_user,
-                        self.state.trace_str,
-                        t.task_id,
-                        scheduling_decision,
-                    )
+                # took, i.e. the time the task spent in the queue, and start it
+                self.start_task(t, scheduling_decision, time_in_queue_start)
 
-                # Lastly, put the scheduled task in the work queue
-                self.work_queue.put(WorkQueueItem(scheduling_decision, t))
+                t = self.state.get_next_task()
 
-                t = self.state.get_next_task(tasks)
-
-                # Before printing the executed task info, update the next task
-                # (so that it is not anymore the current one)
+                # Update the next task (so that it is not anymore the current
+                # one)
                 if t is not None:
-                    self.state.next_task_in_queue = t
-                self.state.print_executed_task_info()
+                    self.state.set_next_task_in_queue(t)
 
             # Once we are done scheduling tasks, drain the result queue (no more
-            # tasks are next in queue). If any of the dequeued tasks fails,
-            # we will go back to the beginning
-            self.state.next_task_in_queue = None
-            while self.state.executed_task_count < len(tasks):
-                result = dequeue_with_timeout(
-                    self.result_queue, "result queue"
-                )
+            # tasks are next in queue). Once the backoff of a failed task
+            # expires, we go back to the beginning to re-start it
+            self.state.set_next_task_in_queue(None)
+            while self.state.get_num_settled_tasks() < len(tasks):
+                # No task is waiting for slots, so we may use the free ones
+                # to race the stragglers that hold up the run
+                if self.deadlines is not None:
+                    self.check_stragglers(speculate=self.speculate)
+
+                retry_ts = self.state.retry_queue.get_next_ready_ts()
+                if retry_ts is not None and retry_ts <= time():
+                    break
 
-                # Update our local records according to result
-                self.state.update_records_from_result(result)
+                # If there are no tasks in-flight, only the backoff is left.
+                # Without tasks to retry either, no task would ever settle
+                if len(self.state.in_flight_tasks) == 0:
+                    if retry_ts is None:
+                        sch_logger.error(
+                            "No tasks in-flight or to retry, but only {}/{} "
+                            "tasks settled".format(
+                                self.state.get_num_settled_tasks(), len(tasks)
+                            )
+                        )
+                        raise RuntimeError(
+                            "Scheduling error: inconsistent scheduler state"
+                        )
 
-                # If the task has failed, make sure we try to run it again
-                if has_task_failed(result):
+                    sleep(max(retry_ts - time(), 0))
                     break
 
+                try:
+                    result = dequeue_with_timeout(
+                        self.result_queue,
+                        "result queue",
+                        throw=True,
+                        timeout_s=(
+                            QUEUE_TIMEOUT_SEC
+                            if retry_ts is None
+                            else max(retry_ts - time(), 0.1)
+                        ),
+                    )
+
+                    # Update our local records according to result
+                    self.update_records_from_result(result)
+                except Queue_Empty:
+                    pass
+
             # Finally, break out of the main loop if we are indeed done
-            if self.state.executed_task_count == len(tasks):
+            if self.state.get_num_settled_tasks() == len(tasks):
                 break
 
+        # Wait for the speculative copies that lost, so that they do not run
+        # into the next experiment
+        while len(self.state.speculative_copies) > 0:
+            self.update_records_from_result(
+                dequeue_with_timeout(self.result_queue, "result queue")
+            )
+
         return self.state.executed_task_info
 
     def run(
-        self, baseline: str, tasks: List[TaskObject]
-    ) -> Dict[int, ExecutedTaskInfo]:
+        self, baseline: str, tasks: Union[List[TaskObject], TaskStream]
+    ) -> ExecutionTable:
         """
         Main entrypoint to run a number of tasks scheduled by our batch
         scheduler. The required parameters are:
             - baseline: "batch", "slurm" or "granny"
-            - tasks: a list of TaskObject's
+            - tasks: a list of TaskObject's, or a stream of them
         The method returns a dictionary with timing information to be plotted
         """
         if baseline in ALLOWED_BASELINES:
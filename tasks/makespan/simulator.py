@@ -0,0 +1,430 @@
+from heapq import heapify, heappop, heappush
+from logging import getLogger
+from tasks.makespan.arrival import ArrivalDispatcher
+from tasks.makespan.data import (
+    EvictionEvent,
+    ResultQueueItem,
+    TaskObject,
+)
+from tasks.makespan.faults import FaultModel
+from tasks.makespan.placement import DEFAULT_PLACEMENT_POLICY
+from tasks.makespan.retry import DEFAULT_MAX_TASK_RETRIES
+from tasks.makespan.runtime import RuntimeEstimator, RuntimeModel
+from tasks.makespan.scheduler import (
+    NOT_ENOUGH_SLOTS,
+    BatchScheduler,
+    SchedulerState,
+)
+from tasks.makespan.stream import TaskStream, get_task_stream
+from tasks.util.makespan import (
+    GRANNY_FT_BASELINES,
+    MAKESPAN_SIM_RESULTS_DIR,
+    NATIVE_BASELINES,
+    SCHEDULING_INFO_FILE_PREFIX,
+    ResultSink,
+)
+from tasks.util.planner import get_xvm_links_from_parts
+from tasks.util.table import ExecutedTaskInfo, ExecutionTable
+from typing import Dict, List, Set, Tuple, Union
+
+"""
+Offline discrete-event simulator for the makespan experiment. It replays a
+task trace through the same scheduling logic that we use in the real
+experiments (`SchedulerState` and `BatchScheduler.schedule_task_to_vm`), but
+against a virtual clock and a modelled cluster, so that we can evaluate
+scheduling policies without a planner or a k8s cluster.
+"""
+
+sim_logger = getLogger("Simulator")
+
+# Time it takes to migrate the processes of a task out of an evicted VM
+SIM_MIGRATION_OVERHEAD_SECS = 5
+
+
+class SimulatedSchedulerState(SchedulerState):
+    """
+    Scheduler state for a modelled cluster of `num_vms` identical VMs. We do
+    not set a renderer, as rendering would dominate the simulation time
+    """
+
+    def get_vm_ips(self):
+        return ["10.0.0.{}".format(i) for i in range(self.num_vms)]
+
+    def get_vm_names(self):
+        return ["sim-vm-{}".format(i) for i in range(self.num_vms)]
+
+    def init_vm_list(self):
+        for ip, name in zip(self.get_vm_ips(), self.get_vm_names()):
+            self.vm_map[ip] = self.num_cpus_per_vm
+            self.vm_ip_to_name[ip] = name
+
+    def update_vm_list(self):
+        pass
+
+
+class SimulatedBatchScheduler(BatchScheduler):
+    """
+    Batch scheduler that executes tasks against a virtual clock. All baselines
+    use the python-side slot accounting. For Granny baselines this means that
+    we model the planner as a scheduler that packs tasks like `slurm`, and we
+    do not model migrations or elastic scale-ups
+
+    Optionally, a fault model evicts VMs as the simulation runs. Tasks in an
+    evicted VM fail and are re-started, except for the Granny FT baselines,
+    that migrate them to other VMs if there are enough free slots. Evicted
+    VMs are replaced straight away
+    """
+
+    def __init__(
+        self,
+        baseline: str,
+        num_tasks: int,
+        num_vms: int,
+        num_tasks_per_user: int,
+        trace_str: str,
+        runtime_model: RuntimeModel = None,
+        time_compression: float = 1,
+        backfill: bool = False,
+        placement: str = DEFAULT_PLACEMENT_POLICY,
+        result_sink: ResultSink = None,
+        fault_model: FaultModel = None,
+        max_task_retries: int = DEFAULT_MAX_TASK_RETRIES,
+    ):
+        self.time_compression = time_compression
+        if result_sink is None:
+            result_sink = ResultSink(
+                baseline,
+                num_vms,
+                num_tasks_per_user,
+                trace_str,
+                result_dir=MAKESPAN_SIM_RESULTS_DIR,
+            )
+        self.state = SimulatedSchedulerState(
+            baseline,
+            num_tasks,
+            num_vms,
+            num_tasks_per_user,
+            trace_str,
+            placement_policy=placement,
+            result_sink=result_sink,
+            max_task_retries=max_task_retries,
+        )
+        self.runtime_model = (
+            RuntimeModel() if runtime_model is None else runtime_model
+        )
+
+        self.estimator = RuntimeEstimator(self.runtime_model)
+        if backfill:
+            self.backfill = self.get_backfill()
+
+        # Virtual clock, in seconds since the beginning of the simulation
+        self.now = 0.0
+        # Min-heap of (end_ts, task_id, result) for the in-flight tasks
+        self.pending_results: List[Tuple[float, int, ResultQueueItem]] = []
+
+        # Upcoming evictions (if any), and what we did with the tasks in the
+        # evicted VMs
+        self.evictions = None
+        self.next_eviction: EvictionEvent = None
+        if fault_model is not None:
+            self.evictions = fault_model.iter_events(num_vms)
+            self.next_eviction = next(self.evictions, None)
+        self.num_evictions = 0
+        self.num_migrated_tasks = 0
+        self.num_failed_tasks = 0
+
+    def has_local_slot_accounting(self):
+        return True
+
+    def get_time(self):
+        return self.now
+
+    def shutdown(self):
+        pass
+
+    def write_sched_info(self, task_id, scheduling_decision):
+        """
+        Log the scheduling information in the same format as the real
+        experiments. For native baselines this is the scheduling decision,
+        and for Granny the cluster occupation as reported by the planner
+        """
+        if self.state.baseline in NATIVE_BASELINES:
+            if task_id is None:
+                return
+
+            self.state.result_sink.write_line(
+                SCHEDULING_INFO_FILE_PREFIX,
+                task_id,
+                scheduling_decision,
+            )
+        else:
+            num_idle_vms = self.state.vm_map.get_num_vms_with_free_slots(
+                self.state.num_cpus_per_vm
+            )
+            num_xvm_links = int(
+                get_xvm_links_from_parts(
+                    [
+                        [slots for _, slots in decision]
+                        for decision in self.state.in_flight_tasks.values()
+                    ]
+                ).sum()
+            )
+            self.state.result_sink.write_line(
+                SCHEDULING_INFO_FILE_PREFIX,
+                self.now,
+                num_idle_vms,
+                self.state.total_available_slots,
+                num_xvm_links,
+            )
+
+    def get_next_event_ts(self) -> float:
+        """
+        Timestamp of the next task completion or eviction, or None if there
+        are no tasks in-flight (evictions without tasks have no effect)
+        """
+        if len(self.pending_results) == 0:
+            return None
+
+        if self.next_eviction is not None:
+            return min(self.pending_results[0][0], self.next_eviction.ts)
+
+        return self.pending_results[0][0]
+
+    def advance_clock_to(self, ts: float) -> None:
+        """
+        Process all the events up to `ts`, and move the virtual clock to it
+        """
+        next_event_ts = self.get_next_event_ts()
+        while next_event_ts is not None and next_event_ts <= ts:
+            self.wait_for_next_result()
+            next_event_ts = self.get_next_event_ts()
+
+        # Skip the evictions while the cluster is empty
+        while self.next_eviction is not None and self.next_eviction.ts <= ts:
+            self.next_eviction = next(self.evictions, None)
+
+        self.now = max(self.now, ts)
+
+    def wait_for_next_result(self):
+        """
+        Advance the virtual clock to the next task completion, and update our
+        records accordingly. If a VM is evicted before then, we only process
+        the eviction
+        """
+        if len(self.pending_results) == 0:
+            raise RuntimeError(
+                "Simulation error: waiting for results with no tasks in-flight"
+            )
+
+        if (
+            self.next_eviction is not None
+            and self.next_eviction.ts < self.pending_results[0][0]
+        ):
+            self.now = max(self.now, self.next_eviction.ts)
+            self.evict_vms(self.next_eviction)
+            self.next_eviction = next(self.evictions, None)
+            return
+
+        end_ts, _, result = heappop(self.pending_results)
+        self.now = max(self.now, end_ts)
+        self.update_records_from_result(result)
+        self.write_sched_info(None, None)
+
+    def evict_vms(self, event: EvictionEvent) -> None:
+        """
+        Evict the VMs in an eviction event, and migrate or fail the tasks
+        that were running in them
+        """
+        vm_ips = self.state.get_vm_ips()
+        evicted_ips = set([vm_ips[vm_idx] for vm_idx in event.vm_idxs])
+        sim_logger.info(
+            "Evicting VMs {} at {:.2f} s".format(sorted(evicted_ips), self.now)
+        )
+        self.num_evictions += 1
+
+        evicted_task_ids = [
+            task_id
+            for task_id, decision in self.state.in_flight_tasks.items()
+            if any([ip in evicted_ips for ip, _ in decision])
+        ]
+        for task_id in sorted(evicted_task_ids):
+            if (
+                self.state.baseline in GRANNY_FT_BASELINES
+                and self.migrate_task(task_id, evicted_ips)
+            ):
+                self.num_migrated_tasks += 1
+                continue
+
+            self.fail_task(task_id)
+            self.num_failed_tasks += 1
+
+        self.write_sched_info(None, None)
+
+    def migrate_task(self, task_id: int, evicted_ips: Set[str]) -> bool:
+        """
+        Move the slots of an in-flight task in the evicted VMs to free slots
+        in other VMs. Return false if there are not enough free slots
+        """
+        scheduling_decision = self.state.in_flight_tasks[task_id]
+        num_to_migrate = sum(
+            [slots for ip, slots in scheduling_decision if ip in evicted_ips]
+        )
+        target_vms = self.state.vm_map.get_vms_covering(
+            num_to_migrate, skip_vm=lambda ip: ip in evicted_ips
+        )
+        if sum([num_free for _, num_free in target_vms]) < num_to_migrate:
+            return False
+
+        new_decision: Dict[str, int] = {}
+        for ip, slots in scheduling_decision:
+            if ip not in evicted_ips:
+                new_decision[ip] = new_decision.get(ip, 0) + slots
+        for ip, num_free in target_vms:
+            slots = min(num_free, num_to_migrate)
+            new_decision[ip] = new_decision.get(ip, 0) + slots
+            num_to_migrate -= slots
+
+        self.state.remove_in_flight_task(task_id)
+        for ip, slots in new_decision.items():
+            self.state.vm_map[ip] -= slots
+        self.state.add_in_flight_task(task_id, list(new_decision.items()))
+
+        # Migrating the task delays its completion
+        for idx, (end_ts, pending_id, result) in enumerate(
+            self.pending_results
+        ):
+            if pending_id == task_id:
+                end_ts += SIM_MIGRATION_OVERHEAD_SECS
+                result.exec_time = int(end_ts - result.start_ts)
+                result.end_ts = end_ts
+                self.pending_results[idx] = (end_ts, pending_id, result)
+        heapify(self.pending_results)
+
+        return True
+
+    def fail_task(self, task_id: int) -> None:
+        """
+        Drop the in-flight task from the pending results, and record it as
+        failed so that it runs again
+        """
+        master_ip = self.state.in_flight_tasks[task_id][0][0]
+        self.pending_results = [
+            pending
+            for pending in self.pending_results
+            if pending[1] != task_id
+        ]
+        heapify(self.pending_results)
+
+        self.update_records_from_result(
+            ResultQueueItem(task_id, -1, self.now, self.now, master_ip)
+        )
+
+    def start_task(self, task, scheduling_decision, time_in_queue_start):
+        time_in_queue = int(self.now - time_in_queue_start)
+        self.state.executed_task_info[task.task_id] = ExecutedTaskInfo(
+            task.task_id, 0, time_in_queue, 0, 0
+        )
+        self.write_sched_info(task.task_id, scheduling_decision)
+
+        if self.backfill is not None:
+            self.backfill.task_started(
+                task,
+                self.get_reserved_slots(task, scheduling_decision),
+                self.now,
+            )
+
+        exec_time = self.runtime_model.get_exec_time(task, scheduling_decision)
+        end_ts = self.now + exec_time
+        heappush(
+            self.pending_results,
+            (
+                end_ts,
+                task.task_id,
+                ResultQueueItem(
+                    task.task_id,
+                    int(exec_time),
+                    self.now,
+                    end_ts,
+                    scheduling_decision[0][0],
+                ),
+            ),
+        )
+
+    def execute_tasks(
+        self, tasks: Union[List[TaskObject], TaskStream]
+    ) -> ExecutionTable:
+        """
+        Execute a list (or a stream) of tasks in virtual time, and return
+        details on the task execution
+        """
+        tasks = get_task_stream(tasks)
+        self.start_ts = self.now
+        self.arrivals = ArrivalDispatcher(tasks, self.time_compression)
+        self.arrivals.start(self.start_ts)
+        self.state.init_task_queue(tasks)
+
+        t = self.state.get_next_task(self.now)
+        while t is not None:
+            # Process the events before the next task arrives. Re-started
+            # tasks are queued from the moment we pick them again
+            if t.task_id in self.state.executed_task_info:
+                time_in_queue_start = self.now
+            else:
+                time_in_queue_start = self.arrivals.get_arrival_ts(t)
+            self.advance_clock_to(time_in_queue_start)
+
+            scheduling_decision = self.schedule_task_to_vm(t)
+            while scheduling_decision == NOT_ENOUGH_SLOTS:
+                if self.backfill is not None:
+                    self.backfill_tasks(tasks, t, self.now)
+
+                    # If a task arrives before the next one finishes, advance
+                    # the clock to consider it for backfilling
+                    _, next_arrival_ts = self.get_backfill_candidates(
+                        tasks, t, self.now
+                    )
+                    next_event_ts = self.get_next_event_ts()
+                    if next_arrival_ts is not None and (
+                        next_event_ts is None
+                        or next_arrival_ts < next_event_ts
+                    ):
+                        self.advance_clock_to(next_arrival_ts)
+                        continue
+
+                self.wait_for_next_result()
+                scheduling_decision = self.schedule_task_to_vm(t)
+
+            self.start_task(t, scheduling_decision, time_in_queue_start)
+
+            t = self.state.get_next_task(self.now)
+
+            # Once all tasks have started, drain the in-flight tasks. If any
+            # of them fails, we go back to re-start it once its backoff
+            # expires
+            while t is None and (
+                len(self.pending_results) > 0
+                or len(self.state.retry_queue) > 0
+            ):
+                retry_ts = self.state.retry_queue.get_next_ready_ts()
+                next_event_ts = self.get_next_event_ts()
+                if next_event_ts is None or (
+                    retry_ts is not None and retry_ts <= next_event_ts
+                ):
+                    self.advance_clock_to(retry_ts)
+                else:
+                    self.wait_for_next_result()
+                t = self.state.get_next_task(self.now)
+
+        return self.state.executed_task_info
+
+    def run(
+        self, baseline: str, tasks: Union[List[TaskObject], TaskStream]
+    ) -> ExecutionTable:
+        sim_logger.info(
+            "Simulating the execution of {} {} tasks".format(
+                len(tasks), baseline
+            )
+        )
+        self.num_tasks = len(tasks)
+
+        return self.execute_tasks(tasks)
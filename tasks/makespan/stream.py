@@ -0,0 +1,150 @@
+from tasks.makespan.data import TaskObject
+from typing import Dict, Iterable, Iterator, List, Union
+
+"""
+Lazy source of the tasks in a trace. The scheduler reads tasks from the trace
+as it needs them, and forgets them once they have settled, so that a replay
+of a long trace does not need to hold the whole trace in memory.
+"""
+
+# Maximum number of tasks that we read past the head of the queue when
+# looking for tasks to backfill
+DEFAULT_TRACE_LOOKAHEAD = 1024
+
+
+class TaskStream:
+    """
+    Window over an iterator of tasks in trace order. We identify tasks by
+    their position in the trace (their index), and keep the tasks that we
+    have read and not released yet. Tasks are released once we will not run
+    them again (i.e. they finished or ran out of retries)
+    """
+
+    def __init__(
+        self,
+        task_iter: Iterable[TaskObject],
+        num_tasks: int = None,
+        lookahead: int = DEFAULT_TRACE_LOOKAHEAD,
+    ):
+        """
+        If we know the number of tasks in the trace beforehand, we do not
+        need to read it all to know the length of the stream. A lookahead of
+        None means that we may read as far ahead as we need
+        """
+        self.task_iter = iter(task_iter)
+        self.num_tasks = num_tasks
+        self.lookahead = lookahead
+
+        # Map of task indexes to the tasks we have not released yet, and map
+        # of their task ids to their index
+        self.tasks: Dict[int, TaskObject] = {}
+        self.idxs: Dict[int, int] = {}
+        # Map of task ids to their arrival time (in seconds) wrt the start of
+        # the trace
+        self.arrival_offsets: Dict[int, float] = {}
+
+        self.num_read = 0
+        self.last_arrival_offset = 0
+        self.exhausted = False
+
+    @classmethod
+    def from_list(cls, tasks: List[TaskObject]):
+        return cls(tasks, num_tasks=len(tasks), lookahead=None)
+
+    def __len__(self) -> int:
+        if self.num_tasks is None and not self.exhausted:
+            self.read_until(None)
+
+        return self.num_read if self.exhausted else self.num_tasks
+
+    def read_next(self) -> bool:
+        """
+        Read the next task from the trace. Return false if there are none
+        """
+        if self.exhausted:
+            return False
+
+        task = next(self.task_iter, None)
+        if task is None:
+            self.exhausted = True
+            return False
+
+        self.last_arrival_offset += task.inter_arrival_time
+        self.tasks[self.num_read] = task
+        self.idxs[task.task_id] = self.num_read
+        self.arrival_offsets[task.task_id] = self.last_arrival_offset
+        self.num_read += 1
+        return True
+
+    def read_until(self, idx: int) -> bool:
+        """
+        Read tasks until the one at `idx` (or until the end of the trace, if
+        `idx` is None). Return false if the trace ends before
+        """
+        while idx is None or self.num_read <= idx:
+            if not self.read_next():
+                return False
+
+        return True
+
+    def get(self, idx: int) -> TaskObject:
+        """
+        Return the task at `idx`, or None if we released it
+        """
+        if not self.read_until(idx):
+            raise RuntimeError(
+                "Task index out of range: {} (trace has {} tasks)".format(
+                    idx, self.num_read
+                )
+            )
+
+        return self.tasks.get(idx)
+
+    def get_idx(self, task_id: int) -> int:
+        return self.idxs[task_id]
+
+    def find_idx(self, task_id: int) -> int:
+        """
+        Return the index of a task, reading ahead until we find it
+        """
+        while task_id not in self.idxs:
+            if not self.read_next():
+                raise RuntimeError(
+                    "Task {} not found in trace".format(task_id)
+                )
+
+        return self.idxs[task_id]
+
+    def get_arrival_offset(self, task_id: int) -> float:
+        return self.arrival_offsets[task_id]
+
+    def iter_from(self, idx: int) -> Iterator[TaskObject]:
+        """
+        Iterate over the tasks we have not released from `idx` onwards, up
+        to the lookahead
+        """
+        end_idx = None if self.lookahead is None else idx + self.lookahead
+        while end_idx is None or idx < end_idx:
+            if not self.read_until(idx):
+                return
+
+            if idx in self.tasks:
+                yield self.tasks[idx]
+            idx += 1
+
+    def release(self, task_id: int) -> None:
+        """
+        Forget a task we will not run again
+        """
+        if task_id not in self.idxs:
+            return
+
+        del self.tasks[self.idxs.pop(task_id)]
+        del self.arrival_offsets[task_id]
+
+
+def get_task_stream(tasks: Union[List[TaskObject], TaskStream]) -> TaskStream:
+    if isinstance(tasks, TaskStream):
+        return tasks
+
+    return TaskStream.from_list(tasks)
@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+from os.path import exists
+from subprocess import run
+from tasks.makespan.journal import get_journal_file
+from tasks.makespan.wasm import upload as upload_wasm_files
+from tasks.util.env import FAABRIC_EXP_IMAGE_NAME
+from tasks.util.faasm import scale_faasm_workers
+from tasks.util.makespan import (
+    GRANNY_BASELINES,
+    MAKESPAN_FILE_PREFIX,
+    MAKESPAN_RESULTS_DIR,
+    get_result_file,
+)
+from tasks.util.openmpi import (
+    delete_native_mpi,
+    deploy_native_mpi,
+    scale_native_mpi,
+)
+from typing import List
+
+"""
+Sweeps of the makespan experiment over a matrix of baselines, cluster sizes,
+and traces. We order the points of the sweep so that we deploy each cluster
+backend once, with the largest number of VMs, and scale it down from one
+point to the next instead of re-deploying it.
+"""
+
+# Granny baselines run on a Faasm cluster, and native baselines on the
+# native OpenMPI cluster
+SWEEP_BACKEND_GRANNY = "granny"
+SWEEP_BACKEND_NATIVE = "native"
+
+
+@dataclass
+class SweepPoint:
+    """
+    One run of the makespan experiment in a sweep
+    """
+
+    baseline: str
+    num_vms: int
+    trace: str
+    num_tasks_per_user: int = None
+
+    def get_backend(self) -> str:
+        if self.baseline in GRANNY_BASELINES:
+            return SWEEP_BACKEND_GRANNY
+
+        return SWEEP_BACKEND_NATIVE
+
+    def has_results(self, result_dir=MAKESPAN_RESULTS_DIR) -> bool:
+        """
+        We record the makespan once all tasks have finished, so a point is
+        done if its makespan file has a row after the header
+        """
+        makespan_file = get_result_file(
+            MAKESPAN_FILE_PREFIX,
+            self.baseline,
+            self.num_vms,
+            self.num_tasks_per_user,
+            self.trace,
+            result_dir,
+        )
+        if not exists(makespan_file):
+            return False
+
+        with open(makespan_file, "r") as in_file:
+            return len([line for line in in_file if line.strip()]) > 1
+
+    def was_interrupted(self, result_dir=MAKESPAN_RESULTS_DIR) -> bool:
+        """
+        A point without results but with a journal died half-way, so we can
+        resume it
+        """
+        return not self.has_results(result_dir) and exists(
+            get_journal_file(
+                self.baseline,
+                self.num_vms,
+                self.num_tasks_per_user,
+                self.trace,
+                result_dir,
+            )
+        )
+
+    def __str__(self):
+        return "{} - {} VMs - {}".format(
+            self.baseline, self.num_vms, self.trace
+        )
+
+
+def get_sweep_order(points: List[SweepPoint]) -> List[SweepPoint]:
+    """
+    Group the points by backend (in the order they first appear), and run
+    them in decreasing number of VMs, so that we only ever scale the cluster
+    down. Ties keep the order of the matrix
+    """
+    backends = []
+    for point in points:
+        if point.get_backend() not in backends:
+            backends.append(point.get_backend())
+
+    return sorted(
+        points,
+        key=lambda point: (
+            backends.index(point.get_backend()),
+            -point.num_vms,
+        ),
+    )
+
+
+class SweepCluster:
+    """
+    Deployment of the cluster that a sweep runs on. We deploy each backend
+    with the largest number of VMs that its points need, scale it down
+    between points, and delete it before deploying a different backend
+    """
+
+    def __init__(self, ctx, points: List[SweepPoint]):
+        self.ctx = ctx
+        self.max_num_vms = {}
+        for point in points:
+            self.max_num_vms[point.get_backend()] = max(
+                self.max_num_vms.get(point.get_backend(), 0), point.num_vms
+            )
+
+        self.backend = None
+        self.num_vms = 0
+
+    def can_scale_to(self, point: SweepPoint) -> bool:
+        """
+        Whether we can set the cluster up for a point without re-deploying
+        it (i.e. while another run is finishing)
+        """
+        return point.get_backend() == self.backend
+
+    def set_up(self, point: SweepPoint) -> None:
+        if point.get_backend() != self.backend:
+            self.tear_down()
+            self.deploy(point.get_backend())
+
+        if point.num_vms != self.num_vms:
+            self.scale(point.num_vms)
+
+    def deploy(self, backend: str) -> None:
+        num_vms = self.max_num_vms[backend]
+        print("Deploying {} cluster with {} VMs".format(backend, num_vms))
+
+        if backend == SWEEP_BACKEND_GRANNY:
+            run(
+                "faasmctl deploy.k8s --workers={}".format(num_vms),
+                shell=True,
+                check=True,
+            )
+            upload_wasm_files(self.ctx)
+        else:
+            deploy_native_mpi("makespan", FAABRIC_EXP_IMAGE_NAME, num_vms)
+
+        self.backend = backend
+        self.num_vms = num_vms
+
+    def scale(self, num_vms: int) -> None:
+        print(
+            "Scaling {} cluster from {} to {} VMs".format(
+                self.backend, self.num_vms, num_vms
+            )
+        )
+
+        if self.backend == SWEEP_BACKEND_GRANNY:
+            scale_faasm_workers(num_vms)
+        else:
+            scale_native_mpi("makespan", num_vms)
+
+        self.num_vms = num_vms
+
+    def tear_down(self) -> None:
+        if self.backend is None:
+            return
+
+        print("Deleting {} cluster".format(self.backend))
+        if self.backend == SWEEP_BACKEND_GRANNY:
+            run("faasmctl delete", shell=True, check=True)
+        else:
+            delete_native_mpi("makespan", FAABRIC_EXP_IMAGE_NAME, self.num_vms)
+
+        self.backend = None
+        self.num_vms = 0
@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+from gzip import open as gzip_open
+from math import ceil, floor
+from os import makedirs, remove, replace
+from os.path import exists
+from tasks.makespan.tracegen import get_possible_sizes, get_workload_apps
+from tasks.util.trace import (
+    MAKESPAN_TRACES_DIR,
+    TRACE_CSV_HEADER,
+    TRACE_WRITE_CHUNK_SIZE,
+    get_trace_file,
+)
+from typing import Dict, Iterator
+
+"""
+Importer of job logs in the Standard Workload Format (SWF) of the Parallel
+Workloads Archive. We read the log one line at a time, and write each job
+that falls in the time window as a task of one of our workloads, so that we
+can import logs of any size in constant memory.
+"""
+
+# Fields of a job line in an SWF log (zero-indexed). Missing values are -1
+SWF_JOB_ID = 0
+SWF_SUBMIT_TIME = 1
+SWF_RUN_TIME = 3
+SWF_ALLOCATED_PROCS = 4
+SWF_REQUESTED_PROCS = 7
+SWF_STATUS = 10
+SWF_NUM_FIELDS = 18
+
+# Jobs with this status were cancelled before they started
+SWF_STATUS_CANCELLED = 5
+
+
+@dataclass
+class SwfJob:
+    """
+    The fields of an SWF job that we use. Times are in seconds, and submit
+    times are wrt the start of the log
+    """
+
+    job_id: int
+    submit_time: float
+    run_time: float
+    num_procs: int
+
+
+def open_swf_file(swf_file):
+    """
+    The archive distributes the logs compressed, so we also read them as-is
+    """
+    if swf_file.endswith(".gz"):
+        return gzip_open(swf_file, "rt")
+
+    return open(swf_file, "r")
+
+
+def read_swf_header(swf_file) -> Dict[str, str]:
+    """
+    Read the `; Key: Value` lines at the beginning of an SWF log
+    """
+    header = {}
+    with open_swf_file(swf_file) as in_file:
+        for line in in_file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if not line.startswith(";"):
+                break
+
+            key, sep, value = line[1:].partition(":")
+            if sep != "" and len(key.strip()) > 0:
+                header[key.strip()] = value.strip()
+
+    return header
+
+
+def get_swf_cpus_per_node(header: Dict[str, str]) -> int:
+    """
+    Number of CPUs per node in the machine the log comes from, if the header
+    tells us both the number of processors and of nodes
+    """
+    if "MaxProcs" not in header or "MaxNodes" not in header:
+        return None
+
+    max_procs = int(header["MaxProcs"])
+    max_nodes = int(header["MaxNodes"])
+    if max_procs <= 0 or max_nodes <= 0:
+        return None
+
+    return max(max_procs // max_nodes, 1)
+
+
+def iter_swf_jobs(swf_file) -> Iterator[SwfJob]:
+    """
+    Iterate over the jobs in an SWF log that ran, in log order. We take the
+    number of allocated processors, and fall back to the requested ones
+    """
+    with open_swf_file(swf_file) as in_file:
+        for line in in_file:
+            line = line.strip()
+            if len(line) == 0 or line.startswith(";"):
+                continue
+
+            fields = line.split()
+            if len(fields) < SWF_NUM_FIELDS:
+                raise RuntimeError("Malformed SWF line: {}".format(line))
+
+            num_procs = int(float(fields[SWF_ALLOCATED_PROCS]))
+            if num_procs <= 0:
+                num_procs = int(float(fields[SWF_REQUESTED_PROCS]))
+            if (
+                num_procs <= 0
+                or int(fields[SWF_STATUS]) == SWF_STATUS_CANCELLED
+            ):
+                continue
+
+            yield SwfJob(
+                int(fields[SWF_JOB_ID]),
+                float(fields[SWF_SUBMIT_TIME]),
+                float(fields[SWF_RUN_TIME]),
+                num_procs,
+            )
+
+
+def get_task_size(
+    num_procs: int, src_cpus_per_node: int, num_cores_per_vm: int
+) -> int:
+    """
+    Rescale the size of a job so that it spans the same number of VMs as it
+    spanned nodes in the original machine
+    """
+    return ceil(num_procs * num_cores_per_vm / src_cpus_per_node)
+
+
+def import_swf_trace(
+    swf_file,
+    workload: str,
+    num_cores_per_vm: int,
+    src_cpus_per_node: int = None,
+    time_compression: float = 1,
+    start_secs: float = 0,
+    end_secs: float = None,
+    max_tasks: int = None,
+    overwrite: bool = False,
+) -> str:
+    """
+    Import the jobs in an SWF log submitted in `[start_secs, end_secs)`
+    (wrt the start of the log) as a trace of the given workload, and return
+    the trace file. Arrival times are wrt the start of the window, and
+    divided by the time compression factor. We do not replace an existing
+    trace with the same number of tasks unless `overwrite` is set
+    """
+    if time_compression <= 0:
+        raise RuntimeError(
+            "Time compression factor must be positive: {}".format(
+                time_compression
+            )
+        )
+
+    if src_cpus_per_node is None:
+        src_cpus_per_node = get_swf_cpus_per_node(read_swf_header(swf_file))
+    if src_cpus_per_node is None:
+        print(
+            "SWF log does not say how many CPUs each node has, please set "
+            "the source CPUs per node"
+        )
+        raise RuntimeError("Unknown CPUs per node in SWF log")
+
+    # All our workloads have a single app for now
+    app = get_workload_apps(workload)[0]
+    possible_sizes = get_possible_sizes(workload, app, num_cores_per_vm)
+    min_size = int(possible_sizes.min())
+    max_size = int(possible_sizes.max())
+
+    # We do not know the number of tasks (which is part of the trace file
+    # name) until the end, so we write to a temporary file first
+    makedirs(MAKESPAN_TRACES_DIR, exist_ok=True)
+    tmp_file = "{}.tmp".format(
+        get_trace_file(workload, "swf", num_cores_per_vm)
+    )
+    num_tasks = 0
+    num_clipped = 0
+    last_arrival_secs = 0
+    with open(tmp_file, "w") as out_file:
+        out_file.write(TRACE_CSV_HEADER)
+        rows = []
+        for job in iter_swf_jobs(swf_file):
+            if job.submit_time < start_secs:
+                continue
+            # Jobs in the log are sorted by submit time, so we can stop
+            # reading at the end of the window
+            if end_secs is not None and job.submit_time >= end_secs:
+                break
+
+            # Jobs that do not fit the sizes our apps take are clipped
+            size = get_task_size(
+                job.num_procs, src_cpus_per_node, num_cores_per_vm
+            )
+            if size < min_size or size > max_size:
+                size = min(max(size, min_size), max_size)
+                num_clipped += 1
+
+            # As in our synthetic traces, we round arrival times down to the
+            # second before taking the differences, and the first task
+            # arrives at the start. Jobs slightly out of order in the log
+            # arrive together with the previous one
+            arrival_secs = max(
+                floor((job.submit_time - start_secs) / time_compression),
+                last_arrival_secs,
+            )
+            inter_arrival_time = (
+                0 if num_tasks == 0 else arrival_secs - last_arrival_secs
+            )
+            last_arrival_secs = arrival_secs
+
+            rows.append(
+                "{},{},{},{}\n".format(
+                    num_tasks, app, size, inter_arrival_time
+                )
+            )
+            num_tasks += 1
+            if len(rows) == TRACE_WRITE_CHUNK_SIZE:
+                out_file.write("".join(rows))
+                rows = []
+
+            if num_tasks == max_tasks:
+                break
+
+        out_file.write("".join(rows))
+
+    if num_tasks == 0:
+        remove(tmp_file)
+        raise RuntimeError("No jobs in the SWF log within the time window")
+
+    # Traces are named after their number of tasks, so the imported one may
+    # clash with a synthetic trace, or with a previous import
+    task_file = get_trace_file(workload, num_tasks, num_cores_per_vm)
+    bin_file = get_trace_file(
+        workload, num_tasks, num_cores_per_vm, binary=True
+    )
+    if not overwrite and (exists(task_file) or exists(bin_file)):
+        remove(tmp_file)
+        print(
+            "There is already a {} trace with {} tasks: {} (pass "
+            "--overwrite to replace it, or --max-tasks to import a "
+            "different number of jobs)".format(workload, num_tasks, task_file)
+        )
+        raise RuntimeError("Trace file already exists")
+
+    # A binary trace with the same name would be out of date
+    if exists(bin_file):
+        remove(bin_file)
+    replace(tmp_file, task_file)
+
+    print(
+        "Imported {} jobs from {} ({} clipped to sizes in [{}, {}])".format(
+            num_tasks, swf_file, num_clipped, min_size, max_size
+        )
+    )
+    return task_file
@@ -1,78 +1,159 @@
+from glob import glob
 from invoke import task
-from numpy import arange
-from numpy.random import default_rng
-from random import uniform
-from tasks.makespan.data import TaskObject
-from tasks.util.makespan import MPI_WORKLOADS
-from tasks.util.trace import dump_task_trace_to_file
-from typing import List
+from os.path import join
+from tasks.makespan.swf import import_swf_trace
+from tasks.makespan.tracegen import (
+    DEFAULT_ARRIVAL_PROCESS,
+    DEFAULT_SIZE_DISTRIBUTION,
+    DEFAULT_TRACE_SEED,
+    generate_task_trace_arrays,
+)
+from tasks.util.trace import (
+    MAKESPAN_TRACES_DIR,
+    convert_trace_binary_to_csv,
+    convert_trace_csv_to_binary,
+    dump_task_trace_columns_to_file,
+)
 
 
 @task()
-def generate(ctx, workload, num_tasks, num_cores_per_vm=8, lmbd="0.1"):
+def generate(
+    ctx,
+    workload,
+    num_tasks,
+    num_cores_per_vm=8,
+    lmbd="0.1",
+    arrivals=DEFAULT_ARRIVAL_PROCESS,
+    size_dist=DEFAULT_SIZE_DISTRIBUTION,
+    num_users=1,
+    seed=DEFAULT_TRACE_SEED,
+    num_procs=1,
+):
     """
     A trace is a set of tasks where each task is identified by:
-    - An arrival time sampled from a Poisson distribution with parameter lambda
+    - An arrival time sampled from an arrival process with mean rate lambda
     - A size (from half a VM to two VMs)
     - A user (from a set of users)
 
     Instead of arrival times, we use inter-arrival times, so in the trace we
     record the time it takes for the task to be arrive wrt the previous task.
-    We use that if arrival times are a Possion(lambda), then inter-arrival
-    times are an exponential with parameter 1/lambda.
+
+    Run: `inv makespan.trace.generate --workload <workload> --num-tasks <n>`
+
+    Pick the arrival process with `--arrivals` (poisson, mmpp, or diurnal),
+    and the size distribution with `--size-dist` (uniform, pow2, or small).
+    With `--num-users`, each user submits its share of the tasks as an
+    independent stream, with a contiguous block of task ids, and
+    `--num-procs` generates users in parallel. Runs need the same
+    `--num-users` to tell the users apart
     """
     num_tasks = int(num_tasks)
     num_cores_per_vm = int(num_cores_per_vm)
-    lmbd = float(lmbd)
-
-    # Work out the possible number of cores per VM
-    # possible_mpi_sizes = arange(2, int(num_cores_per_vm * 2))
-    if workload == "mpi-evict" or workload == "mpi-spot":
-        possible_mpi_sizes = arange(4, int(num_cores_per_vm * 2))
-    else:
-        possible_mpi_sizes = arange(2, int(num_cores_per_vm * 2))
-    possible_omp_sizes = arange(1, num_cores_per_vm)
 
     # The lambda parameter regulates how frequently new tasks arrive. If we
     # make lambda smaller, then tasks will be more far apart. Formally, the
     # lambda parameter is the inverse of the expected inter-arrival time
     # lmbd = 0.1 is fine for 4 VMs w/ 4 cores per VM
-    exp_mean = 1 / lmbd
-    rng = default_rng()
-    inter_arrival_times = [
-        int(i) for i in rng.exponential(exp_mean, int(num_tasks) - 1)
-    ]
-    inter_arrival_times.insert(0, 0)
-
-    # Work out the possible different workloads
-    if workload == "mpi-locality":
-        possible_workloads = ["mpi-locality"]
-    elif workload == "mpi-evict":
-        possible_workloads = ["mpi-migrate"]
-    elif workload == "mpi-spot":
-        possible_workloads = ["mpi-migrate"]
-    elif workload == "omp-elastic":
-        possible_workloads = ["omp"]
+    task_ids, apps, sizes, inter_arrival_times = generate_task_trace_arrays(
+        workload,
+        num_tasks,
+        num_cores_per_vm,
+        arrivals=arrivals,
+        rate=float(lmbd),
+        size_dist=size_dist,
+        num_users=int(num_users),
+        seed=int(seed),
+        num_procs=int(num_procs),
+    )
+
+    dump_task_trace_columns_to_file(
+        task_ids,
+        apps,
+        sizes,
+        inter_arrival_times,
+        workload,
+        num_tasks,
+        num_cores_per_vm,
+    )
+
+
+@task()
+def import_swf(
+    ctx,
+    swf_file,
+    workload,
+    num_cores_per_vm=8,
+    src_cpus_per_node=None,
+    time_compression="1",
+    start_secs="0",
+    end_secs=None,
+    max_tasks=None,
+    overwrite=False,
+):
+    """
+    Import a job log in the Standard Workload Format (SWF), e.g. from the
+    Parallel Workloads Archive, as a trace of one of our workloads
+
+    Run: `inv makespan.trace.import-swf --swf-file <log> --workload <workload>`
+
+    Job sizes are rescaled so that jobs span as many VMs (of
+    `--num-cores-per-vm` cores) as they spanned nodes in the original
+    machine. Only jobs submitted between `--start-secs` and `--end-secs`
+    (wrt the start of the log) are imported, and their arrival times are
+    divided by `--time-compression`. The trace is named after the number
+    of imported jobs, and we refuse to replace an existing trace with the
+    same name unless `--overwrite` is set
+    """
+    import_swf_trace(
+        swf_file,
+        workload,
+        int(num_cores_per_vm),
+        src_cpus_per_node=(
+            None if src_cpus_per_node is None else int(src_cpus_per_node)
+        ),
+        time_compression=float(time_compression),
+        start_secs=float(start_secs),
+        end_secs=None if end_secs is None else float(end_secs),
+        max_tasks=None if max_tasks is None else int(max_tasks),
+        overwrite=overwrite,
+    )
+
+
+@task()
+def to_binary(ctx, trace_file=None):
+    """
+    Convert a CSV trace (or all of them) to our binary format
+
+    Run: `inv makespan.trace.to-binary [--trace-file <path to CSV>]`
+    """
+    if trace_file is None:
+        trace_files = sorted(glob(join(MAKESPAN_TRACES_DIR, "trace_*.csv")))
     else:
-        raise RuntimeError("Unrecognised workload: {}".format(workload))
-
-    # Generate the random task trace
-    task_trace: List[TaskObject] = []
-    num_pos_wl = len(possible_workloads)
-    for idx in range(num_tasks):
-        wl_idx = int(uniform(0, num_pos_wl))
-        if possible_workloads[wl_idx] in MPI_WORKLOADS:
-            possible_sizes = possible_mpi_sizes
-        elif possible_workloads[wl_idx] == "omp":
-            possible_sizes = possible_omp_sizes
-        ws_idx = int(uniform(0, len(possible_sizes)))
-        task_trace.append(
-            TaskObject(
-                idx,
-                possible_workloads[wl_idx],
-                possible_sizes[ws_idx],
-                inter_arrival_times[idx],
+        trace_files = [trace_file]
+
+    for csv_file in trace_files:
+        print(
+            "Written binary trace to {}".format(
+                convert_trace_csv_to_binary(csv_file)
             )
         )
 
-    dump_task_trace_to_file(task_trace, workload, num_tasks, num_cores_per_vm)
+
+@task()
+def to_csv(ctx, trace_file=None):
+    """
+    Convert a binary trace (or all of them) back to CSV
+
+    Run: `inv makespan.trace.to-csv [--trace-file <path to binary trace>]`
+    """
+    if trace_file is None:
+        trace_files = sorted(glob(join(MAKESPAN_TRACES_DIR, "trace_*.bin")))
+    else:
+        trace_files = [trace_file]
+
+    for bin_file in trace_files:
+        print(
+            "Written CSV trace to {}".format(
+                convert_trace_binary_to_csv(bin_file)
+            )
+        )
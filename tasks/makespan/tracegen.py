@@ -0,0 +1,391 @@
+from multiprocessing import Pool
+from numpy import (
+    arange,
+    argsort,
+    array,
+    concatenate,
+    cos,
+    cumsum,
+    diff,
+    empty,
+    floor,
+    int64,
+    ndarray,
+    pi,
+    repeat,
+    sort,
+)
+from numpy.random import Generator, SeedSequence, default_rng
+from tasks.util.makespan import OPENMP_WORKLOADS
+from typing import List, Tuple
+
+"""
+Seeded generator of synthetic task traces. Each user submits tasks following
+an arrival process (Poisson, bursty MMPP, or diurnal), and draws the size of
+each task from a size distribution. We generate all the tasks of a user at
+once with NumPy, possibly generating different users in different processes,
+and merge the users by arrival time. Each user owns a contiguous block of
+task ids, which is how the scheduler tells users apart.
+"""
+
+# Seed we use unless told otherwise, so that traces are reproducible
+DEFAULT_TRACE_SEED = 0
+
+# Default mean arrival rate (in tasks per second) of the whole trace
+DEFAULT_ARRIVAL_RATE = 0.1
+
+# MMPP defaults: the arrival rate in a burst is ten times the rate out of
+# one, we spend 10% of the time in bursts, and bursts last for five minutes
+# on average
+DEFAULT_MMPP_BURST_FACTOR = 10
+DEFAULT_MMPP_BURST_FRACTION = 0.1
+DEFAULT_MMPP_MEAN_BURST_SECS = 300
+
+# Diurnal defaults: a daily cycle where the arrival rate swings between 50%
+# and 150% of the mean
+DEFAULT_DIURNAL_PERIOD_SECS = 24 * 3600
+DEFAULT_DIURNAL_AMPLITUDE = 0.5
+
+# When thinning arrivals, we generate candidates in batches of (at least)
+# this size
+ARRIVAL_BATCH_SIZE = 1 << 16
+
+
+class ArrivalProcess:
+    """
+    Base class for arrival processes. Subclasses return the arrival times of
+    the first `num_tasks` tasks, in seconds, in increasing order
+    """
+
+    name: str = ""
+
+    def __init__(self, rate: float = DEFAULT_ARRIVAL_RATE):
+        if rate <= 0:
+            raise RuntimeError(
+                "Arrival rate must be positive: {}".format(rate)
+            )
+
+        self.rate = rate
+
+    def get_arrival_times(self, rng: Generator, num_tasks: int) -> ndarray:
+        raise NotImplementedError
+
+
+class PoissonArrivals(ArrivalProcess):
+    """
+    Exponential inter-arrival times with mean `1 / rate`. This is the
+    original trace generator
+    """
+
+    name = "poisson"
+
+    def get_arrival_times(self, rng, num_tasks):
+        return cumsum(rng.exponential(1 / self.rate, num_tasks))
+
+
+class MmppArrivals(ArrivalProcess):
+    """
+    Two-state Markov-modulated Poisson process. We alternate between a quiet
+    and a burst state, with exponential sojourn times, and arrivals are a
+    Poisson process whose rate depends on the state. The rates are such that
+    the mean rate is `rate`
+    """
+
+    name = "mmpp"
+
+    def __init__(
+        self,
+        rate=DEFAULT_ARRIVAL_RATE,
+        burst_factor=DEFAULT_MMPP_BURST_FACTOR,
+        burst_fraction=DEFAULT_MMPP_BURST_FRACTION,
+        mean_burst_secs=DEFAULT_MMPP_MEAN_BURST_SECS,
+    ):
+        super().__init__(rate)
+        if burst_fraction <= 0 or burst_fraction >= 1:
+            raise RuntimeError(
+                "Burst fraction must be in (0, 1): {}".format(burst_fraction)
+            )
+
+        self.quiet_rate = rate / (
+            1 - burst_fraction + burst_fraction * burst_factor
+        )
+        self.burst_rate = burst_factor * self.quiet_rate
+        self.mean_burst_secs = mean_burst_secs
+        self.mean_quiet_secs = (
+            mean_burst_secs * (1 - burst_fraction) / burst_fraction
+        )
+
+    def get_arrival_times(self, rng, num_tasks):
+        arrivals = []
+        num_arrivals = 0
+        start_ts = 0.0
+        while num_arrivals < num_tasks:
+            # Alternating quiet and burst periods, starting with a quiet one.
+            # We generate 20% more cycles than we expect to need
+            num_periods = 2 * (
+                int(
+                    1.2
+                    * (num_tasks - num_arrivals)
+                    / (
+                        self.rate
+                        * (self.mean_quiet_secs + self.mean_burst_secs)
+                    )
+                )
+                + 1
+            )
+            mean_secs = array([self.mean_quiet_secs, self.mean_burst_secs])
+            rates = array([self.quiet_rate, self.burst_rate])
+            durations = rng.exponential(mean_secs[arange(num_periods) % 2])
+            period_ends = start_ts + cumsum(durations)
+
+            # Given the number of arrivals in a period, their times are
+            # uniform in it
+            counts = rng.poisson(rates[arange(num_periods) % 2] * durations)
+            period_starts = repeat(period_ends - durations, counts)
+            arrivals.append(
+                period_starts
+                + rng.random(counts.sum()) * repeat(durations, counts)
+            )
+            num_arrivals += counts.sum()
+            start_ts = period_ends[-1]
+
+        return sort(concatenate(arrivals))[:num_tasks]
+
+
+class DiurnalArrivals(ArrivalProcess):
+    """
+    Poisson process whose rate follows a daily cycle,
+    `rate * (1 - amplitude * cos(2 pi t / period))`, so that the trace
+    starts at the quietest time of the day. We sample it by thinning a
+    Poisson process at the peak rate
+    """
+
+    name = "diurnal"
+
+    def __init__(
+        self,
+        rate=DEFAULT_ARRIVAL_RATE,
+        period_secs=DEFAULT_DIURNAL_PERIOD_SECS,
+        amplitude=DEFAULT_DIURNAL_AMPLITUDE,
+    ):
+        super().__init__(rate)
+        if amplitude < 0 or amplitude > 1:
+            raise RuntimeError(
+                "Diurnal amplitude must be in [0, 1]: {}".format(amplitude)
+            )
+
+        self.period_secs = period_secs
+        self.amplitude = amplitude
+
+    def get_arrival_times(self, rng, num_tasks):
+        peak_rate = self.rate * (1 + self.amplitude)
+        arrivals = []
+        num_arrivals = 0
+        start_ts = 0.0
+        while num_arrivals < num_tasks:
+            num_candidates = max(
+                int(1.2 * (num_tasks - num_arrivals) * (1 + self.amplitude)),
+                ARRIVAL_BATCH_SIZE,
+            )
+            candidates = start_ts + cumsum(
+                rng.exponential(1 / peak_rate, num_candidates)
+            )
+            accept_prob = (
+                1
+                - self.amplitude * cos(2 * pi * candidates / self.period_secs)
+            ) / (1 + self.amplitude)
+            accepted = candidates[rng.random(num_candidates) < accept_prob]
+            arrivals.append(accepted)
+            num_arrivals += len(accepted)
+            start_ts = candidates[-1]
+
+        return concatenate(arrivals)[:num_tasks]
+
+
+# Registry of the available arrival processes, indexed by name
+ARRIVAL_PROCESSES = {
+    process.name: process
+    for process in [PoissonArrivals, MmppArrivals, DiurnalArrivals]
+}
+ALLOWED_ARRIVAL_PROCESSES = list(ARRIVAL_PROCESSES.keys())
+DEFAULT_ARRIVAL_PROCESS = PoissonArrivals.name
+
+
+def get_arrival_process(name: str, rate: float) -> ArrivalProcess:
+    if name not in ARRIVAL_PROCESSES:
+        print(
+            "Unrecognised arrival process: {} - Must be one in: {}".format(
+                name, ALLOWED_ARRIVAL_PROCESSES
+            )
+        )
+        raise RuntimeError("Unrecognised arrival process!")
+
+    return ARRIVAL_PROCESSES[name](rate=rate)
+
+
+# ------------------
+# Size distributions
+# ------------------
+
+
+def sample_uniform_sizes(rng: Generator, sizes: ndarray, num: int) -> ndarray:
+    """
+    All sizes are equally likely. This is the original trace generator
+    """
+    return sizes[rng.integers(0, len(sizes), num)]
+
+
+def sample_pow2_sizes(rng: Generator, sizes: ndarray, num: int) -> ndarray:
+    """
+    Only powers of two, all equally likely, as is common in HPC job logs
+    """
+    pow2_sizes = sizes[(sizes & (sizes - 1)) == 0]
+    return pow2_sizes[rng.integers(0, len(pow2_sizes), num)]
+
+
+def sample_small_sizes(rng: Generator, sizes: ndarray, num: int) -> ndarray:
+    """
+    The probability of a size is inversely proportional to it, so that small
+    tasks are the majority
+    """
+    probs = 1 / sizes
+    return rng.choice(sizes, num, p=probs / probs.sum())
+
+
+SIZE_DISTRIBUTIONS = {
+    "uniform": sample_uniform_sizes,
+    "pow2": sample_pow2_sizes,
+    "small": sample_small_sizes,
+}
+ALLOWED_SIZE_DISTRIBUTIONS = list(SIZE_DISTRIBUTIONS.keys())
+DEFAULT_SIZE_DISTRIBUTION = "uniform"
+
+
+# -----------------
+# Trace generation
+# -----------------
+
+
+def get_workload_apps(workload: str) -> List[str]:
+    if workload == "mpi-locality":
+        return ["mpi-locality"]
+    elif workload == "mpi-evict":
+        return ["mpi-migrate"]
+    elif workload == "mpi-spot":
+        return ["mpi-migrate"]
+    elif workload == "omp-elastic":
+        return ["omp"]
+
+    raise RuntimeError("Unrecognised workload: {}".format(workload))
+
+
+def get_possible_sizes(workload: str, app: str, num_cores_per_vm: int):
+    """
+    OpenMP tasks take from one core to a VM, and MPI tasks from two cores
+    (four for the eviction workloads) to two VMs
+    """
+    if app in OPENMP_WORKLOADS:
+        return arange(1, num_cores_per_vm)
+
+    if workload == "mpi-evict" or workload == "mpi-spot":
+        return arange(4, 2 * num_cores_per_vm)
+
+    return arange(2, 2 * num_cores_per_vm)
+
+
+def generate_user_tasks(
+    workload: str,
+    num_tasks: int,
+    num_cores_per_vm: int,
+    arrival_process: ArrivalProcess,
+    size_dist: str,
+    seed: SeedSequence,
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    Generate the tasks of one user, and return their arrival times, the
+    index of their app (in the workload's apps), and their sizes
+    """
+    rng = default_rng(seed)
+    arrival_times = arrival_process.get_arrival_times(rng, num_tasks)
+
+    apps = get_workload_apps(workload)
+    app_idxs = rng.integers(0, len(apps), num_tasks)
+    sizes = empty(num_tasks, dtype=int64)
+    for app_idx, app in enumerate(apps):
+        mask = app_idxs == app_idx
+        sizes[mask] = SIZE_DISTRIBUTIONS[size_dist](
+            rng,
+            get_possible_sizes(workload, app, num_cores_per_vm),
+            int(mask.sum()),
+        )
+
+    return arrival_times, app_idxs, sizes
+
+
+def generate_task_trace_arrays(
+    workload: str,
+    num_tasks: int,
+    num_cores_per_vm: int,
+    arrivals: str = DEFAULT_ARRIVAL_PROCESS,
+    rate: float = DEFAULT_ARRIVAL_RATE,
+    size_dist: str = DEFAULT_SIZE_DISTRIBUTION,
+    num_users: int = 1,
+    seed: int = DEFAULT_TRACE_SEED,
+    num_procs: int = 1,
+) -> Tuple[ndarray, ndarray, ndarray, ndarray]:
+    """
+    Generate a trace as four columns: task ids, apps, sizes, and integer
+    inter-arrival times (in seconds), with the tasks in arrival order. Each
+    user gets an equal share of the tasks and of the arrival rate, and an
+    independent random stream. As the scheduler maps blocks of
+    `num_tasks // num_users` task ids to each user, user `i` gets the ids
+    in the `i`-th block (and the last user the remaining tasks)
+    """
+    if size_dist not in SIZE_DISTRIBUTIONS:
+        print(
+            "Unrecognised size distribution: {} - Must be one in: {}".format(
+                size_dist, ALLOWED_SIZE_DISTRIBUTIONS
+            )
+        )
+        raise RuntimeError("Unrecognised size distribution!")
+
+    arrival_process = get_arrival_process(arrivals, rate / num_users)
+    user_seeds = SeedSequence(seed).spawn(num_users)
+    user_num_tasks = [num_tasks // num_users] * num_users
+    user_num_tasks[-1] += num_tasks % num_users
+    user_args = [
+        (
+            workload,
+            user_num_tasks[user],
+            num_cores_per_vm,
+            arrival_process,
+            size_dist,
+            user_seeds[user],
+        )
+        for user in range(num_users)
+    ]
+    if num_procs > 1 and num_users > 1:
+        with Pool(min(num_procs, num_users)) as pool:
+            user_tasks = pool.starmap(generate_user_tasks, user_args)
+    else:
+        user_tasks = [generate_user_tasks(*args) for args in user_args]
+
+    arrival_times = concatenate([tasks[0] for tasks in user_tasks])
+    order = argsort(arrival_times, kind="stable")
+
+    # We concatenate the users in order, so the position of a task in the
+    # concatenation is its id, and we sort the ids by arrival time
+    task_ids = order.astype(int64)
+
+    # We round arrival times down to the second, and only then take the
+    # differences, so that the rounding errors do not add up
+    arrival_secs = floor(arrival_times[order]).astype(int64)
+    inter_arrival_times = diff(arrival_secs, prepend=0)
+    inter_arrival_times[0] = 0
+
+    apps = array(get_workload_apps(workload))[
+        concatenate([tasks[1] for tasks in user_tasks])[order]
+    ]
+    sizes = concatenate([tasks[2] for tasks in user_tasks])[order]
+
+    return task_ids, apps, sizes, inter_arrival_times
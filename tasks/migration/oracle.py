@@ -24,6 +24,10 @@ from tasks.util.lammps import (
     get_lammps_data_file,
     get_lammps_migration_params,
 )
+from tasks.util.planner import (
+    get_xvm_links_from_part,
+    get_xvm_links_from_parts,
+)
 from tasks.util.plot import save_plot
 from time import sleep
 
@@ -37,23 +41,6 @@ def partition(number):
     return answer
 
 
-def calculate_cross_vm_links(part):
-    """
-    Calculate the number of cross-VM links for a given partition
-
-    The number of cross-VM links is the sum for each process of all the
-    non-local processes divided by two.
-    """
-    if len(part) == 1:
-        return 0
-
-    count = 0
-    for ind in range(len(part)):
-        count += sum(part[0:ind] + part[ind + 1 :]) * part[ind]
-
-    return int(count / 2)
-
-
 @task()
 def run(ctx, workload="very-network", nprocs=None):
     """
@@ -96,10 +83,7 @@ def run(ctx, workload="very-network", nprocs=None):
             part for part in partitions if max(part) <= num_cpus_per_vm
         ]
         if len(partitions) > max_num_partitions:
-            links = [
-                (ind, calculate_cross_vm_links(p))
-                for ind, p in enumerate(partitions)
-            ]
+            links = list(enumerate(get_xvm_links_from_parts(partitions)))
             links = sorted(links, key=lambda x: x[1])
             sampled_links = (
                 [links[0]]
@@ -148,7 +132,7 @@ def run(ctx, workload="very-network", nprocs=None):
             }
 
             # Calculate number of cross-vm links
-            cross_vm_links = calculate_cross_vm_links(part)
+            cross_vm_links = get_xvm_links_from_part(part)
 
             # Invoke with or without pre-loading
             result_json = post_async_msg_and_get_result_json(
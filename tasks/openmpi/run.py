@@ -17,7 +17,7 @@ from tasks.util.lammps import (
     get_lammps_migration_params,
 )
 from tasks.util.openmpi import OPENMPI_RESULTS_DIR
-from tasks.util.planner import get_xvm_links_from_part
+from tasks.util.planner import get_xvm_links_from_parts
 from time import sleep, time
 
 # Parameters tuning the experiment runs
@@ -118,10 +118,7 @@ def generate_partitions(ctx, max_num_partitions=5):
         ]
         partitions = [part for part in partitions if len(part) <= num_vms]
         if len(partitions) > max_num_partitions:
-            links = [
-                (ind, get_xvm_links_from_part(p))
-                for ind, p in enumerate(partitions)
-            ]
+            links = list(enumerate(get_xvm_links_from_parts(partitions)))
             links = sorted(links, key=lambda x: x[1])
             sampled_links = (
                 [links[0]]
@@ -199,7 +196,8 @@ def do_run(native):
 
     # A partition is a comma separated list of procs-to-host mapping
     conf = EXP_CONFIG["conf2"]
-    for part in partitions:
+    xvm_links = get_xvm_links_from_parts(partitions)
+    for part, part_xvm_links in zip(partitions, xvm_links):
         print(
             "Running LAMMPS ({}) with {} MPI procs (data file: {},"
             " params: {}, part: {}, xvm: {})".format(
@@ -208,7 +206,7 @@ def do_run(native):
                 conf["data_file"],
                 ",".join([str(itm) for itm in conf["lammps_params"].values()]),
                 part,
-                get_xvm_links_from_part(part),
+                part_xvm_links,
             )
         )
 
@@ -216,9 +214,7 @@ def do_run(native):
             actual_time = run_native(part, conf)
         else:
             actual_time = run_wasm(part, conf)
-        write_csv_line(
-            csv_name, part, get_xvm_links_from_part(part), actual_time
-        )
+        write_csv_line(csv_name, part, part_xvm_links, actual_time)
 
 
 def run_wasm(part, config):
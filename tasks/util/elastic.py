@@ -165,9 +165,8 @@ def read_elastic_results(num_vms, num_tasks, num_cpus_per_vm):
             # Second, for each ts subtract the size of each task in-flight
             for ts in result_dict[baseline]["tasks_per_ts"]:
                 for t in result_dict[baseline]["tasks_per_ts"][ts]:
-                    result_dict[baseline]["ts_vcpus"][ts] -= task_trace[
-                        int(t)
-                    ].size
+                    task = task_trace.get_task(int(t))
+                    result_dict[baseline]["ts_vcpus"][ts] -= task.size
 
             # Third, express the results as percentages, and the number of
             # idle VMs as a number (not as a set)
@@ -1,9 +1,29 @@
+from asyncio import sleep as async_sleep, to_thread
+from faasmctl.util.batch import batch_exec_factory
 from faasmctl.util.config import (
     get_faasm_ini_file,
+    get_faasm_ini_value,
     get_faasm_planner_host_port as faasmctl_get_planner_host_port,
+    update_faasm_ini_value,
 )
+from faasmctl.util.docker import in_docker
+from faasmctl.util.k8s import get_faasm_worker_pods, run_k8s_cmd
+from faasmctl.util.gen_proto.faabric_pb2 import BatchExecuteRequestStatus
 from faasmctl.util.invoke import invoke_wasm as faasmctl_invoke_wasm
+from faasmctl.util.planner import prepare_planner_msg
+from google.protobuf.json_format import MessageToDict, MessageToJson, Parse
 from os import environ
+from requests import post
+from tasks.util.k8s import wait_for_pods
+
+# Polling periods (in seconds) when waiting for an app to finish, and when
+# waiting for enough free hosts to schedule an app. Same values as faasmctl
+ASYNC_POLL_PERIOD_SECS = 2
+ASYNC_NO_HOSTS_RETRY_SECS = 1.5
+
+# Value of the `backend` key in the INI file of a local mock planner
+# deployment (see `inv makespan.mock.planner`)
+FAASM_MOCK_BACKEND = "mock"
 
 
 def get_faasm_exec_time_from_json(results_json, check=False):
@@ -22,6 +42,41 @@ def get_faasm_planner_host_port():
     return faasmctl_get_planner_host_port(get_faasm_ini_file())
 
 
+def is_faasm_mock_backend():
+    return (
+        get_faasm_ini_value(get_faasm_ini_file(), "Faasm", "backend")
+        == FAASM_MOCK_BACKEND
+    )
+
+
+def scale_faasm_workers(num_workers):
+    """
+    Scale the worker deployment of a Faasm cluster on k8s, wait for the
+    workers to be ready, and update the worker list in the INI file
+    """
+    ini_file = get_faasm_ini_file()
+    k8s_config = get_faasm_ini_value(ini_file, "Faasm", "k8s_config")
+    k8s_namespace = get_faasm_ini_value(ini_file, "Faasm", "k8s_namespace")
+
+    run_k8s_cmd(
+        k8s_config,
+        k8s_namespace,
+        "scale deployment/faasm-worker --replicas={}".format(num_workers),
+    )
+    wait_for_pods(k8s_namespace, "run=faasm-worker", num_expected=num_workers)
+
+    worker_names, worker_ips = get_faasm_worker_pods(
+        {"K8S_KUBECONFIG_FILE": k8s_config, "K8S_NAMESPACE": k8s_namespace},
+        "run=faasm-worker",
+    )
+    update_faasm_ini_value(
+        ini_file, "Faasm", "worker_names", ",".join(worker_names)
+    )
+    update_faasm_ini_value(
+        ini_file, "Faasm", "worker_ips", ",".join(worker_ips)
+    )
+
+
 def get_faasm_version():
     if "FAASM_VERSION" in environ:
         return environ["FAASM_VERSION"]
@@ -41,6 +96,73 @@ def post_async_msg_and_get_result_json(msg, host_list=None, req_dict=None):
     return result["messageResults"]
 
 
+async def async_post_msg_and_get_result_json(msg, req_dict=None):
+    """
+    Same as `post_async_msg_and_get_result_json`, but waiting on the event
+    loop instead of blocking the calling thread. The HTTP requests themselves
+    are short, so we off-load them to the loop's default thread pool
+    """
+    if req_dict is None:
+        req_dict = {"user": msg["user"], "function": msg["function"]}
+
+    req = batch_exec_factory(req_dict, msg, 1)
+    host, port = faasmctl_get_planner_host_port(
+        get_faasm_ini_file(), in_docker()
+    )
+    url = "http://{}:{}".format(host, port)
+
+    # The planner rejects the request if there are not enough hosts to
+    # schedule it, so we retry until the app is accepted
+    exec_msg = prepare_planner_msg(
+        "EXECUTE_BATCH", MessageToJson(req, indent=None)
+    )
+    while True:
+        response = await to_thread(post, url, data=exec_msg, timeout=None)
+        if (
+            response.status_code == 500
+            and response.text == "No available hosts"
+        ):
+            await async_sleep(ASYNC_NO_HOSTS_RETRY_SECS)
+            continue
+        break
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            "POST request failed (code: {}): {}".format(
+                response.status_code, response.text
+            )
+        )
+
+    ber_status = Parse(response.text, BatchExecuteRequestStatus())
+    ber_status.expectedNumMessages = msg.get("mpi_world_size", 1)
+
+    status_msg = prepare_planner_msg(
+        "EXECUTE_BATCH_STATUS", MessageToJson(ber_status, indent=None)
+    )
+    while True:
+        # Sleep at the begining, so that the app is registered as in-flight
+        await async_sleep(ASYNC_POLL_PERIOD_SECS)
+
+        response = await to_thread(post, url, data=status_msg, timeout=None)
+        if response.status_code != 200:
+            # We may query for an app result before it is finished, which is
+            # not an error
+            if response.text == "App not registered in results":
+                continue
+
+            raise RuntimeError(
+                "POST request failed (code: {}): {}".format(
+                    response.status_code, response.text
+                )
+            )
+
+        ber_status = Parse(response.text, BatchExecuteRequestStatus())
+        if ber_status.finished:
+            break
+
+    return MessageToDict(ber_status)["messageResults"]
+
+
 def has_app_failed(results_json):
     for result in results_json:
         if "returnValue" not in result:
@@ -9,7 +9,7 @@ from tasks.util.makespan import (
     NATIVE_BASELINES,
 )
 from tasks.util.math import cum_sum
-from tasks.util.planner import get_xvm_links_from_part
+from tasks.util.planner import get_cached_xvm_links_from_part
 from tasks.util.plot import (
     fix_hist_step_vertical_line_at_end,
     get_color_for_baseline,
@@ -202,9 +202,8 @@ def read_locality_results(num_vms, num_tasks, num_cpus_per_vm, migrate=False):
             # Second, for each ts subtract the size of each task in-flight
             for ts in result_dict[baseline]["tasks_per_ts"]:
                 for t in result_dict[baseline]["tasks_per_ts"][ts]:
-                    result_dict[baseline]["ts_vcpus"][ts] -= task_trace[
-                        int(t)
-                    ].size
+                    task = task_trace.get_task(int(t))
+                    result_dict[baseline]["ts_vcpus"][ts] -= task.size
 
                     # In addition, for each task in flight, add the tasks's IPs
                     # to the host set
@@ -272,10 +271,12 @@ def read_locality_results(num_vms, num_tasks, num_cpus_per_vm, migrate=False):
                         # Add the accumulated to the total tally
                         result_dict[baseline]["ts_xvm_links"][
                             ts
-                        ] += get_xvm_links_from_part(list(sched.values()))
+                        ] += get_cached_xvm_links_from_part(
+                            tuple(sched.values())
+                        )
                     elif baseline == "batch":
                         # Batch baseline is optimal in terms of cross-vm links
-                        task_size = task_trace[int(t)].size
+                        task_size = task_trace.get_task(int(t)).size
                         if task_size > 8:
                             num_links = 8 * (task_size - 8) / 2
                             result_dict[baseline]["ts_xvm_links"][
@@ -6,9 +6,13 @@ from tasks.util.env import (
     RESULTS_DIR,
 )
 from tasks.util.openmpi import get_native_mpi_pods_ip_to_vm
+from threading import Lock
+from time import time
 
 # Directories
 MAKESPAN_RESULTS_DIR = join(RESULTS_DIR, "makespan")
+# Results of the offline simulator are kept apart from the real ones
+MAKESPAN_SIM_RESULTS_DIR = join(RESULTS_DIR, "makespan-sim")
 MAKESPAN_PLOTS_DIR = join(PLOTS_ROOT, "makespan")
 
 # Result files
@@ -16,6 +20,9 @@ IDLE_CORES_FILE_PREFIX = "idle-cores"
 EXEC_TASK_INFO_FILE_PREFIX = "exec-task-info"
 SCHEDULING_INFO_FILE_PREFIX = "sched-info"
 MAKESPAN_FILE_PREFIX = "makespan"
+JOURNAL_FILE_PREFIX = "journal"
+LATENCY_FILE_PREFIX = "latency"
+FAULT_SWEEP_FILE_PREFIX = "fault-sweep"
 
 # Allowed system baselines:
 # - Granny: is our system
@@ -42,12 +49,40 @@ MPI_WORKLOADS = ["mpi"] + MPI_MIGRATE_WORKLOADS
 OPENMP_WORKLOADS = ["omp", "omp-elastic"]
 
 
-def init_csv_file(baseline, num_vms, trace_str, num_tasks_per_user=None):
-    makedirs(MAKESPAN_RESULTS_DIR, exist_ok=True)
+# Headers of the result files
+IDLE_CORES_CSV_HEADER = "TimeStampSecs,NumIdleCores"
+EXEC_TASK_INFO_CSV_HEADER = (
+    "TaskId,TimeExecuting,TimeInQueue,StartTimeStamp,EndTimeStamp"
+)
+NATIVE_SCHEDULING_INFO_CSV_HEADER = "TaskId,SchedulingDecision"
+GRANNY_SCHEDULING_INFO_CSV_HEADER = (
+    "TimeStampSecs,NumIdleVms,NumIdleCpus,NumCrossVmLinks"
+)
+MAKESPAN_CSV_HEADER = "MakespanSecs"
+LATENCY_CSV_HEADER = (
+    "Metric,Count,MinSecs,MeanSecs,P50Secs,P90Secs,P99Secs,MaxSecs"
+)
+FAULT_SWEEP_CSV_HEADER = (
+    "Baseline,FaultModel,MeanSecsBetweenEvictions,NumRuns,MeanMakespanSecs,"
+    "CiLowSecs,CiHighSecs,MeanNumFailedTasks,MeanNumMigratedTasks"
+)
 
-    # Idle Cores file
-    csv_name_ic = "makespan_{}_{}_{}_{}".format(
-        IDLE_CORES_FILE_PREFIX,
+# Flush policy of the result sink: we write the buffered rows to disk once
+# we have buffered this many rows, or this many seconds after the last flush
+RESULT_SINK_MAX_BUFFERED_LINES = 100
+RESULT_SINK_FLUSH_PERIOD_SECS = 5
+
+
+def get_result_file(
+    exp_key,
+    baseline,
+    num_vms,
+    num_tasks_per_user,
+    trace_str,
+    result_dir=MAKESPAN_RESULTS_DIR,
+):
+    csv_name = "makespan_{}_{}_{}_{}".format(
+        exp_key,
         baseline,
         (
             num_vms
@@ -56,138 +91,262 @@ def init_csv_file(baseline, num_vms, trace_str, num_tasks_per_user=None):
         ),
         get_trace_ending(trace_str),
     )
-    ic_file = join(MAKESPAN_RESULTS_DIR, csv_name_ic)
+    return join(result_dir, csv_name)
+
+
+def format_csv_line(baseline, exp_key, *args):
+    if exp_key == IDLE_CORES_FILE_PREFIX:
+        return "{},{}\n".format(*args)
+
+    if exp_key == EXEC_TASK_INFO_FILE_PREFIX:
+        return "{},{},{},{},{}\n".format(*args)
+
+    if exp_key == SCHEDULING_INFO_FILE_PREFIX:
+        if baseline in NATIVE_BASELINES:
+            task_id = args[0]
+            task_sched = ["{},{}".format(ip, slots) for (ip, slots) in args[1]]
+            sched_str = ",".join([str(task_id)] + task_sched)
+            return "{}\n".format(sched_str)
+
+        return "{},{},{},{}\n".format(*args)
+
+    if exp_key == MAKESPAN_FILE_PREFIX:
+        return "{}\n".format(*args)
+
+    if exp_key == LATENCY_FILE_PREFIX:
+        return "{},{},{},{},{},{},{},{}\n".format(*args)
+
+    if exp_key == FAULT_SWEEP_FILE_PREFIX:
+        return "{},{},{},{},{},{},{},{},{}\n".format(*args)
+
+    raise RuntimeError("Unrecognised result file: {}".format(exp_key))
+
+
+def init_csv_file(
+    baseline,
+    num_vms,
+    trace_str,
+    num_tasks_per_user=None,
+    result_dir=MAKESPAN_RESULTS_DIR,
+    ip_to_vm=None,
+):
+    """
+    Initialise the result files for one run of the makespan experiment. For
+    native baselines, the scheduling info file starts with the IP to VM
+    mapping, which we query from k8s unless the caller provides it as a list
+    of (ip, vm) pairs
+    """
+    makedirs(result_dir, exist_ok=True)
+
+    # Idle Cores file
+    ic_file = get_result_file(
+        IDLE_CORES_FILE_PREFIX,
+        baseline,
+        num_vms,
+        num_tasks_per_user,
+        trace_str,
+        result_dir,
+    )
     with open(ic_file, "w") as out_file:
-        out_file.write("TimeStampSecs,NumIdleCores\n")
+        out_file.write("{}\n".format(IDLE_CORES_CSV_HEADER))
 
     # Executed task info file
-    csv_name = "makespan_{}_{}_{}_{}".format(
+    csv_file = get_result_file(
         EXEC_TASK_INFO_FILE_PREFIX,
         baseline,
-        (
-            num_vms
-            if num_tasks_per_user is None
-            else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-        ),
-        get_trace_ending(trace_str),
+        num_vms,
+        num_tasks_per_user,
+        trace_str,
+        result_dir,
     )
-    csv_file = join(MAKESPAN_RESULTS_DIR, csv_name)
     with open(csv_file, "w") as out_file:
-        out_file.write(
-            "TaskId,TimeExecuting,TimeInQueue,StartTimeStamp,EndTimeStamp\n"
-        )
+        out_file.write("{}\n".format(EXEC_TASK_INFO_CSV_HEADER))
 
     # Scheduling info file. This file is different for native baselines and
     # for Granny. As in Granny we get this information from the planner
-    csv_name = "makespan_{}_{}_{}_{}".format(
+    csv_file = get_result_file(
         SCHEDULING_INFO_FILE_PREFIX,
         baseline,
-        (
-            num_vms
-            if num_tasks_per_user is None
-            else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-        ),
-        get_trace_ending(trace_str),
+        num_vms,
+        num_tasks_per_user,
+        trace_str,
+        result_dir,
     )
-    csv_file = join(MAKESPAN_RESULTS_DIR, csv_name)
     if baseline in NATIVE_BASELINES:
-        with open(csv_file, "w") as out_file:
-            out_file.write("TaskId,SchedulingDecision\n")
+        if ip_to_vm is None:
             ips, vms = get_native_mpi_pods_ip_to_vm("makespan")
-            ip_to_vm = ["{},{}".format(ip, vm) for ip, vm in zip(ips, vms)]
+            ip_to_vm = zip(ips, vms)
+        with open(csv_file, "w") as out_file:
+            out_file.write("{}\n".format(NATIVE_SCHEDULING_INFO_CSV_HEADER))
+            ip_to_vm = ["{},{}".format(ip, vm) for ip, vm in ip_to_vm]
             out_file.write(",".join(ip_to_vm) + "\n")
     else:
         with open(csv_file, "w") as out_file:
-            out_file.write(
-                "TimeStampSecs,NumIdleVms,NumIdleCpus,NumCrossVmLinks\n"
-            )
-            out_file.write
+            out_file.write("{}\n".format(GRANNY_SCHEDULING_INFO_CSV_HEADER))
 
     # Makespan file
     # In some fault-tolerant baselines we cannot only rely on the executed task
     # info to get the end-to-end latency measurement as some tasks may fail.
     # Instead, we use a CSV file too
-    csv_name = "makespan_{}_{}_{}_{}".format(
+    csv_file = get_result_file(
         MAKESPAN_FILE_PREFIX,
         baseline,
-        (
-            num_vms
-            if num_tasks_per_user is None
-            else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-        ),
-        get_trace_ending(trace_str),
+        num_vms,
+        num_tasks_per_user,
+        trace_str,
+        result_dir,
     )
-    csv_file = join(MAKESPAN_RESULTS_DIR, csv_name)
     with open(csv_file, "w") as out_file:
-        out_file.write("MakespanSecs\n")
+        out_file.write("{}\n".format(MAKESPAN_CSV_HEADER))
 
 
 def write_line_to_csv(
-    baseline, exp_key, num_vms, num_tasks_per_user, trace_str, *args
+    baseline,
+    exp_key,
+    num_vms,
+    num_tasks_per_user,
+    trace_str,
+    *args,
+    result_dir=MAKESPAN_RESULTS_DIR,
 ):
-    if exp_key == IDLE_CORES_FILE_PREFIX:
-        csv_name = "makespan_{}_{}_{}_{}".format(
-            IDLE_CORES_FILE_PREFIX,
-            baseline,
-            (
-                num_vms
-                if num_tasks_per_user is None
-                else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-            ),
-            get_trace_ending(trace_str),
-        )
-        makespan_file = join(MAKESPAN_RESULTS_DIR, csv_name)
-        with open(makespan_file, "a") as out_file:
-            out_file.write("{},{}\n".format(*args))
-    elif exp_key == EXEC_TASK_INFO_FILE_PREFIX:
-        csv_name = "makespan_{}_{}_{}_{}".format(
-            EXEC_TASK_INFO_FILE_PREFIX,
-            baseline,
-            (
-                num_vms
-                if num_tasks_per_user is None
-                else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-            ),
-            get_trace_ending(trace_str),
-        )
-        makespan_file = join(MAKESPAN_RESULTS_DIR, csv_name)
-        with open(makespan_file, "a") as out_file:
-            out_file.write("{},{},{},{},{}\n".format(*args))
-    elif exp_key == SCHEDULING_INFO_FILE_PREFIX:
-        csv_name = "makespan_{}_{}_{}_{}".format(
-            SCHEDULING_INFO_FILE_PREFIX,
-            baseline,
-            (
-                num_vms
-                if num_tasks_per_user is None
-                else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-            ),
-            get_trace_ending(trace_str),
-        )
-        makespan_file = join(MAKESPAN_RESULTS_DIR, csv_name)
-        if baseline in NATIVE_BASELINES:
-            task_id = args[0]
-            task_sched = ["{},{}".format(ip, slots) for (ip, slots) in args[1]]
-            sched_str = ",".join([str(task_id)] + task_sched)
-            with open(makespan_file, "a") as out_file:
-                out_file.write("{}\n".format(sched_str))
-        else:
-            with open(makespan_file, "a") as out_file:
-                out_file.write("{},{},{},{}\n".format(*args))
-    elif exp_key == MAKESPAN_FILE_PREFIX:
-        csv_name = "makespan_{}_{}_{}_{}".format(
-            MAKESPAN_FILE_PREFIX,
-            baseline,
-            (
-                num_vms
-                if num_tasks_per_user is None
-                else "{}vms_{}tpusr".format(num_vms, num_tasks_per_user)
-            ),
-            get_trace_ending(trace_str),
-        )
-        makespan_file = join(MAKESPAN_RESULTS_DIR, csv_name)
-        with open(makespan_file, "a") as out_file:
-            out_file.write("{}\n".format(*args))
+    makespan_file = get_result_file(
+        exp_key, baseline, num_vms, num_tasks_per_user, trace_str, result_dir
+    )
+    with open(makespan_file, "a") as out_file:
+        out_file.write(format_csv_line(baseline, exp_key, *args))
+
+
+class ResultSink:
+    """
+    Writer for the result files of one run of the makespan experiment. We
+    keep one open handle per file, and buffer rows in memory until we have
+    `max_buffered_lines` rows, or `flush_period_secs` have passed since the
+    last flush. Both the scheduler and its background threads write to the
+    same sink, so all methods are thread-safe
+    """
+
+    def __init__(
+        self,
+        baseline,
+        num_vms,
+        num_tasks_per_user,
+        trace_str,
+        result_dir=MAKESPAN_RESULTS_DIR,
+        max_buffered_lines=RESULT_SINK_MAX_BUFFERED_LINES,
+        flush_period_secs=RESULT_SINK_FLUSH_PERIOD_SECS,
+    ):
+        self.baseline = baseline
+        self.num_vms = num_vms
+        self.num_tasks_per_user = num_tasks_per_user
+        self.trace_str = trace_str
+        self.result_dir = result_dir
+        self.max_buffered_lines = max_buffered_lines
+        self.flush_period_secs = flush_period_secs
+
+        # We open the files lazily, as the caller may initialise them after
+        # creating the sink
+        self.out_files = {}
+        self.buffers = {}
+        self.num_buffered_lines = 0
+        self.last_flush_ts = time()
+        self.lock = Lock()
+
+    def get_out_file(self, exp_key):
+        if exp_key not in self.out_files:
+            makedirs(self.result_dir, exist_ok=True)
+            self.out_files[exp_key] = open(
+                get_result_file(
+                    exp_key,
+                    self.baseline,
+                    self.num_vms,
+                    self.num_tasks_per_user,
+                    self.trace_str,
+                    self.result_dir,
+                ),
+                "a",
+            )
+
+        return self.out_files[exp_key]
+
+    def write_line(self, exp_key, *args):
+        line = format_csv_line(self.baseline, exp_key, *args)
+
+        with self.lock:
+            self.buffers.setdefault(exp_key, []).append(line)
+            self.num_buffered_lines += 1
+
+            if (
+                self.num_buffered_lines >= self.max_buffered_lines
+                or time() - self.last_flush_ts >= self.flush_period_secs
+            ):
+                self.flush_locked()
+
+    def write_lines(self, exp_key, rows):
+        """
+        Append many rows to one result file at once, and flush them straight
+        away (e.g. from a buffer the caller already keeps)
+        """
+        lines = [format_csv_line(self.baseline, exp_key, *row) for row in rows]
+
+        with self.lock:
+            self.buffers.setdefault(exp_key, []).extend(lines)
+            self.num_buffered_lines += len(lines)
+            self.flush_locked()
+
+    def truncate(self, exp_key, header):
+        """
+        Discard the contents of one result file, and start it again with the
+        given header
+        """
+        with self.lock:
+            self.buffers.pop(exp_key, None)
+            out_file = self.get_out_file(exp_key)
+            out_file.truncate(0)
+            out_file.write("{}\n".format(header))
+            out_file.flush()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        for exp_key, lines in self.buffers.items():
+            out_file = self.get_out_file(exp_key)
+            out_file.write("".join(lines))
+            out_file.flush()
+
+        self.buffers = {}
+        self.num_buffered_lines = 0
+        self.last_flush_ts = time()
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            for out_file in self.out_files.values():
+                out_file.close()
+            self.out_files = {}
+
+
+class NullResultSink:
+    """
+    Same interface as ResultSink, for runs whose per-task results we do not
+    keep (e.g. each of the runs in a simulated sweep)
+    """
+
+    def write_line(self, exp_key, *args):
+        pass
+
+    def write_lines(self, exp_key, rows):
+        pass
+
+    def truncate(self, exp_key, header):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
 
 
 # ----------------------------
@@ -275,7 +434,7 @@ def get_idle_core_count_from_task_info(
     # differential
     for task_id in executed_task_info:
         # Retrieve original task and assert it is the right one
-        task = task_trace[task_id]
+        task = task_trace.get_task(task_id)
         if task.task_id != task_id:
             print(
                 "Error processing tasks. Expected id {} - got {}".format(
@@ -0,0 +1,214 @@
+from threading import Lock
+from time import perf_counter, time
+
+"""
+Latency instrumentation for the makespan experiment. We record latencies in
+HDR-style histograms: values are bucketed with a fixed number of significant
+bits, so recording is O(1) and the relative error of any reported percentile
+is bounded, regardless of the range of the values. When instrumentation is
+disabled, callers use a null object with the same interface that does
+nothing.
+"""
+
+METRIC_PLANNER_CALL = "planner-call"
+METRIC_SCHEDULING_DECISION = "scheduling-decision"
+METRIC_DISPATCH_TO_START = "dispatch-to-start"
+METRIC_START_TO_FINISH = "start-to-finish"
+ALL_METRICS = [
+    METRIC_PLANNER_CALL,
+    METRIC_SCHEDULING_DECISION,
+    METRIC_DISPATCH_TO_START,
+    METRIC_START_TO_FINISH,
+]
+
+# We record values as integer multiples of this unit
+HISTOGRAM_UNIT_SECS = 1e-6
+# Number of significant bits we keep for each value. With 7 bits the relative
+# error of the recorded values is below 1 %
+HISTOGRAM_SIGNIFICANT_BITS = 7
+# Percentiles that we report in the summary
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in seconds. Each bucket is identified by the
+    number of low-order bits we drop from the value (the shift), and the
+    remaining significant bits
+    """
+
+    def __init__(self, significant_bits=HISTOGRAM_SIGNIFICANT_BITS):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.count = 0
+        self.total_secs = 0.0
+        self.min_secs = float("inf")
+        self.max_secs = 0.0
+
+    def get_bucket(self, value):
+        shift = max(value.bit_length() - self.significant_bits, 0)
+        return (shift, value >> shift)
+
+    def record(self, secs):
+        secs = max(secs, 0.0)
+        bucket = self.get_bucket(int(secs / HISTOGRAM_UNIT_SECS))
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+        self.count += 1
+        self.total_secs += secs
+        self.min_secs = min(self.min_secs, secs)
+        self.max_secs = max(self.max_secs, secs)
+
+    def get_mean(self):
+        if self.count == 0:
+            return 0.0
+
+        return self.total_secs / self.count
+
+    def get_percentile(self, pctg):
+        """
+        Return the highest value equivalent to the `pctg`-th percentile (i.e.
+        the upper end of its bucket) capped by the maximum recorded value
+        """
+        if self.count == 0:
+            return 0.0
+
+        target = max(int(self.count * pctg / 100 + 0.5), 1)
+        seen = 0
+        for shift, sub_bucket in sorted(self.counts):
+            seen += self.counts[(shift, sub_bucket)]
+            if seen >= target:
+                upper = (((sub_bucket + 1) << shift) - 1) * HISTOGRAM_UNIT_SECS
+                return min(upper, self.max_secs)
+
+        return self.max_secs
+
+
+class Timer:
+    """
+    Context manager that records the time spent in its block
+    """
+
+    def __init__(self, metrics, metric):
+        self.metrics = metrics
+        self.metric = metric
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.record(self.metric, perf_counter() - self.start)
+
+
+class SchedulerMetrics:
+    """
+    Latency histograms of one run of the batch scheduler. The scheduler and
+    its background threads record to the same instance
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.histograms = {
+            metric: LatencyHistogram() for metric in ALL_METRICS
+        }
+        # Map of task ids to the timestamp at which we dispatched them
+        self.dispatch_ts = {}
+        self.lock = Lock()
+
+    def timer(self, metric):
+        return Timer(self, metric)
+
+    def record(self, metric, secs):
+        with self.lock:
+            self.histograms[metric].record(secs)
+
+    def task_dispatched(self, task_id):
+        self.dispatch_ts[task_id] = time()
+
+    def task_finished(self, result):
+        """
+        Record the latencies of a task from the timestamps that the executor
+        measured, and reported in the result
+        """
+        dispatch_ts = self.dispatch_ts.pop(result.task_id, None)
+        if result.exec_time == -1:
+            return
+
+        if dispatch_ts is not None:
+            self.record(
+                METRIC_DISPATCH_TO_START, result.start_ts - dispatch_ts
+            )
+        self.record(METRIC_START_TO_FINISH, result.end_ts - result.start_ts)
+
+    def get_summary_rows(self):
+        """
+        One row per metric with: metric, count, min, mean, percentiles, max
+        """
+        rows = []
+        with self.lock:
+            for metric in ALL_METRICS:
+                histogram = self.histograms[metric]
+                min_secs = histogram.min_secs if histogram.count > 0 else 0.0
+                values = (
+                    [min_secs, histogram.get_mean()]
+                    + [
+                        histogram.get_percentile(pctg)
+                        for pctg in SUMMARY_PERCENTILES
+                    ]
+                    + [histogram.max_secs]
+                )
+                rows.append(
+                    [metric, histogram.count]
+                    + [round(value, 6) for value in values]
+                )
+
+        return rows
+
+    def print_summary(self):
+        print("Scheduler latencies (in seconds):")
+        for row in self.get_summary_rows():
+            print(
+                "\t- {}: count={} min={} mean={} p50={} p90={} p99={}"
+                " max={}".format(*row)
+            )
+
+
+class NullMetrics:
+    """
+    Same interface as SchedulerMetrics, for when instrumentation is disabled
+    """
+
+    enabled = False
+
+    class NullTimer:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+    null_timer = NullTimer()
+
+    def timer(self, metric):
+        return self.null_timer
+
+    def record(self, metric, secs):
+        pass
+
+    def task_dispatched(self, task_id):
+        pass
+
+    def task_finished(self, result):
+        pass
+
+    def get_summary_rows(self):
+        return []
+
+    def print_summary(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -1,4 +1,5 @@
-from subprocess import run, PIPE
+from asyncio import create_subprocess_shell
+from subprocess import CalledProcessError, run, PIPE
 from os.path import join
 from os import makedirs
 from jinja2 import Environment, FileSystemLoader
@@ -92,6 +93,26 @@ def run_kubectl_cmd(experiment_name, cmd, capture_stderr=False):
     return res.stdout.decode("utf-8")
 
 
+async def async_run_kubectl_cmd(experiment_name, cmd):
+    """
+    Same as `run_kubectl_cmd`, but waiting for the command on the event loop
+    """
+    namespace = get_native_mpi_namespace(experiment_name)
+    kubecmd = "kubectl -n {} {}".format(namespace, cmd)
+    proc = await create_subprocess_shell(
+        kubecmd,
+        stdout=PIPE,
+        stderr=PIPE,
+        cwd=PROJ_ROOT,
+    )
+    stdout, stderr = await proc.communicate()
+
+    if proc.returncode != 0:
+        raise CalledProcessError(proc.returncode, kubecmd, stdout, stderr)
+
+    return stdout.decode("utf-8")
+
+
 def get_native_mpi_pods(experiment_name):
     # List all pods
     cmd_out = run_kubectl_cmd(
@@ -164,6 +185,22 @@ def deploy_native_mpi(experiment_name, image_name, num_vms):
     wait_for_pods(namespace, "run=faasm-openmpi", num_expected=num_vms)
 
 
+def scale_native_mpi(experiment_name, num_vms):
+    """
+    Scale an existing native MPI deployment to `num_vms` pods, and wait for
+    them to be ready
+    """
+    run_kubectl_cmd(
+        experiment_name,
+        "scale deployment/faasm-openmpi-deployment --replicas={}".format(
+            num_vms
+        ),
+    )
+
+    namespace = get_native_mpi_namespace(experiment_name)
+    wait_for_pods(namespace, "run=faasm-openmpi", num_expected=num_vms)
+
+
 def delete_native_mpi(experiment_name, image_name, num_vms):
     _, deployment_yml = _template_k8s_files(
         experiment_name, image_name, num_vms
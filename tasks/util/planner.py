@@ -2,8 +2,330 @@ from faasmctl.util.planner import (
     get_available_hosts as planner_get_available_hosts,
     get_in_fligh_apps as planner_get_in_fligh_apps,
 )
+from collections import Counter
+from functools import lru_cache
 from math import ceil
-from time import sleep
+from numpy import (
+    arange,
+    array,
+    bincount,
+    fromiter,
+    int64,
+    ndarray,
+    repeat,
+    zeros,
+)
+from tasks.util.metrics import METRIC_PLANNER_CALL, NULL_METRICS
+from threading import Condition, Event, Lock, Thread
+from time import sleep, time
+from typing import List, Tuple
+
+# How often the planner poller refreshes its snapshot of the planner state
+PLANNER_POLL_PERIOD_SECS = 0.5
+# Default maximum age of the snapshot that a consumer accepts. If the latest
+# snapshot is older, the consumer triggers a refresh
+PLANNER_SNAPSHOT_MAX_STALENESS_SECS = 0.5
+# Number of partitions whose cross-VM links we cache
+XVM_LINKS_CACHE_SIZE = 4096
+
+
+class PlannerSnapshot:
+    """
+    Snapshot of the planner state. The version increases with each snapshot,
+    and the timestamp is taken before querying the planner
+    """
+
+    def __init__(self, version, ts, in_flight_apps, available_hosts):
+        self.version = version
+        self.ts = ts
+        self.in_flight_apps = in_flight_apps
+        self.available_hosts = available_hosts
+
+
+class PlannerPoller:
+    """
+    Single poller of the planner state. A background thread refreshes the
+    snapshot of the in-flight apps and the available hosts every
+    `period_secs`, and all consumers read the latest snapshot instead of
+    querying the planner themselves
+    """
+
+    def __init__(
+        self,
+        period_secs=PLANNER_POLL_PERIOD_SECS,
+        max_staleness_secs=PLANNER_SNAPSHOT_MAX_STALENESS_SECS,
+        metrics=NULL_METRICS,
+    ):
+        self.period_secs = period_secs
+        self.max_staleness_secs = max_staleness_secs
+        # Records the latency of the planner queries
+        self.metrics = metrics
+
+        self.snapshot = None
+        # Notified every time we publish a new snapshot
+        self.new_snapshot = Condition()
+        # Serialises the queries to the planner
+        self.refresh_lock = Lock()
+        self.stop_event = Event()
+        self.thread = Thread(target=self.poll_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def poll_loop(self):
+        while not self.stop_event.is_set():
+            self.refresh()
+            self.stop_event.wait(self.period_secs)
+
+    def refresh(self, not_before=None):
+        """
+        Query the planner and publish a new snapshot. If another consumer has
+        published a snapshot taken after `not_before` while we waited for the
+        lock, we return it instead
+        """
+        with self.refresh_lock:
+            snapshot = self.snapshot
+            if (
+                not_before is not None
+                and snapshot is not None
+                and snapshot.ts >= not_before
+            ):
+                return snapshot
+
+            ts = time()
+            with self.metrics.timer(METRIC_PLANNER_CALL):
+                in_flight_apps = planner_get_in_fligh_apps()
+            with self.metrics.timer(METRIC_PLANNER_CALL):
+                available_hosts = planner_get_available_hosts()
+
+            with self.new_snapshot:
+                version = 1 if snapshot is None else snapshot.version + 1
+                self.snapshot = PlannerSnapshot(
+                    version, ts, in_flight_apps, available_hosts
+                )
+                self.new_snapshot.notify_all()
+
+            return self.snapshot
+
+    def get_snapshot(self, max_staleness_secs=None):
+        """
+        Return the latest snapshot, as long as it is not older than the
+        staleness bound
+        """
+        if max_staleness_secs is None:
+            max_staleness_secs = self.max_staleness_secs
+
+        not_before = time() - max_staleness_secs
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.ts < not_before:
+            return self.refresh(not_before=not_before)
+
+        return snapshot
+
+    def wait_for_snapshot(self, version, timeout=None):
+        """
+        Block until there is a snapshot newer than `version`, or until the
+        timeout expires. Return the latest snapshot
+        """
+        with self.new_snapshot:
+            self.new_snapshot.wait_for(
+                lambda: self.snapshot is not None
+                and self.snapshot.version > version,
+                timeout=timeout,
+            )
+            return self.snapshot
+
+    def get_next_snapshot(self, version):
+        """
+        Return a snapshot newer than `version`. We wait for the poller thread
+        to publish it, and query the planner ourselves if it does not
+        """
+        snapshot = self.wait_for_snapshot(
+            version, timeout=2 * self.period_secs
+        )
+        if snapshot is None or snapshot.version <= version:
+            snapshot = self.refresh()
+
+        return snapshot
+
+
+# Capped exponential backoff between planner queries when waiting for the
+# planner state to change without a poller
+PLANNER_WAIT_INITIAL_BACKOFF_SECS = 0.05
+PLANNER_WAIT_MAX_BACKOFF_SECS = 2
+# Maximum time we wait for the planner to register an app we have dispatched.
+# If it does not show up by then, it has either finished already, or the
+# planner has not accepted it yet, and in both cases it holds no slots
+PLANNER_APP_REGISTRATION_TIMEOUT_SECS = 5
+
+# Reasons why we wait for the planner state to change before working out the
+# number of available slots
+WAIT_MISSING_HOSTS = "missing-hosts"
+WAIT_MISSING_EVICTED_VMS = "missing-evicted-vms"
+WAIT_APP_INITIALISING = "app-initialising"
+WAIT_APP_IN_EVICTED_VM = "app-in-evicted-vm"
+WAIT_NOT_ENOUGH_FREE_VMS = "not-enough-free-vms"
+WAIT_INCONSISTENT_USED_SLOTS = "inconsistent-used-slots"
+WAIT_INCONSISTENT_AVAILABLE_SLOTS = "inconsistent-available-slots"
+WAIT_LOCALITY_SLACK = "locality-slack"
+WAIT_APP_REGISTERING = "app-registering"
+PLANNER_WAIT_REASONS = [
+    WAIT_MISSING_HOSTS,
+    WAIT_MISSING_EVICTED_VMS,
+    WAIT_APP_INITIALISING,
+    WAIT_APP_IN_EVICTED_VM,
+    WAIT_NOT_ENOUGH_FREE_VMS,
+    WAIT_INCONSISTENT_USED_SLOTS,
+    WAIT_INCONSISTENT_AVAILABLE_SLOTS,
+    WAIT_LOCALITY_SLACK,
+    WAIT_APP_REGISTERING,
+]
+
+
+class PlannerWaitStats:
+    """
+    Per-reason number of retries and time spent blocked waiting for the
+    planner state to change
+    """
+
+    def __init__(self):
+        self.num_retries = {reason: 0 for reason in PLANNER_WAIT_REASONS}
+        self.time_blocked_secs = {
+            reason: 0.0 for reason in PLANNER_WAIT_REASONS
+        }
+
+    def record(self, reason, time_blocked_secs):
+        self.num_retries[reason] += 1
+        self.time_blocked_secs[reason] += time_blocked_secs
+
+    def get_total_time_blocked(self):
+        return sum(self.time_blocked_secs.values())
+
+    def print_summary(self):
+        print("Time blocked waiting for the planner (per reason):")
+        for reason in PLANNER_WAIT_REASONS:
+            if self.num_retries[reason] == 0:
+                continue
+
+            print(
+                "\t- {}: {} retries, {:.2f} s".format(
+                    reason,
+                    self.num_retries[reason],
+                    self.time_blocked_secs[reason],
+                )
+            )
+        print("\t- Total: {:.2f} s".format(self.get_total_time_blocked()))
+
+
+def get_in_flight_app_ids(snapshot):
+    if snapshot is None:
+        return set()
+
+    return set(app.appId for app in snapshot.in_flight_apps.apps)
+
+
+def has_planner_state_changed(old_snapshot, new_snapshot):
+    return (
+        old_snapshot.in_flight_apps != new_snapshot.in_flight_apps
+        or old_snapshot.available_hosts != new_snapshot.available_hosts
+    )
+
+
+class PlannerStateWaiter:
+    """
+    Wait primitive for the planner state to change. With a poller, we block
+    on its snapshots (without querying the planner). Without one, we query
+    the planner with capped exponential backoff. In both cases, we record
+    why, and for how long, we have been blocked
+    """
+
+    def __init__(
+        self,
+        poller=None,
+        stats=None,
+        initial_backoff_secs=PLANNER_WAIT_INITIAL_BACKOFF_SECS,
+        max_backoff_secs=PLANNER_WAIT_MAX_BACKOFF_SECS,
+        metrics=NULL_METRICS,
+    ):
+        self.poller = poller
+        self.stats = PlannerWaitStats() if stats is None else stats
+        self.metrics = metrics
+        self.initial_backoff_secs = initial_backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+
+        # Version counter for the snapshots we take ourselves
+        self.version = 0
+
+    def get_snapshot(self):
+        if self.poller is not None:
+            return self.poller.get_snapshot()
+
+        self.version += 1
+        ts = time()
+        with self.metrics.timer(METRIC_PLANNER_CALL):
+            in_flight_apps = planner_get_in_fligh_apps()
+        with self.metrics.timer(METRIC_PLANNER_CALL):
+            available_hosts = planner_get_available_hosts()
+
+        return PlannerSnapshot(
+            self.version, ts, in_flight_apps, available_hosts
+        )
+
+    def wait(self, reason, snapshot):
+        """
+        Block until the planner state differs from `snapshot`, and return the
+        new snapshot
+        """
+        start_ts = time()
+        backoff_secs = self.initial_backoff_secs
+        while True:
+            if self.poller is not None:
+                new_snapshot = self.poller.get_next_snapshot(snapshot.version)
+            else:
+                sleep(backoff_secs)
+                backoff_secs = min(2 * backoff_secs, self.max_backoff_secs)
+                new_snapshot = self.get_snapshot()
+
+            if has_planner_state_changed(snapshot, new_snapshot):
+                break
+
+            snapshot = new_snapshot
+
+        self.stats.record(reason, time() - start_ts)
+        return new_snapshot
+
+    def wait_for_new_app(
+        self, known_app_ids, timeout_secs=PLANNER_APP_REGISTRATION_TIMEOUT_SECS
+    ):
+        """
+        Block until the planner state shows an in-flight app that is not in
+        `known_app_ids`, or until the timeout expires. Return whether the
+        app showed up
+        """
+        start_ts = time()
+        backoff_secs = self.initial_backoff_secs
+        snapshot = self.get_snapshot()
+        has_waited = False
+        while len(get_in_flight_app_ids(snapshot) - known_app_ids) == 0:
+            if time() - start_ts >= timeout_secs:
+                break
+
+            has_waited = True
+            if self.poller is not None:
+                snapshot = self.poller.get_next_snapshot(snapshot.version)
+            else:
+                sleep(backoff_secs)
+                backoff_secs = min(2 * backoff_secs, self.max_backoff_secs)
+                snapshot = self.get_snapshot()
+
+        if has_waited:
+            self.stats.record(WAIT_APP_REGISTERING, time() - start_ts)
+
+        return len(get_in_flight_app_ids(snapshot) - known_app_ids) > 0
 
 
 # This method also returns the number of used VMs
@@ -38,17 +360,24 @@ def get_num_available_slots_from_in_flight_apps(
     next_task_size=None,
     # Used to make Granny behave like batch (for `mpi-locality`)
     batch=False,
+    # If set, read the planner state from the poller's snapshots
+    poller=None,
+    # If set, wait for planner state changes (and record why) with it
+    waiter=None,
 ):
     """
     For Granny baselines, we cannot use static knowledge of the
-    allocated slots, as migrations may happen so we query the planner
+    allocated slots, as migrations may happen so we query the planner.
+    Whenever we can not work out the number of slots from the current
+    planner state, we block until it changes
     """
-    short_sleep_secs = 0.25
-    long_sleep_secs = 1
+    if waiter is None:
+        waiter = PlannerStateWaiter(poller)
 
+    snapshot = waiter.get_snapshot()
     while True:
-        in_flight_apps = planner_get_in_fligh_apps()
-        available_hosts = planner_get_available_hosts()
+        in_flight_apps = snapshot.in_flight_apps
+        available_hosts = snapshot.available_hosts
         available_ips = [host.ip for host in available_hosts.hosts]
 
         if len(available_ips) != num_vms:
@@ -57,7 +386,7 @@ def get_num_available_slots_from_in_flight_apps(
                     len(available_ips), num_vms
                 )
             )
-            sleep(short_sleep_secs)
+            snapshot = waiter.wait(WAIT_MISSING_HOSTS, snapshot)
             continue
 
         available_slots = sum(
@@ -82,7 +411,7 @@ def get_num_available_slots_from_in_flight_apps(
             and len(next_evicted_vm_ips) != num_evicted_vms
         ):
             print("Not enough evicted VMs registered. Retrying...")
-            sleep(short_sleep_secs)
+            snapshot = waiter.wait(WAIT_MISSING_EVICTED_VMS, snapshot)
             continue
 
         worker_occupation = {}
@@ -96,7 +425,7 @@ def get_num_available_slots_from_in_flight_apps(
         # sleep for a bit and ask again (we allow the size to go over the
         # specified size in case of an elsatic scale-up)
         if any([len(app.hostIps) < app.size for app in in_flight_apps.apps]):
-            sleep(short_sleep_secs)
+            snapshot = waiter.wait(WAIT_APP_INITIALISING, snapshot)
             continue
 
         # Also prevent from scheduling an app while another app is waiting
@@ -113,7 +442,7 @@ def get_num_available_slots_from_in_flight_apps(
                 break
 
         if must_hold_back:
-            sleep(long_sleep_secs)
+            snapshot = waiter.wait(WAIT_APP_IN_EVICTED_VM, snapshot)
             continue
 
         for app in in_flight_apps.apps:
@@ -161,7 +490,7 @@ def get_num_available_slots_from_in_flight_apps(
             if (
                 num_vms - len(list(worker_occupation.keys()))
             ) < num_needed_vms:
-                sleep(5 * long_sleep_secs)
+                snapshot = waiter.wait(WAIT_NOT_ENOUGH_FREE_VMS, snapshot)
                 continue
 
         num_available_slots = (
@@ -178,7 +507,7 @@ def get_num_available_slots_from_in_flight_apps(
             num_available_slots += num_cpus_per_vm - worker_occupation[ip]
 
         if must_hold_back:
-            sleep(long_sleep_secs)
+            snapshot = waiter.wait(WAIT_INCONSISTENT_USED_SLOTS, snapshot)
             continue
 
         # Double-check the number of available slots with our other source of truth
@@ -190,7 +519,7 @@ def get_num_available_slots_from_in_flight_apps(
                     num_available_slots, available_slots
                 )
             )
-            sleep(short_sleep_secs)
+            snapshot = waiter.wait(WAIT_INCONSISTENT_AVAILABLE_SLOTS, snapshot)
             continue
 
         # TODO: decide on the percentage, 10% or 5% ?
@@ -202,7 +531,7 @@ def get_num_available_slots_from_in_flight_apps(
             and (num_available_slots - next_task_size)
             < int(num_vms * num_cpus_per_vm * pctg)
         ):
-            sleep(long_sleep_secs)
+            snapshot = waiter.wait(WAIT_LOCALITY_SLACK, snapshot)
             continue
 
         # If we have made it this far, we are done
@@ -226,35 +555,51 @@ def get_xvm_links_from_part(part):
     Calculate the number of cross-VM links for a given partition
 
     The number of cross-VM links is the sum for each process of all the
-    non-local processes divided by two.
+    non-local processes divided by two. In closed form, this is:
+    (total^2 - sum(p_i^2)) / 2
     """
-    if len(part) == 1:
-        return 0
+    total = sum(part)
+    return (total * total - sum([p * p for p in part])) // 2
 
-    count = 0
-    for ind in range(len(part)):
-        count += sum(part[0:ind] + part[ind + 1 :]) * part[ind]
 
-    return int(count / 2)
+@lru_cache(maxsize=XVM_LINKS_CACHE_SIZE)
+def get_cached_xvm_links_from_part(part: Tuple[int, ...]) -> int:
+    """
+    Same as `get_xvm_links_from_part`, but cached by partition, for callers
+    that see the same partitions over and over (e.g. placement policies)
+    """
+    return get_xvm_links_from_part(part)
 
 
-def get_num_xvm_links_from_in_flight_apps(in_flight_apps):
-    total_xvm_links = 0
+def get_xvm_links_from_parts(parts: List[List[int]]) -> ndarray:
+    """
+    Calculate the number of cross-VM links of many partitions at once. We
+    flatten all partitions into one array, and reduce the totals and the sum
+    of squares per partition with `bincount`
+    """
+    if len(parts) == 0:
+        return zeros(0, dtype=int64)
 
-    for app in in_flight_apps.apps:
-        app_ocupation = {}
-        for ip in app.hostIps:
-            if ip not in app_ocupation:
-                app_ocupation[ip] = 0
-            app_ocupation[ip] += 1
-
-        part = list(app_ocupation.values())
-        # TODO: delete me
-        #    print("DEBUG - App: {} - Occupation: {} - Part: {} - Links: {}".format(
-        #               app.appId,
-        #               app_ocupation,
-        #               part,
-        #               get_xvm_links_from_part(part)))
-        total_xvm_links += get_xvm_links_from_part(part)
-
-    return total_xvm_links
+    sizes = array([len(part) for part in parts], dtype=int64)
+    values = fromiter(
+        (p for part in parts for p in part), dtype=int64, count=sizes.sum()
+    )
+    part_idxs = repeat(arange(len(parts)), sizes)
+
+    totals = bincount(part_idxs, weights=values, minlength=len(parts))
+    squares = bincount(
+        part_idxs, weights=values * values, minlength=len(parts)
+    )
+
+    return ((totals * totals - squares) // 2).astype(int64)
+
+
+def get_num_xvm_links_from_in_flight_apps(in_flight_apps):
+    return int(
+        get_xvm_links_from_parts(
+            [
+                list(Counter(app.hostIps).values())
+                for app in in_flight_apps.apps
+            ]
+        ).sum()
+    )
@@ -0,0 +1,364 @@
+from dataclasses import dataclass
+from numpy import (
+    arange,
+    asarray,
+    bool_,
+    concatenate,
+    cumsum,
+    flatnonzero,
+    float64,
+    int64,
+    ndarray,
+    unique,
+    zeros,
+)
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+"""
+Array-backed tables of the tasks in a trace, and of their execution. Each
+field is a NumPy column, so a table of a million tasks takes tens of bytes
+per task, instead of one Python object (and one dict entry) per task. Rows
+are built on access, with the same fields as the dataclasses that the rest of
+the code uses.
+"""
+
+# Number of rows we convert to Python objects at once when iterating
+TABLE_ITER_CHUNK_SIZE = 1 << 12
+
+
+@dataclass
+class TaskObject:
+    """
+    One task (or job) of an experiment. Each task is identified by:
+    - task_id: unique identifier of the task
+    - app: type of workload the task is running, one in: `mpi` or `omp`
+    - size: task's requirements in terms of CPUs
+    - inter_arrival_time: delay in seconds for the task to arrive wrt the
+        previous task
+    """
+
+    task_id: int
+    app: str
+    size: int
+    inter_arrival_time: int
+
+
+@dataclass
+class ExecutedTaskInfo:
+    """
+    Information about an executed task for plotting and analysis
+    """
+
+    task_id: int
+    # Times are in seconds and rounded to zero decimal places
+    time_executing: float
+    time_in_queue: float
+    # Timestamps for when the task starts and finishes executing
+    exec_start_ts: float
+    exec_end_ts: float
+
+
+class TaskTable:
+    """
+    Struct-of-arrays of the tasks in a trace, in trace order. Apps are kept
+    as indices in a table of app names. Indexing returns a `TaskObject`, and
+    slicing returns a table that shares the columns. Task ids need not follow
+    the trace order (e.g. each user in a trace owns a block of ids), so use
+    `get_task` to look tasks up by id
+    """
+
+    def __init__(
+        self,
+        app_names: List[str],
+        task_ids: ndarray,
+        app_codes: ndarray,
+        sizes: ndarray,
+        inter_arrival_times: ndarray,
+    ):
+        self.app_names = app_names
+        self.task_ids = task_ids
+        self.app_codes = app_codes
+        self.sizes = sizes
+        self.inter_arrival_times = inter_arrival_times
+        # Row of each task id, built on first use
+        self.id_rows = None
+
+    @classmethod
+    def from_columns(cls, task_ids, apps, sizes, inter_arrival_times):
+        """
+        Build a table from one sequence (list or array) per column, with the
+        apps given by name
+        """
+        app_names, app_codes = unique(
+            asarray(apps, dtype=str), return_inverse=True
+        )
+        return cls(
+            app_names.tolist(),
+            asarray(task_ids, dtype=int64),
+            app_codes.astype(int64),
+            asarray(sizes, dtype=int64),
+            asarray(inter_arrival_times, dtype=int64),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[int, str, int, int]]):
+        if len(rows) == 0:
+            return cls.from_columns([], [], [], [])
+
+        return cls.from_columns(*zip(*rows))
+
+    @classmethod
+    def from_tasks(cls, tasks: Iterable[TaskObject]):
+        """
+        Build a table from task objects, one chunk at a time, so that we
+        never hold all of them as objects
+        """
+        tables = []
+        rows = []
+        for task in tasks:
+            rows.append(
+                (task.task_id, task.app, task.size, task.inter_arrival_time)
+            )
+            if len(rows) == TABLE_ITER_CHUNK_SIZE:
+                tables.append(cls.from_rows(rows))
+                rows = []
+        tables.append(cls.from_rows(rows))
+
+        return cls.concatenate(tables)
+
+    @classmethod
+    def concatenate(cls, tables: List["TaskTable"]):
+        if len(tables) == 1:
+            return tables[0]
+
+        app_names = sorted(set(app for t in tables for app in t.app_names))
+        app_idx = {app: idx for idx, app in enumerate(app_names)}
+        return cls(
+            app_names,
+            concatenate([t.task_ids for t in tables]),
+            concatenate(
+                [
+                    asarray(
+                        [app_idx[app] for app in t.app_names], dtype=int64
+                    )[t.app_codes]
+                    for t in tables
+                ]
+            ),
+            concatenate([t.sizes for t in tables]),
+            concatenate([t.inter_arrival_times for t in tables]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.task_ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return TaskTable(
+                self.app_names,
+                self.task_ids[idx],
+                self.app_codes[idx],
+                self.sizes[idx],
+                self.inter_arrival_times[idx],
+            )
+
+        return TaskObject(
+            int(self.task_ids[idx]),
+            self.app_names[self.app_codes[idx]],
+            int(self.sizes[idx]),
+            int(self.inter_arrival_times[idx]),
+        )
+
+    def __iter__(self) -> Iterator[TaskObject]:
+        for start in range(0, len(self), TABLE_ITER_CHUNK_SIZE):
+            end = start + TABLE_ITER_CHUNK_SIZE
+            rows = zip(
+                self.task_ids[start:end].tolist(),
+                self.app_codes[start:end].tolist(),
+                self.sizes[start:end].tolist(),
+                self.inter_arrival_times[start:end].tolist(),
+            )
+            for task_id, app, size, inter_arrival_time in rows:
+                yield TaskObject(
+                    task_id, self.app_names[app], size, inter_arrival_time
+                )
+
+    def get_task(self, task_id: int) -> TaskObject:
+        if self.id_rows is None:
+            self.id_rows = zeros(
+                self.task_ids.max(initial=-1) + 1, dtype=int64
+            )
+            self.id_rows[self.task_ids] = arange(len(self))
+
+        return self[int(self.id_rows[task_id])]
+
+    def get_apps(self) -> ndarray:
+        """
+        Column of app names
+        """
+        if len(self.app_names) == 0:
+            return zeros(len(self), dtype=str)
+
+        return asarray(self.app_names, dtype=str)[self.app_codes]
+
+    def get_arrival_offsets(self) -> ndarray:
+        """
+        Arrival time of each task (in seconds) wrt the start of the trace
+        """
+        return cumsum(self.inter_arrival_times, dtype=int64)
+
+    def get_columns(self) -> Tuple[ndarray, ndarray, ndarray, ndarray]:
+        return (
+            self.task_ids,
+            self.get_apps(),
+            self.sizes,
+            self.inter_arrival_times,
+        )
+
+
+class ExecutionRow:
+    """
+    View of one row of an execution table, with the same fields as an
+    `ExecutedTaskInfo`. Setting a field writes it in the table
+    """
+
+    __slots__ = ("table", "task_id")
+
+    def __init__(self, table: "ExecutionTable", task_id: int):
+        self.table = table
+        self.task_id = task_id
+
+    def __repr__(self) -> str:
+        return repr(self.to_info())
+
+    @property
+    def time_executing(self) -> float:
+        return self.table.time_executing[self.task_id].item()
+
+    @time_executing.setter
+    def time_executing(self, value: float) -> None:
+        self.table.time_executing[self.task_id] = value
+
+    @property
+    def time_in_queue(self) -> float:
+        return self.table.time_in_queue[self.task_id].item()
+
+    @time_in_queue.setter
+    def time_in_queue(self, value: float) -> None:
+        self.table.time_in_queue[self.task_id] = value
+
+    @property
+    def exec_start_ts(self) -> float:
+        return self.table.exec_start_ts[self.task_id].item()
+
+    @exec_start_ts.setter
+    def exec_start_ts(self, value: float) -> None:
+        self.table.exec_start_ts[self.task_id] = value
+
+    @property
+    def exec_end_ts(self) -> float:
+        return self.table.exec_end_ts[self.task_id].item()
+
+    @exec_end_ts.setter
+    def exec_end_ts(self, value: float) -> None:
+        self.table.exec_end_ts[self.task_id] = value
+
+    def to_info(self) -> ExecutedTaskInfo:
+        return ExecutedTaskInfo(
+            self.task_id,
+            self.time_executing,
+            self.time_in_queue,
+            self.exec_start_ts,
+            self.exec_end_ts,
+        )
+
+
+class ExecutionTable:
+    """
+    Struct-of-arrays of the execution of the tasks in a trace, indexed by
+    task id (i.e. the position of the task in the trace). It behaves like a
+    dict of task ids to `ExecutedTaskInfo`s, with the ids in increasing
+    order, and grows as we add tasks with larger ids
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.num_rows = 0
+        self.has_row = zeros(capacity, dtype=bool_)
+        self.time_executing = zeros(capacity, dtype=float64)
+        self.time_in_queue = zeros(capacity, dtype=int64)
+        self.exec_start_ts = zeros(capacity, dtype=float64)
+        self.exec_end_ts = zeros(capacity, dtype=float64)
+
+    @classmethod
+    def from_dict(cls, task_info: Dict[int, ExecutedTaskInfo]):
+        table = cls(max(task_info, default=-1) + 1)
+        for task_id in task_info:
+            table[task_id] = task_info[task_id]
+
+        return table
+
+    def reserve(self, capacity: int) -> None:
+        """
+        Grow the columns to fit task ids up to `capacity - 1`. We (at least)
+        double them, so that adding tasks one by one is amortised O(1)
+        """
+        if capacity <= len(self.has_row):
+            return
+
+        capacity = max(capacity, 2 * len(self.has_row))
+        for name in [
+            "has_row",
+            "time_executing",
+            "time_in_queue",
+            "exec_start_ts",
+            "exec_end_ts",
+        ]:
+            column = getattr(self, name)
+            grown = zeros(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __contains__(self, task_id: int) -> bool:
+        return 0 <= task_id < len(self.has_row) and bool(self.has_row[task_id])
+
+    def __getitem__(self, task_id: int) -> ExecutionRow:
+        if task_id not in self:
+            raise KeyError(task_id)
+
+        return ExecutionRow(self, task_id)
+
+    def __setitem__(self, task_id: int, task_info: ExecutedTaskInfo) -> None:
+        if task_id < 0:
+            raise KeyError(task_id)
+
+        self.reserve(task_id + 1)
+        if not self.has_row[task_id]:
+            self.has_row[task_id] = True
+            self.num_rows += 1
+
+        self.time_executing[task_id] = task_info.time_executing
+        self.time_in_queue[task_id] = task_info.time_in_queue
+        self.exec_start_ts[task_id] = task_info.exec_start_ts
+        self.exec_end_ts[task_id] = task_info.exec_end_ts
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys())
+
+    def keys(self) -> List[int]:
+        return flatnonzero(self.has_row).tolist()
+
+    def values(self) -> Iterator[ExecutionRow]:
+        return (ExecutionRow(self, task_id) for task_id in self.keys())
+
+    def items(self) -> Iterator[Tuple[int, ExecutionRow]]:
+        return (
+            (task_id, ExecutionRow(self, task_id)) for task_id in self.keys()
+        )
+
+    def get(self, task_id: int, default=None):
+        return ExecutionRow(self, task_id) if task_id in self else default
+
+    def to_dict(self) -> Dict[int, ExecutedTaskInfo]:
+        return {task_id: row.to_info() for task_id, row in self.items()}
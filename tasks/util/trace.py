@@ -1,58 +1,315 @@
-from dataclasses import dataclass
+from functools import lru_cache
+from numpy import (
+    asarray,
+    dtype,
+    frombuffer,
+    iinfo,
+    memmap,
+    unique,
+    zeros,
+)
 from os import makedirs
-from os.path import join
+from os.path import exists, getmtime, join, splitext
 from tasks.util.env import PROJ_ROOT
+from tasks.util.table import TaskObject, TaskTable
+from typing import Iterator, List, Tuple, Union
 
 MAKESPAN_TRACES_DIR = join(PROJ_ROOT, "tasks", "makespan", "traces")
 
+# Binary traces start with this magic string, followed by the number of
+# tasks and of distinct apps (as little-endian uint64), and by the table of
+# app names (each one null-padded to a fixed width). Then come the columns,
+# each one aligned to 8 bytes: task ids, app codes (indices in the table),
+# sizes, and inter-arrival times
+TRACE_BINARY_MAGIC = b"GRNYTRC1"
+TRACE_BINARY_APP_NAME_LEN = 32
+TRACE_BINARY_COLUMNS = [
+    ("task_id", dtype("<i4")),
+    ("app", dtype("u1")),
+    ("size", dtype("<i4")),
+    ("inter_arrival_time", dtype("<i4")),
+]
 
-# Copy this from tasks.makespan.data to prevent a circular import
-@dataclass
-class TaskObject:
-    task_id: int
-    app: str
-    size: int
-    inter_arrival_time: int
+# Number of binary traces whose columns we keep mapped, as the result
+# readers load the same trace once per baseline
+TRACE_BINARY_CACHE_SIZE = 16
+
+
+TRACE_CSV_HEADER = "TaskId,App,Size,InterArrivalTimeSecs\n"
+
+# Number of rows we format at once when writing a trace
+TRACE_WRITE_CHUNK_SIZE = 1 << 16
+
+
+def get_trace_file(workload, num_tasks, num_cores_per_vm, binary=False):
+    file_name = "trace_{}_{}_{}.{}".format(
+        workload, num_tasks, num_cores_per_vm, "bin" if binary else "csv"
+    )
+    return join(MAKESPAN_TRACES_DIR, file_name)
 
 
 def dump_task_trace_to_file(task_trace, workload, num_tasks, num_cores_per_vm):
+    dump_task_trace_columns_to_file(
+        *get_trace_columns_from_task_trace(task_trace),
+        workload,
+        num_tasks,
+        num_cores_per_vm,
+    )
+
+
+def dump_task_trace_columns_to_file(
+    task_ids,
+    apps,
+    sizes,
+    inter_arrival_times,
+    workload,
+    num_tasks,
+    num_cores_per_vm,
+):
+    """
+    Write a trace given as one sequence (list or array) per column
+    """
+    columns = [
+        asarray(column)
+        for column in [task_ids, apps, sizes, inter_arrival_times]
+    ]
+
     makedirs(MAKESPAN_TRACES_DIR, exist_ok=True)
-    file_name = "trace_{}_{}_{}.csv".format(
-        workload, num_tasks, num_cores_per_vm
+    task_file = get_trace_file(workload, num_tasks, num_cores_per_vm)
+    write_trace_csv_file(task_file, columns)
+    write_trace_binary_file(
+        get_trace_file(workload, num_tasks, num_cores_per_vm, binary=True),
+        columns,
     )
-    task_file = join(MAKESPAN_TRACES_DIR, file_name)
+    print("Written trace with {} tasks to {}".format(len(task_ids), task_file))
+
+
+def write_trace_csv_file(task_file, columns):
     with open(task_file, "w") as out_file:
-        out_file.write("TaskId,App,Size,InterArrivalTimeSecs\n")
-        for t in task_trace:
+        out_file.write(TRACE_CSV_HEADER)
+        for start in range(0, len(columns[0]), TRACE_WRITE_CHUNK_SIZE):
+            end = start + TRACE_WRITE_CHUNK_SIZE
             out_file.write(
-                "{},{},{},{}\n".format(
-                    t.task_id, t.app, t.size, t.inter_arrival_time
+                "".join(
+                    [
+                        "{},{},{},{}\n".format(*row)
+                        for row in zip(
+                            *[column[start:end].tolist() for column in columns]
+                        )
+                    ]
                 )
             )
-    print(
-        "Written trace with {} tasks to {}".format(len(task_trace), task_file)
-    )
 
 
-def load_task_trace_from_file(workload, num_tasks, num_cores_per_vm):
-    file_name = "trace_{}_{}_{}.csv".format(
-        workload, num_tasks, num_cores_per_vm
+def write_trace_binary_file(task_file, columns):
+    """
+    Write the columns of a trace (task ids, apps, sizes, and inter-arrival
+    times) in our binary format
+    """
+    app_names, app_codes = unique(columns[1].astype(str), return_inverse=True)
+    if len(app_names) > 255:
+        raise RuntimeError("Too many apps in trace: {}".format(len(app_names)))
+
+    app_table = zeros(
+        len(app_names), dtype="S{}".format(TRACE_BINARY_APP_NAME_LEN)
     )
-    task_file = join(MAKESPAN_TRACES_DIR, file_name)
-    task_trace = []
+    for idx, app in enumerate(app_names):
+        if len(app.encode("utf-8")) >= TRACE_BINARY_APP_NAME_LEN:
+            raise RuntimeError("App name too long: {}".format(app))
+        app_table[idx] = app.encode("utf-8")
+
+    num_tasks = len(columns[0])
+    with open(task_file, "wb") as out_file:
+        out_file.write(TRACE_BINARY_MAGIC)
+        out_file.write(asarray([num_tasks, len(app_names)], "<u8").tobytes())
+        out_file.write(app_table.tobytes())
+        for column, (_, col_dtype) in zip(
+            [columns[0], app_codes, columns[2], columns[3]],
+            TRACE_BINARY_COLUMNS,
+        ):
+            column = asarray(column)
+            if len(column) > 0 and column.max() > iinfo(col_dtype).max:
+                raise RuntimeError(
+                    "Value out of range in trace: {}".format(column.max())
+                )
+
+            out_file.write(b"\0" * (-out_file.tell() % 8))
+            out_file.write(column.astype(col_dtype).tobytes())
+
+
+def read_trace_binary_file(task_file):
+    """
+    Map the columns of a binary trace into memory, without reading them.
+    Return the table of app names, and the map of column names to read-only
+    arrays (that we may slice without copying)
+    """
+    with open(task_file, "rb") as in_file:
+        header = in_file.read(len(TRACE_BINARY_MAGIC) + 16)
+        if header[: len(TRACE_BINARY_MAGIC)] != TRACE_BINARY_MAGIC:
+            raise RuntimeError("Not a binary trace: {}".format(task_file))
+
+        num_tasks, num_apps = frombuffer(
+            header, dtype="<u8", offset=len(TRACE_BINARY_MAGIC)
+        ).tolist()
+        app_table = frombuffer(
+            in_file.read(num_apps * TRACE_BINARY_APP_NAME_LEN),
+            dtype="S{}".format(TRACE_BINARY_APP_NAME_LEN),
+        )
+
+    app_names = [app.decode("utf-8") for app in app_table]
+    columns = {}
+    offset = len(header) + num_apps * TRACE_BINARY_APP_NAME_LEN
+    for name, col_dtype in TRACE_BINARY_COLUMNS:
+        offset += -offset % 8
+        if num_tasks == 0:
+            columns[name] = zeros(0, dtype=col_dtype)
+        else:
+            columns[name] = memmap(
+                task_file,
+                dtype=col_dtype,
+                mode="r",
+                offset=offset,
+                shape=(num_tasks,),
+            )
+        offset += num_tasks * col_dtype.itemsize
+
+    return app_names, columns
+
+
+@lru_cache(maxsize=TRACE_BINARY_CACHE_SIZE)
+def read_cached_trace_binary_file(task_file, mtime):
+    """
+    Same as `read_trace_binary_file`, but we only map each version (i.e.
+    modification time) of a file once
+    """
+    return read_trace_binary_file(task_file)
+
+
+def iter_trace_csv_file(task_file, num_tasks=None) -> Iterator[TaskObject]:
+    """
+    Parse the tasks in a CSV trace one line at a time, and stop after the
+    first `num_tasks` without reading the rest of the file
+    """
+    if num_tasks == 0:
+        return
+
+    num_read = 0
     with open(task_file, "r") as in_file:
         for line in in_file:
             if "TaskId" in line:
                 continue
-            if len(task_trace) == num_tasks:
-                break
             tokens = line.rstrip().split(",")
-            task_trace.append(
-                TaskObject(
-                    int(tokens[0]),
-                    tokens[1],
-                    int(tokens[2]),
-                    int(tokens[3]),
-                )
+            yield TaskObject(
+                int(tokens[0]),
+                tokens[1],
+                int(tokens[2]),
+                int(tokens[3]),
             )
-    return task_trace
+
+            num_read += 1
+            if num_read == num_tasks:
+                break
+
+
+def read_trace_csv_file(task_file, num_tasks=None) -> TaskTable:
+    return TaskTable.from_tasks(iter_trace_csv_file(task_file, num_tasks))
+
+
+def get_task_table_from_binary_columns(
+    app_names, columns, num_tasks=None
+) -> TaskTable:
+    """
+    Wrap the mapped columns of a binary trace in a table, without copying
+    (or reading) them
+    """
+    return TaskTable(
+        app_names,
+        columns["task_id"][:num_tasks],
+        columns["app"][:num_tasks],
+        columns["size"][:num_tasks],
+        columns["inter_arrival_time"][:num_tasks],
+    )
+
+
+def has_up_to_date_binary_trace(csv_file, bin_file) -> bool:
+    return exists(bin_file) and (
+        not exists(csv_file) or getmtime(bin_file) >= getmtime(csv_file)
+    )
+
+
+def iter_task_trace_from_file(
+    workload, num_tasks, num_cores_per_vm
+) -> Iterator[TaskObject]:
+    """
+    Iterate over the first `num_tasks` tasks of a trace, without loading it
+    in memory. We read the binary file if it is there (and not older than
+    the CSV), and the CSV otherwise
+    """
+    csv_file = get_trace_file(workload, num_tasks, num_cores_per_vm)
+    bin_file = get_trace_file(
+        workload, num_tasks, num_cores_per_vm, binary=True
+    )
+    if has_up_to_date_binary_trace(csv_file, bin_file):
+        return iter(
+            load_task_trace_from_file(workload, num_tasks, num_cores_per_vm)
+        )
+
+    return iter_trace_csv_file(csv_file, num_tasks)
+
+
+def load_task_trace_from_file(
+    workload, num_tasks, num_cores_per_vm
+) -> TaskTable:
+    """
+    Load the first `num_tasks` tasks of a trace in a table. If there is an
+    up-to-date binary trace, the table's columns are the mapped file
+    """
+    csv_file = get_trace_file(workload, num_tasks, num_cores_per_vm)
+    bin_file = get_trace_file(
+        workload, num_tasks, num_cores_per_vm, binary=True
+    )
+    if has_up_to_date_binary_trace(csv_file, bin_file):
+        app_names, columns = read_cached_trace_binary_file(
+            bin_file, getmtime(bin_file)
+        )
+        return get_task_table_from_binary_columns(
+            app_names, columns, num_tasks
+        )
+
+    return read_trace_csv_file(csv_file, num_tasks)
+
+
+def get_trace_columns_from_task_trace(
+    task_trace: Union[List[TaskObject], TaskTable],
+) -> Tuple[list, list, list, list]:
+    if isinstance(task_trace, TaskTable):
+        return task_trace.get_columns()
+
+    return (
+        [t.task_id for t in task_trace],
+        [t.app for t in task_trace],
+        [t.size for t in task_trace],
+        [t.inter_arrival_time for t in task_trace],
+    )
+
+
+def convert_trace_csv_to_binary(csv_file) -> str:
+    bin_file = "{}.bin".format(splitext(csv_file)[0])
+    write_trace_binary_file(
+        bin_file, list(read_trace_csv_file(csv_file).get_columns())
+    )
+    return bin_file
+
+
+def convert_trace_binary_to_csv(bin_file) -> str:
+    csv_file = "{}.csv".format(splitext(bin_file)[0])
+    app_names, columns = read_trace_binary_file(bin_file)
+    write_trace_csv_file(
+        csv_file,
+        list(
+            get_task_table_from_binary_columns(
+                app_names, columns
+            ).get_columns()
+        ),
+    )
+    return csv_file